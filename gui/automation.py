@@ -10,7 +10,7 @@ class StepRow(ctk.CTkFrame):
         self.pack(fill="x", pady=3)
         self.step_data = step_data.copy()
         
-        # Layout: ID | Desc | Action | Dynamic (Expands) | Wait | On/Off | Del
+        # Layout: ID | Desc | Action | Dynamic (Expands) | Ready | Wait | Phase | On/Off | Del
         self.grid_columnconfigure(3, weight=1) 
         
         # 1. ID
@@ -40,23 +40,52 @@ class StepRow(ctk.CTkFrame):
         self.inputs = {}
         self._update_dynamic(self.action_var.get())
 
-        # 5. Wait
-        ctk.CTkLabel(self, text="Wait:", font=Theme.FONT_SMALL, text_color=Theme.TEXT_GRAY).grid(row=0, column=4)
+        # 5. Ready Condition (Wait becomes the fallback when set)
+        ready = step_data.get('ready') or {}
+        ready_frame = ctk.CTkFrame(self, fg_color="transparent")
+        ready_frame.grid(row=0, column=4, padx=5)
+        ctk.CTkLabel(ready_frame, text="Ready:", font=Theme.FONT_SMALL, text_color=Theme.TEXT_GRAY).pack(side="left")
+        self.ready_var = ctk.StringVar(value=ready.get('type') or "none")
+        ctk.CTkOptionMenu(
+            ready_frame,
+            values=["none", "selector", "network_idle", "url", "repaint"],
+            variable=self.ready_var,
+            width=100,
+            fg_color="#333333",
+            button_color="#444444"
+        ).pack(side="left", padx=(5,0))
+        self.entry_ready = ctk.CTkEntry(ready_frame, width=110, height=26, placeholder_text="selector / url")
+        if ready.get('value'): self.entry_ready.insert(0, str(ready['value']))
+        self.entry_ready.pack(side="left", padx=(5,0))
+
+        # 6. Wait
+        ctk.CTkLabel(self, text="Wait:", font=Theme.FONT_SMALL, text_color=Theme.TEXT_GRAY).grid(row=0, column=5)
         self.entry_wait = ctk.CTkEntry(self, width=40)
         self.entry_wait.insert(0, str(step_data.get('wait', 1.0)))
-        self.entry_wait.grid(row=0, column=5, padx=5)
+        self.entry_wait.grid(row=0, column=6, padx=5)
+
+        # 7. Phase (auto = no explicit phase; once any step has one, auto steps run in the kill phase)
+        self.phase_var = ctk.StringVar(value=step_data.get('phase') or "auto")
+        ctk.CTkOptionMenu(
+            self,
+            values=["auto", "login", "kill"],
+            variable=self.phase_var,
+            width=70,
+            fg_color="#333333",
+            button_color="#444444"
+        ).grid(row=0, column=7, padx=5)
 
-        # 6. Toggle
+        # 8. Toggle
         self.sw_enabled = ctk.CTkSwitch(self, text="", width=40, progress_color=Theme.ACCENT_GREEN)
         if step_data.get('enabled', True): self.sw_enabled.select()
-        self.sw_enabled.grid(row=0, column=6, padx=5)
+        self.sw_enabled.grid(row=0, column=8, padx=5)
 
-        # 7. Delete
+        # 9. Delete
         ctk.CTkButton(
             self, text="✕", width=30, 
             fg_color="#3f1313", text_color=Theme.ACCENT_RED, hover_color="#5c1b1b", 
             command=lambda: delete_callback(self)
-        ).grid(row=0, column=7, padx=5)
+        ).grid(row=0, column=9, padx=5)
 
     def _update_dynamic(self, action):
         for w in self.dynamic_frame.winfo_children(): w.destroy()
@@ -103,6 +132,19 @@ class StepRow(ctk.CTkFrame):
             'enabled': bool(self.sw_enabled.get()),
             'wait': float(self.entry_wait.get() or 0)
         })
+        ready_type = self.ready_var.get()
+        if ready_type == "none":
+            d.pop('ready', None)
+        else:
+            ready = dict(d.get('ready') or {}) # Keeps a hand-edited timeout
+            ready.update({'type': ready_type, 'value': self.entry_ready.get()})
+            d['ready'] = ready
+
+        if self.phase_var.get() == "auto":
+            d.pop('phase', None)
+        else:
+            d['phase'] = self.phase_var.get()
+
         act = d['action']
         if act == 'click':
             d['coords'] = {'x': int(self.inputs['x'].get()), 'y': int(self.inputs['y'].get())}
@@ -157,7 +199,10 @@ class AutomationEditor(ctk.CTkFrame):
         self.rows.append(r)
 
     def add_step(self):
-        self._add_row_ui({'id': len(self.rows)+1, 'action':'keys', 'wait':1.0, 'enabled':True})
+        step = {'id': len(self.rows)+1, 'action':'keys', 'wait':1.0, 'enabled':True}
+        phase = self.rows[-1].phase_var.get() if self.rows else "auto"
+        if phase != "auto": step['phase'] = phase # Same phase as the step above
+        self._add_row_ui(step)
 
     def delete_step(self, widget):
         widget.destroy()
@@ -123,7 +123,7 @@ class GlobalStatCard(ctk.CTkFrame):
                 total_limit += limit
                 total_positions += len(positions)
                 
-                pending = sum(1 for o in orders if o.get('status') in ['OPEN', 'TRIGGER PENDING'])
+                pending = orders.count_status('OPEN', 'TRIGGER PENDING')
                 total_pending += pending
                 
                 if sl_hit: sl_hit_count += 1
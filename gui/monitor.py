@@ -3,6 +3,9 @@ import threading
 from gui.theme import Theme
 from kotak_api.exit_trade import exit_one_position
 
+# --- CONFIGURATION ---
+ORDER_ROWS = 200    # Newest orders drawn in the order table (busy books hold thousands)
+
 # =========================================================
 #  HELPER: DATA GRID ROW (Updated for Widgets)
 # =========================================================
@@ -100,15 +103,15 @@ class MonitorTab(ctk.CTkFrame):
         """Callback for Manual Exit Button."""
         btn.configure(text="...", state="disabled", fg_color="#4b5563")
         
-        # Calculate Logic
-        net_qty = int(p_data['net_qty'])
-        txn_type = "S" if net_qty > 0 else "B"
+        # Calculate Logic (units, not lots: a part lot must still be closed)
+        net_units = int(p_data['net_units'])
+        txn_type = "S" if net_units > 0 else "B"
         
         def worker():
             success, msg = exit_one_position(
                 self.engine.state, 
                 p_data['token'], 
-                abs(net_qty), 
+                abs(net_units), 
                 txn_type, 
                 p_data['segment'],
                 # Assuming Product is NRML or extracting if available, default NRML for safety
@@ -128,14 +131,15 @@ class MonitorTab(ctk.CTkFrame):
 
         with self.engine.state['sys']['lock']:
             positions = self.engine.state['market']['positions']
-            orders = self.engine.state['market']['orders']
+            order_count = len(self.engine.state['market']['orders'])
+            orders = self.engine.state['market']['orders'].newest(ORDER_ROWS) # Newest first
             quotes = self.engine.state['market']['quotes']
             mtm = self.engine.state['risk']['mtm_current']
 
         # Header Update
         pnl_color = Theme.ACCENT_GREEN if mtm >= 0 else Theme.ACCENT_RED
         self.lbl_pnl_val.configure(text=f"₹ {mtm:,.2f}", text_color=pnl_color)
-        self.lbl_orders_count.configure(text=f"Orders: {len(orders)}")
+        self.lbl_orders_count.configure(text=f"Orders: {order_count}")
 
         # Positions Update
         self.table_pos.clear()
@@ -146,8 +150,8 @@ class MonitorTab(ctk.CTkFrame):
                 symbol = p.get('symbol', 'N/A')
                 net_qty = p.get('net_qty', 0)
                 
-                # Skip closed positions (Net Qty 0)
-                if net_qty == 0: continue
+                # Skip closed positions (no units left)
+                if p.get('net_units', 0) == 0: continue
 
                 buy_amt = p.get('total_buy_amt', 0)
                 sell_amt = p.get('total_sell_amt', 0)
@@ -182,9 +186,7 @@ class MonitorTab(ctk.CTkFrame):
         if not orders:
             self.table_ord.show_message("Order Book Empty")
         else:
-            # Sort by Order ID descending (newest first)
-            sorted_orders = sorted(orders, key=lambda x: x.get('order_id', ''), reverse=True)
-            for o in sorted_orders:
+            for o in orders:
                 oid = o.get('order_id', 'N/A')
                 status = o.get('status', 'N/A')
                 
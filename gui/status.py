@@ -1,7 +1,8 @@
 import customtkinter as ctk
 import time
 import threading
-import datetime
+from utils.market_calendar import get_calendar
+from utils.latency import latency_summary
 from gui.theme import Theme
 
 # =========================================================
@@ -56,7 +57,7 @@ class EngineDetailCard(ctk.CTkFrame):
         self._add_label(2, 1, "SESSION TIME")
         self.val_time = self._add_val(3, 1, "--")
 
-        self._add_label(2, 2, "ACTIVE THREADS")
+        self._add_label(2, 2, "ACTIVE SERVICES")
         self.val_threads = self._add_val(3, 2, "0")
 
         self._add_label(2, 3, "WATCHDOG STATUS")
@@ -81,8 +82,21 @@ class EngineDetailCard(ctk.CTkFrame):
         self._add_label(4, 4, "LAST ERROR")
         self.val_error = self._add_val(5, 4, "None", Theme.ACCENT_GREEN)
 
+        # --- ROW 3: KILL LATENCY (tick -> kill done) ---
+        self._add_label(6, 0, "KILLS TIMED")
+        self.val_lat_count = self._add_val(7, 0, "0")
+
+        self._add_label(6, 1, "LAST KILL")
+        self.val_lat_last = self._add_val(7, 1, "--")
+
+        self._add_label(6, 2, "P50 / P90 / P99")
+        self.val_lat_pct = self._add_val(7, 2, "--")
+
+        self._add_label(6, 3, "SLOWEST STAGE (P90)")
+        self.val_lat_stage = self._add_val(7, 3, "--")
+
         # Padding
-        ctk.CTkLabel(self, text="", height=10).grid(row=6, column=0)
+        ctk.CTkLabel(self, text="", height=10).grid(row=8, column=0)
 
     def _add_label(self, row, col, text):
         ctk.CTkLabel(self, text=text, font=("Arial", 10, "bold"), text_color=Theme.TEXT_GRAY).grid(row=row, column=col, sticky="w", padx=15, pady=(5, 0))
@@ -94,6 +108,7 @@ class EngineDetailCard(ctk.CTkFrame):
 
     def update_data(self):
         # 1. Thread-Safe Read
+        services = self.engine.running_services() # Scheduler jobs (own lock)
         with self.engine.state['sys']['lock']:
             config = self.engine.state['sys']['config']
             api = self.engine.state['sys']['api']
@@ -102,9 +117,6 @@ class EngineDetailCard(ctk.CTkFrame):
             err = self.engine.state['status'].get('error_message')
             start_time = self.engine.state['status'].get('session_start_time')
             
-            # Thread Tracking
-            threads = self.engine.state['sys']['threads']
-            
             # Lockout
             locked = self.engine.state['signals'].get('is_locked_today', False)
             
@@ -135,12 +147,12 @@ class EngineDetailCard(ctk.CTkFrame):
         else:
             self.val_time.configure(text="--:--:--")
 
-        # Threads
-        t_count = len(threads)
-        self.val_threads.configure(text=f"{t_count} Running", text_color=Theme.TEXT_WHITE if t_count > 0 else Theme.TEXT_GRAY)
+        # Services
+        s_count = len(services)
+        self.val_threads.configure(text=f"{s_count} Running", text_color=Theme.TEXT_WHITE if s_count > 0 else Theme.TEXT_GRAY)
 
         # Watchdog
-        wd_alive = "Watchdog" in threads and threads["Watchdog"].is_alive()
+        wd_alive = "Watchdog" in services
         if active:
             self.val_watch.configure(text="HEALTHY" if wd_alive else "CRASHED", text_color=Theme.ACCENT_GREEN if wd_alive else Theme.ACCENT_RED)
         else:
@@ -186,6 +198,17 @@ class EngineDetailCard(ctk.CTkFrame):
         else:
             self.val_error.configure(text="None", text_color=Theme.ACCENT_GREEN)
 
+        # 5. Update Row 3 (Kill Latency)
+        lat = latency_summary(self.engine.state)
+        self.val_lat_count.configure(text=str(lat['count']))
+        if lat['last']:
+            self.val_lat_last.configure(text=f"{lat['last']['total_ms']:.0f} ms")
+            p = lat['total']
+            self.val_lat_pct.configure(text=f"{p[50]:.0f} / {p[90]:.0f} / {p[99]:.0f} ms")
+            if lat['stages']:
+                name, pct = max(lat['stages'].items(), key=lambda kv: kv[1][90])
+                self.val_lat_stage.configure(text=f"{name} {pct[90]:.0f} ms", text_color=Theme.ACCENT_ORANGE)
+
 
 # =========================================================
 #  PAGE: STATUS PAGE CONTAINER
@@ -236,10 +259,7 @@ class StatusPage(ctk.CTkFrame):
         if not self._is_visible: return
 
         # 1. Update HUD
-        now = datetime.datetime.now().time()
-        m_start = datetime.time(9, 15)
-        m_end = datetime.time(15, 30)
-        is_open = m_start <= now <= m_end
+        is_open = get_calendar(self.engine.log).is_open(["nse_cm"])
         self.stat_market.update("OPEN" if is_open else "CLOSED", Theme.ACCENT_GREEN if is_open else Theme.ACCENT_ORANGE)
 
         elapsed = int(time.time() - self.app_start_time)
@@ -2,6 +2,8 @@ import sys
 import time
 import pyotp
 from neo_api_client import NeoAPI
+from kotak_api.http_session import install_pooled_transport
+from utils.state_events import raw_retention_enabled
 
 def authenticate_client(universal_data):    
     """
@@ -37,6 +39,7 @@ def authenticate_client(universal_data):
         raise ValueError(msg)
 
     # 3. AUTH LOOP
+    net_conf = universal_data['sys']['config'].get('network', {})
     max_retries = 3
     retry_delay = 2
 
@@ -49,6 +52,7 @@ def authenticate_client(universal_data):
                 consumer_key=kotak_creds['consumer_key'],
                 environment=kotak_creds.get('environment', 'prod')
             )
+            install_pooled_transport(client, net_conf, raw_retention_enabled(universal_data)) # Keep-alive pool + timeouts
             
             log.info("(2/4) Generating TOTP...", tags=["AUTH"])
             clean_secret = kotak_creds['totp_secret'].replace(" ", "").strip()
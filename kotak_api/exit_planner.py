@@ -0,0 +1,49 @@
+def _notional(row, quotes):
+    """
+    Risk size of a leg in rupees. Options use the strike (a delta proxy: the premium
+    understates what a short option can lose); everything else uses the LTP.
+    """
+    units = abs(row['net_units'])
+    ref_price = row.get('strike') if row.get('option_type') else 0.0
+    if not ref_price:
+        ref_price = quotes.get(str(row['token']), 0.0)
+    return units * ref_price * row.get('multiplier', 1) * row.get('price_factor', 1)
+
+
+def exit_leg(row):
+    """Market-exit order for a position row: (p_data for _place_market_exit, txn_type, qty in units)."""
+    p_data = {
+        'tok': row['token'],
+        'exSeg': row['segment'],
+        'prod': row.get('product', 'NRML'),
+        'trdSym': row['symbol']
+    }
+    txn_type = "S" if row['net_units'] > 0 else "B"
+    return p_data, txn_type, abs(row['net_units'])
+
+
+def plan_exits(rows, quotes):
+    """
+    Orders exits so risk falls fastest. Returns waves (lists of legs), dispatched in order:
+      1. Short options  - unbounded risk; buy-covers also release margin.
+      2. Futures/Equity - directional exposure.
+      3. Long options   - usually hedges of (1); closed last to avoid margin rejections.
+    Within a wave, the largest notional goes first.
+    """
+    short_opts, directional, long_opts = [], [], []
+
+    for row in rows:
+        if row['net_units'] == 0:
+            continue
+        if row.get('option_type'):
+            bucket = short_opts if row['net_units'] < 0 else long_opts
+        else:
+            bucket = directional
+        bucket.append((_notional(row, quotes), row))
+
+    waves = []
+    for bucket in (short_opts, directional, long_opts):
+        if bucket:
+            bucket.sort(key=lambda item: item[0], reverse=True)
+            waves.append([exit_leg(row) for _, row in bucket])
+    return waves
@@ -1,51 +1,323 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.latency import mark_stage
+from utils.rate_limiter import TokenBucket
+from kotak_api.positions import fetch_positions
+from kotak_api.orders import fetch_orders
+from kotak_api.exit_planner import plan_exits
+from kotak_api.scrip_master import slice_quantity
 
 def square_off_all_positions(universal_data):
     """
-    Auto-Kill Logic: Iterates ALL open positions and closes them.
+    Auto-Kill Logic: Closes ALL open positions.
+    Exits fire immediately from the cached market['positions'] (no round trip on the critical
+    path). Once fill reconciliation has every exit terminal, a fresh client.positions() is the
+    residual (drift the cache missed): it gets top-up exits, reconciled the same way.
+    When status['data_stale'] is set the cache is not trusted: exits are sized from a fresh
+    fetch (waited for up to square_off.stale_fetch_timeout), falling back to the cache only
+    if that fetch fails.
+    Exits are planned into risk-ordered waves (see exit_planner) and each wave is fanned
+    out in parallel (bounded in-flight, token-bucket rate limited).
     """
     log = universal_data['sys']['log']
     client = universal_data['sys']['api']
+    sq_conf = universal_data['sys']['config'].get('kill_switch', {}).get('square_off', {})
     
     log.warning(">>> INITIATING AUTO-SQUARE OFF SEQUENCE <<<", tags=["RISK", "SQ_OFF"])
 
     try:
-        response = client.positions()
-        if not response or 'data' not in response:
-            log.info("No positions data found.", tags=["SQ_OFF"])
-            return
+        with universal_data['sys']['lock']:
+            cached_rows = list(universal_data['market']['positions'])
+            quotes = dict(universal_data['market']['quotes'])
+            known_ids = {o.order_id for o in universal_data['market']['orders']} # Pre-kill orders
+            data_stale = universal_data['status'].get('data_stale', False)
 
-        orders_placed = 0
-        for p in response['data']:
+        bucket = TokenBucket(sq_conf.get('orders_per_second', 10), sq_conf.get('burst', 10))
+        started = time.monotonic()
+        sent = [] # (leg, result)
+
+        if data_stale:
+            # 1. Stale cache: size the exits from a fresh fetch (bounded wait)
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{universal_data['user_id']}_Recon") as recon:
+                fut_fresh = recon.submit(fetch_positions, client)
+                try:
+                    fresh_book, _ = fut_fresh.result(timeout=sq_conf.get('stale_fetch_timeout', 3))
+                    cached_rows = list(fresh_book)
+                    log.warning("Position Data Stale. Exits sized from a fresh fetch.", tags=["SQ_OFF", "RECON"])
+                except Exception as e:
+                    log.error(f"Position Data Stale and Fresh Fetch Failed ({str(e) or 'timeout'}). Using cached positions.", tags=["SQ_OFF", "RECON"])
+
+        # 2. Plan + Dispatch from cache (Short options -> Futures/Equity -> Long hedges)
+        waves = plan_exits(cached_rows, quotes)
+        for wave_no, legs in enumerate(waves, start=1):
+            for leg, r in _dispatch_exits(universal_data, client, legs, bucket):
+                r['wave'] = wave_no
+                sent.append((leg, r))
+
+        mark_stage(universal_data, "orders_acked")
+
+        # 3. Track exits to a terminal state; re-issue rejected / unfilled remainders
+        time_to_flat = _reconcile_fills(universal_data, client, sent, bucket, started, known_ids)
+
+        # 4. Top-up exits for what is still open once our own exits are done (no cache diff)
+        top_ups = []
+        if time_to_flat is not None:
             try:
-                # Calculate Net Qty
-                fl_buy = float(p.get('flBuyQty', 0) or 0)
-                fl_sell = float(p.get('flSellQty', 0) or 0)
-                cf_buy = float(p.get('cfBuyQty', 0) or 0)
-                cf_sell = float(p.get('cfSellQty', 0) or 0)
-                
-                net_qty = int((fl_buy + cf_buy) - (fl_sell + cf_sell))
-
-                if net_qty == 0: continue
-
-                # Determine Action (Close Long -> Sell, Close Short -> Buy)
-                transaction_type = "S" if net_qty > 0 else "B"
-                abs_qty = abs(net_qty)
-                
-                _place_market_exit(client, p, transaction_type, str(abs_qty), log)
-                orders_placed += 1
-                time.sleep(0.1) # Throttle slightly
-
-            except Exception as inner_e:
-                log.error(f"Error processing position {p.get('trdSym')}: {inner_e}", tags=["SQ_OFF"])
-                continue
+                fresh_book, _ = fetch_positions(client)
+                top_ups = [row for row in fresh_book if row['net_units']]
+            except Exception as e:
+                log.error(f"Square Off Residual Fetch Failed: {e}", tags=["SQ_OFF", "RECON"])
+                time_to_flat = None
+
+        if top_ups:
+            log.warning(f"Position Drift on {len(top_ups)} leg(s). Sending top-up exits.", tags=["SQ_OFF", "RECON"])
+            top_sent = []
+            for legs in plan_exits(top_ups, quotes):
+                for leg, r in _dispatch_exits(universal_data, client, legs, bucket):
+                    r['wave'] = "top-up"
+                    top_sent.append((leg, r))
+            claimed = set(known_ids) | {str(r['order_id']) for _, r in sent if r['order_id']}
+            time_to_flat = _reconcile_fills(universal_data, client, top_sent, bucket, started, claimed)
+            sent.extend(top_sent)
 
-        log.info(f"Square Off Complete. Exit Orders: {orders_placed}", tags=["SQ_OFF"])
+        results = [r for _, r in sent]
+
+        report = {
+            "timestamp": time.strftime("%H:%M:%S"),
+            "waves": len(waves),
+            "top_ups": len(top_ups),
+            "placed": sum(1 for r in results if r['ok']),
+            "failed": sum(1 for r in results if not r['ok']),
+            "filled": sum(1 for r in results if r.get('fill_status') == "FILLED"),
+            "unresolved": sum(1 for r in results if (r['ok'] or r['transport_error']) and not r.get('fill_status')),
+            "time_to_flat_ms": time_to_flat,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "orders": results
+        }
+        with universal_data['sys']['lock']:
+            universal_data['status']['square_off_report'] = report
+
+        flat_str = f"Flat in {time_to_flat}ms" if time_to_flat is not None else f"NOT FLAT ({report['unresolved']} unresolved)"
+        log.info(f"Square Off Complete. Exit Orders: {report['placed']}/{len(results)} "
+                 f"(Failed: {report['failed']}, Waves: {report['waves']}, Top-ups: {report['top_ups']}). "
+                 f"{flat_str}", tags=["SQ_OFF"])
 
     except Exception as e:
         log.critical(f"Square Off Critical Fail: {e}", tags=["SQ_OFF", "FAIL"])
 
 
+def _reconcile_fills(universal_data, client, sent, bucket, started, known_ids=()):
+    """
+    Polls order_report until every exit is terminal. Rejected/cancelled exits are re-issued
+    for their unfilled remainder; orders stuck open past 'cancel_stuck_after' are cancelled
+    (and then re-issued). Mutates each result with fill_status/filled_qty/attempt.
+    Exits with no broker answer (transport_error) are looked up in the report by token, side
+    and qty (ignoring 'known_ids', the orders that predate the kill) and tracked like the rest;
+    an unmatched one is resolved only by a flat position on its token.
+    Returns time-to-flat in ms from 'started', or None if not flat before the deadline.
+    Config: kill_switch.square_off {reconcile_timeout, reconcile_interval, max_reissues, cancel_stuck_after}.
+    """
+    log = universal_data['sys']['log']
+    sq_conf = universal_data['sys']['config'].get('kill_switch', {}).get('square_off', {})
+    timeout = sq_conf.get('reconcile_timeout', 15)
+    interval = sq_conf.get('reconcile_interval', 0.5)
+    max_reissues = sq_conf.get('max_reissues', 2)
+    cancel_after = sq_conf.get('cancel_stuck_after', 5)
+
+    pending = {} # order_id -> (leg, result, placed_at)
+    retry = []   # legs to re-issue
+    unknown = [] # (leg, result) sent without a broker answer: order may or may not exist
+    for leg, r in sent:
+        r.setdefault('attempt', 1)
+        if r['ok'] and r['order_id']:
+            pending[str(r['order_id'])] = (leg, r, time.monotonic())
+        elif r['transport_error']:
+            unknown.append((leg, r))
+        else:
+            r['fill_status'] = "DEAD"
+            retry.append((leg, r['attempt']))
+
+    gave_up = 0
+    deadline = time.monotonic() + timeout
+    while True:
+        # Re-issue what the broker refused (bounded)
+        if retry:
+            gave_up += sum(1 for _, attempt in retry if attempt > max_reissues)
+            legs = [(leg, attempt) for leg, attempt in retry if attempt <= max_reissues]
+            retry = []
+            if legs:
+                log.warning(f"Re-issuing {len(legs)} exit(s).", tags=["SQ_OFF", "RETRY"])
+            for attempt in sorted({attempt for _, attempt in legs}):
+                group = [leg for leg, a in legs if a == attempt]
+                for leg, r in _dispatch_exits(universal_data, client, group, bucket):
+                    r['wave'] = "retry"
+                    r['attempt'] = attempt + 1
+                    sent.append((leg, r))
+                    if r['ok'] and r['order_id']:
+                        pending[str(r['order_id'])] = (leg, r, time.monotonic())
+                    elif r['transport_error']:
+                        unknown.append((leg, r))
+                    else:
+                        r['fill_status'] = "DEAD"
+                        retry.append((leg, r['attempt']))
+
+        if not pending and not retry and not unknown:
+            break
+        if time.monotonic() >= deadline:
+            log.critical(f"Fill Reconciliation Timed Out. {len(pending) + len(unknown)} exit(s) unresolved.", tags=["SQ_OFF", "FAIL"])
+            return None
+        if not pending and not unknown:
+            continue
+
+        time.sleep(interval)
+        try:
+            orders, _ = fetch_orders(client)
+        except Exception as e:
+            log.warning(f"Fill Check Failed: {e}", tags=["SQ_OFF", "RECON"])
+            continue
+
+        if unknown:
+            claimed = set(known_ids) | {str(r['order_id']) for _, r in sent if r['order_id']}
+            unknown = _match_unknown_exits(log, orders, unknown, claimed, pending)
+            if unknown and not pending:
+                unknown = _resolve_flat_tokens(log, client, unknown)
+
+        by_id = {str(o['order_id']): o for o in orders}
+        for oid in list(pending):
+            o = by_id.get(oid)
+            if o is None:
+                continue
+            leg, r, placed_at = pending[oid]
+            r['filled_qty'] = int(o['filled_qty'])
+
+            if o['status'] in ('COMPLETE', 'FILLED', 'TRADED') or (o['qty'] > 0 and o['filled_qty'] >= o['qty']):
+                r['fill_status'] = "FILLED"
+                del pending[oid]
+
+            elif o['status'] in ('REJECTED', 'CANCELLED'):
+                r['fill_status'] = o['status']
+                del pending[oid]
+                remaining = r['qty'] - r['filled_qty']
+                if remaining > 0:
+                    p_data, txn_type, _ = leg
+                    log.warning(f"Exit {oid} {o['status']} ({r['filled_qty']}/{r['qty']} filled).", tags=["SQ_OFF", "RECON"])
+                    retry.append(((p_data, txn_type, remaining), r['attempt']))
+
+            elif cancel_after and time.monotonic() - placed_at > cancel_after and not r.get('cancel_sent'):
+                # Stuck open (e.g. partial fill on a converted limit). Cancel -> re-issued above.
+                r['cancel_sent'] = True
+                try:
+                    client.cancel_order(order_id=oid)
+                    log.warning(f"Exit {oid} stuck {o['status']}. Cancel sent.", tags=["SQ_OFF", "RECON"])
+                except Exception as e:
+                    log.error(f"Cancel {oid} Failed: {e}", tags=["SQ_OFF", "RECON"])
+
+    if gave_up:
+        log.critical(f"{gave_up} exit(s) still refused after {max_reissues} re-issue(s). NOT FLAT.", tags=["SQ_OFF", "FAIL"])
+        return None
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def _match_unknown_exits(log, orders, unknown, claimed, pending):
+    """Adopts report orders (same token, side, qty; not claimed) for exits sent without an answer."""
+    still_unknown = []
+    for leg, r in unknown:
+        match = next((o for o in orders if o.order_id not in claimed and o.token == r['token']
+                      and o.transaction_type[:1] == r['txn_type'][:1] and int(o.qty) == int(r['qty'])), None)
+        if match is None:
+            still_unknown.append((leg, r))
+            continue
+        claimed.add(match.order_id)
+        r['order_id'] = match.order_id
+        r['ok'] = True
+        r['matched'] = True # Placed despite the transport error
+        pending[match.order_id] = (leg, r, time.monotonic())
+        log.warning(f"Exit {r['symbol']} had no broker answer; found as order {match.order_id}.", tags=["SQ_OFF", "RECON"])
+    return still_unknown
+
+
+def _resolve_flat_tokens(log, client, unknown):
+    """Unmatched unanswered exits whose token is flat in a fresh positions fetch are resolved."""
+    try:
+        book, _ = fetch_positions(client)
+    except Exception as e:
+        log.warning(f"Position Check Failed: {e}", tags=["SQ_OFF", "RECON"])
+        return unknown
+    open_qty = book.exposure_by_token()
+    still_unknown = []
+    for leg, r in unknown:
+        if open_qty.get(r['token'], 0.0) == 0:
+            r['fill_status'] = "FLAT"
+        else:
+            still_unknown.append((leg, r))
+    return still_unknown
+
+
+def _no_broker_answer(resp):
+    """
+    True when a place_order response is not a broker verdict, so the order may still exist.
+    The SDK never raises here: NeoAPI folds errors into {'Error': exc} and OrderAPI turns a
+    PooledRESTClient timeout/reset (ApiException status=0) into {'error': exc}.
+    """
+    if not isinstance(resp, dict) or 'stat' not in resp:
+        return True
+    return any(isinstance(v, BaseException) for v in resp.values())
+
+
+def _dispatch_exits(universal_data, client, legs, bucket):
+    """
+    Places every (p_data, txn_type, qty) leg concurrently, at most
+    kill_switch.square_off.max_in_flight at once. Legs above the exchange freeze
+    quantity are split into child orders first (see scrip_master.slice_quantity).
+    Returns (child_leg, result) pairs.
+    """
+    log = universal_data['sys']['log']
+    sq_conf = universal_data['sys']['config'].get('kill_switch', {}).get('square_off', {})
+    max_in_flight = max(int(sq_conf.get('max_in_flight', 8)), 1)
+
+    def _send(leg):
+        p, txn_type, qty = leg
+        bucket.acquire()
+        sent = time.monotonic()
+        result = {
+            "symbol": p.get('trdSym', ''), "token": str(p.get('tok', '')),
+            "txn_type": txn_type, "qty": qty, "ok": False, "order_id": None, "error": None,
+            "transport_error": False # True = no broker answer (order may exist): never auto re-sent
+        }
+        try:
+            resp = _place_market_exit(client, p, txn_type, str(qty), log)
+            if resp and resp.get('stat') == "Ok":
+                result['ok'] = True
+                result['order_id'] = resp.get('nOrdNo')
+            else:
+                result['error'] = str(resp)
+                result['transport_error'] = _no_broker_answer(resp)
+        except Exception as e:
+            result['error'] = str(e)
+            result['transport_error'] = True
+
+        result['ack_ms'] = round((time.monotonic() - sent) * 1000, 1)
+        if result['transport_error']:
+            log.error(f"Exit Unanswered {result['symbol']} (not re-sent until resolved): {result['error']}", tags=["SQ_OFF"])
+        elif not result['ok']:
+            log.error(f"Exit Rejected {result['symbol']}: {result['error']}", tags=["SQ_OFF"])
+        return result
+
+    children = []
+    for p, txn_type, qty in legs:
+        slices = slice_quantity(qty, p.get('exSeg', ''), p.get('tok', ''))
+        if len(slices) > 1:
+            log.info(f"Slicing {p.get('trdSym', '')} {qty} -> {len(slices)} orders (freeze limit).", tags=["SQ_OFF", "SLICE"])
+        children.extend((p, txn_type, q) for q in slices)
+
+    if not children:
+        return []
+
+    workers = min(max_in_flight, len(children))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{universal_data['user_id']}_Exit") as pool:
+        return list(zip(children, pool.map(_send, children)))
+
+
 def exit_one_position(universal_data, token, qty, txn_type, segment, product):
     """
     Manual Exit Logic: Closes a SPECIFIC position from the GUI.
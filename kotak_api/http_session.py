@@ -0,0 +1,139 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+import requests
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from neo_api_client import rest
+from neo_api_client.exceptions import ApiException
+from utils import fast_json
+
+
+# --- CONFIGURATION ---
+BODY_CACHE_SIZE = 32    # GET URLs whose last decoded body is kept (positions, order book, quotes...)
+
+
+class PooledRESTClient(rest.RESTClientObject):
+    """
+    Drop-in replacement for the SDK's RESTClientObject.
+    Uses one keep-alive requests.Session per API client (no TCP+TLS handshake per call)
+    and enforces connect/read timeouts so a hung socket cannot stall a service.
+    .json() decodes with utils.fast_json (orjson when installed). GET bodies are hashed:
+    a byte-identical body makes .json() return the SAME object as last time (no decode),
+    so callers can detect "unchanged" with an identity check. cache_bodies=False keeps no
+    decoded bodies (every body is decoded; nothing outlives the caller's parse).
+    """
+    def __init__(self, configuration, pool_size=10, max_retries=2, connect_timeout=3.05, read_timeout=10,
+                 cache_bodies=True):
+        super().__init__(configuration)
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache_bodies = cache_bodies
+
+        # Only idempotent GETs are retried on read/status errors. Orders (POST) are never re-sent.
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.body_cache = OrderedDict() # url -> (digest, decoded body)
+        self.body_lock = threading.Lock()
+
+    def request(self, method, url, query_params=None, headers=None, body=None):
+        """Same contract as RESTClientObject.request, routed through the pooled session."""
+        method = method.upper()
+        assert method in ['GET', 'HEAD', 'DELETE', 'POST', 'PUT', 'PATCH', 'OPTIONS']
+
+        headers = headers or {}
+        if 'Content-Type' not in headers:
+            headers['Content-Type'] = 'application/json'
+
+        try:
+            if method in ['POST', 'PUT', 'PATCH', 'DELETE']:
+                if query_params:
+                    url += '?' + urlencode(query_params)
+                if re.search('json', headers['Content-Type'], re.IGNORECASE):
+                    request_body = None
+                    if body is not None:
+                        request_body = json.dumps(body)
+                elif re.search('x-www-form-urlencoded', headers['Content-Type'], re.IGNORECASE):
+                    request_body = {}
+                    if body is not None:
+                        request_body["jData"] = json.dumps(body)
+                else:
+                    raise ApiException(status=0, reason="In-Valid Content-Type in the Header Parameters")
+                response = self.session.post(url=url, headers=headers, data=request_body, timeout=self.timeout)
+            elif method in ['GET']:
+                if query_params:
+                    url += '?' + urlencode(query_params)
+                response = self.session.get(url=url, headers=headers, timeout=self.timeout)
+            else:
+                raise ApiException(status=0, reason="Cannot call the API with the provided HTTP Method")
+        except ApiException:
+            raise
+        except Exception as e:
+            raise ApiException(status=0, reason=f"{type(e).__name__}\n{e}")
+
+        _use_fast_json(response)
+        if self.cache_bodies and method == 'GET' and response.status_code == 200:
+            self._reuse_unchanged_body(url, response)
+        return response
+
+    def _reuse_unchanged_body(self, url, response):
+        """Routes response.json() through the per-URL body cache."""
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        with self.body_lock:
+            cached = self.body_cache.get(url)
+            if cached is not None:
+                self.body_cache.move_to_end(url)
+
+        if cached is not None and cached[0] == digest:
+            response.json = lambda **kwargs: cached[1]
+            return
+
+        decode = response.json
+        def _json(**kwargs):
+            body = decode(**kwargs)
+            with self.body_lock:
+                self.body_cache[url] = (digest, body)
+                self.body_cache.move_to_end(url)
+                while len(self.body_cache) > BODY_CACHE_SIZE:
+                    self.body_cache.popitem(last=False)
+            return body
+        response.json = _json
+
+
+def _use_fast_json(response):
+    """response.json() via fast_json; anything it rejects goes back to requests (same errors as before)."""
+    decode = response.json
+    def _json(**kwargs):
+        if not kwargs:
+            try:
+                return fast_json.loads(response.content)
+            except ValueError:
+                pass
+        return decode(**kwargs)
+    response.json = _json
+
+
+def install_pooled_transport(client, net_conf, cache_bodies=True):
+    """Swaps the NeoAPI client's REST transport for a pooled session (call right after NeoAPI())."""
+    api_client = client.api_client
+    api_client.rest_client = PooledRESTClient(
+        api_client.configuration,
+        pool_size=net_conf.get('pool_size', 10),
+        max_retries=net_conf.get('max_retries', 2),
+        connect_timeout=net_conf.get('connect_timeout', 3.05),
+        read_timeout=net_conf.get('read_timeout', 10),
+        cache_bodies=cache_bodies
+    )
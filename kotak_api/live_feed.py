@@ -0,0 +1,226 @@
+import time
+from utils import fast_json
+from utils.state_events import mark_data_changed
+from kotak_api.order_book import log_order_events
+from trigger_logic.stop_loss import is_sl_buy_filled
+
+# --- CONFIGURATION ---
+ORDER_FEED_RETRY = 15   # Seconds between order-feed (re)subscribe attempts while it is down
+
+
+def _on_feed_message(universal_data, message):
+    """
+    WebSocket Callback: routes quote ticks and order updates.
+    Runs on the socket thread, so it must stay short.
+    """
+    if not isinstance(message, dict):
+        return
+    if message.get('type') == 'stock_feed':
+        _on_quote_ticks(universal_data, message)
+    elif message.get('type') == 'order_feed':
+        _on_order_update(universal_data, message)
+
+
+def _on_quote_ticks(universal_data, message):
+    """Pushes every LTP tick straight into market['quotes']."""
+    ticks = message.get('data') or []
+    updated_quotes = {}
+    for item in ticks:
+        try:
+            tk = str(item.get('tk', ''))
+            ltp = float(item.get('ltp', 0.0) or 0.0)
+            if tk and ltp > 0: # Partial ticks may not carry a price
+                updated_quotes[tk] = ltp
+        except Exception:
+            continue
+
+    with universal_data['sys']['lock']:
+        feed = universal_data['sys']['feed']
+        feed['last_tick'] = time.time()
+        if updated_quotes:
+            universal_data['market']['quotes'].update(updated_quotes)
+            universal_data['market']['quote_changes'].update(updated_quotes)
+            mark_data_changed(universal_data)
+
+
+def _extract_order(message):
+    """Order dict carrying 'nOrdNo' from an order-feed message (raw JSON string), else None."""
+    payload = message.get('data')
+    if isinstance(payload, (str, bytes)):
+        try:
+            payload = fast_json.loads(payload)
+        except ValueError:
+            return None
+    if isinstance(payload, dict) and isinstance(payload.get('data'), dict):
+        payload = payload['data']
+    if isinstance(payload, dict) and payload.get('nOrdNo'):
+        return payload
+    return None
+
+
+def _on_order_update(universal_data, message):
+    """
+    Applies one order update to the OrderBook.
+    A fully filled SL buy flips risk['sl_hit_status'] at once instead of waiting for the next poll.
+    """
+    raw = _extract_order(message)
+    if raw is None:
+        return # Connection ack / heartbeat
+
+    log = universal_data['sys']['log']
+    with universal_data['sys']['lock']:
+        universal_data['sys']['feed']['last_order_event'] = time.time()
+        try:
+            row, events = universal_data['market']['orders'].upsert(raw)
+        except (TypeError, ValueError):
+            return
+
+        sl_hit = is_sl_buy_filled(row)
+        if sl_hit:
+            universal_data['risk']['sl_hit_status'] = True
+        mark_data_changed(universal_data)
+
+    log_order_events(log, events)
+    if sl_hit:
+        log.warning(f"Short Leg SL Hit! (Order {row['order_id']}: {int(row['filled_qty'])}/{int(row['qty'])} filled, order feed)", tags=["RISK", "SL_HIT"])
+
+
+def _on_feed_open(universal_data, *args):
+    with universal_data['sys']['lock']:
+        universal_data['sys']['feed']['connected'] = True
+    universal_data['sys']['log'].info("Live Feed Connected.", tags=["DATA", "FEED"])
+
+
+def _on_feed_down(universal_data, *args):
+    """
+    Socket closed or errored. The SDK reports the quote (HSM) and order (HSI) sockets through
+    the same callbacks, clearing the matching is_hsw_open / is_hsi_open flag first.
+    Only a quote socket drop forgets the subscriptions (the next cycle re-subscribes);
+    an order feed drop is left to sync_order_feed.
+    """
+    reason = f": {args[0]}" if args else ""
+    with universal_data['sys']['lock']:
+        feed = universal_data['sys']['feed']
+        ws = getattr(feed['client'], 'NeoWebSocket', None)
+        if ws is not None and getattr(ws, 'is_hsw_open', 0):
+            order_feed_down = not getattr(ws, 'is_hsi_open', 0)
+            was_connected = False
+        else:
+            order_feed_down = False
+            was_connected = feed['connected']
+            feed['connected'] = False
+            feed['subscribed'] = set()
+
+    if order_feed_down:
+        universal_data['sys']['log'].warning(f"Order Feed Down{reason}. Order polling continues.", tags=["DATA", "FEED"])
+    if was_connected:
+        universal_data['sys']['log'].warning(f"Live Feed Down{reason}. REST fallback active.", tags=["DATA", "FEED"])
+
+
+def _attach_callbacks(universal_data, client):
+    client.on_message = lambda msg: _on_feed_message(universal_data, msg)
+    client.on_open = lambda *a: _on_feed_open(universal_data, *a)
+    client.on_close = lambda *a: _on_feed_down(universal_data, *a)
+    client.on_error = lambda *a: _on_feed_down(universal_data, *a)
+
+
+def _bind_client(universal_data, client):
+    """Re-attaches callbacks when the API client was replaced (re-login). Caller holds the lock."""
+    feed = universal_data['sys']['feed']
+    if feed['client'] is not client:
+        feed['client'] = client
+        feed['connected'] = False
+        feed['subscribed'] = set()
+        feed['last_tick'] = 0.0
+        feed['order_feed_at'] = 0.0
+        _attach_callbacks(universal_data, client)
+    return feed
+
+
+def sync_feed_subscriptions(universal_data, positions):
+    """
+    Subscribes the open tokens of 'positions' (a PositionBook) not yet on the socket.
+    Re-attaches callbacks when the API client was replaced (re-login).
+    """
+    log = universal_data['sys']['log']
+    client = universal_data['sys']['api']
+
+    with universal_data['sys']['lock']:
+        feed = _bind_client(universal_data, client)
+
+        subscribed = feed['subscribed']
+        new_tokens = [
+            {"instrument_token": str(tk), "exchange_segment": str(seg)}
+            for tk, seg in positions.open_instruments()
+            if str(tk) not in subscribed
+        ]
+
+    if not new_tokens:
+        return
+
+    try:
+        client.subscribe(instrument_tokens=new_tokens, isIndex=False, isDepth=False)
+        with universal_data['sys']['lock']:
+            feed['subscribed'].update(t['instrument_token'] for t in new_tokens)
+        log.info(f"Live Feed: Subscribed {len(new_tokens)} token(s).", tags=["DATA", "FEED"])
+    except Exception as e:
+        log.warning(f"Live Feed Subscribe Failed: {e}", tags=["DATA", "FEED"])
+
+
+def _order_feed_pending(ws):
+    """
+    True while a requested HSI socket is still handshaking or reconnecting: its thread
+    (run_forever) lives until the socket is closed for good. A second subscribe_to_orderfeed()
+    meanwhile would start a second HSI thread.
+    """
+    hsi_thread = getattr(ws, 'hsi_thread', None)
+    return hsi_thread is not None and hsi_thread.is_alive()
+
+
+def sync_order_feed(universal_data):
+    """
+    Keeps the order-feed socket (HSI) subscribed. A subscribe still in progress is left
+    alone; a dead one is re-requested at most every ORDER_FEED_RETRY seconds.
+    """
+    log = universal_data['sys']['log']
+    client = universal_data['sys']['api']
+
+    with universal_data['sys']['lock']:
+        feed = _bind_client(universal_data, client)
+        ws = getattr(client, 'NeoWebSocket', None)
+        if ws is not None and (getattr(ws, 'is_hsi_open', 0) or _order_feed_pending(ws)):
+            return
+        if time.time() - feed.get('order_feed_at', 0.0) < ORDER_FEED_RETRY:
+            return
+        feed['order_feed_at'] = time.time()
+
+    try:
+        client.subscribe_to_orderfeed()
+        log.info("Order Feed: Subscribed.", tags=["DATA", "FEED"])
+    except Exception as e:
+        log.warning(f"Order Feed Subscribe Failed: {e}", tags=["DATA", "FEED"])
+
+
+def is_feed_live(universal_data, stale_after):
+    """True if the socket is up and delivered a tick within 'stale_after' seconds."""
+    with universal_data['sys']['lock']:
+        feed = universal_data['sys']['feed']
+        return feed['connected'] and (time.time() - feed['last_tick']) <= stale_after
+
+
+def stop_live_feed(universal_data):
+    """Closes the quote and order sockets of the current client (best effort)."""
+    with universal_data['sys']['lock']:
+        feed = universal_data['sys']['feed']
+        client = feed['client']
+        feed['client'] = None
+        feed['connected'] = False
+        feed['subscribed'] = set()
+
+    ws = getattr(client, 'NeoWebSocket', None)
+    for sock in ('hsWebsocket', 'hsiWebsocket'): # Quotes, Orders
+        try:
+            if ws and getattr(ws, sock, None):
+                getattr(ws, sock).close()
+        except Exception:
+            pass
@@ -0,0 +1,188 @@
+import heapq
+import time
+from collections import deque
+from kotak_api.orders import parse_order_row
+
+# --- CONFIGURATION ---
+EVENT_HISTORY = 200    # Recent change events kept on the book (GUI / snapshots)
+
+FILLED_STATUSES = ('COMPLETE', 'FILLED')
+PENDING_STATUSES = ('OPEN', 'TRIGGER PENDING')
+TERMINAL_STATUSES = FILLED_STATUSES + ('REJECTED', 'CANCELLED')
+
+
+class OrderBook:
+    """
+    Orders keyed by nOrdNo with secondary indexes by status and by (type, side).
+    apply_report() diffs a full order_report against the book, re-parsing only rows whose
+    raw payload changed; upsert() applies a single order-feed update. Both return change
+    events [(kind, order)] with kind in: new, filled, rejected, cancelled.
+    An update that would move an order backwards (terminal -> live status, or a lower
+    filled_qty) is stale, e.g. a REST report older than a feed update, and is ignored.
+    Likewise an order the feed booked after a report was requested is not dropped for
+    missing from that report.
+    The book is updated in place: read it (iterate / query) while holding sys['lock'].
+    Iterating yields slotted Order records (dict-style reads), so list-style callers keep working.
+    keep_raw=False (monitoring.retain_raw off) drops the per-order raw payloads: every report
+    row is re-parsed and diffed on the parsed record instead.
+    """
+    def __init__(self, rows=None, keep_raw=True):
+        self.orders = {}      # order_id -> Order
+        self.raw = {}         # order_id -> last raw payload (diff key, empty when keep_raw is off)
+        self.keep_raw = keep_raw
+        self.by_status = {}   # status -> {order_id}
+        self.by_kind = {}     # (type, side) -> {order_id}
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self.feed_only = {}   # order_id -> time.monotonic() booked by upsert, not yet in any report
+        self.seeded = False   # First report loads silently (no 'new' flood at startup)
+        for r in rows or []:
+            self._put(r)
+
+    # --- Dict-Compatible View ---
+    def __len__(self):
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(list(self.orders.values()))
+
+    def get(self, order_id):
+        return self.orders.get(str(order_id))
+
+    # --- Indexed Queries ---
+    def with_status(self, *statuses):
+        return [self.orders[oid] for s in statuses for oid in self.by_status.get(s, ())]
+
+    def count_status(self, *statuses):
+        return sum(len(self.by_status.get(s, ())) for s in statuses)
+
+    def of_kind(self, types, sides):
+        """Orders whose (type, side) is in types x sides, e.g. (('SL', 'SL-M'), ('B', 'BUY'))."""
+        return [self.orders[oid] for t in types for s in sides for oid in self.by_kind.get((t, s), ())]
+
+    def newest(self, limit=None):
+        """Orders by order id (numerically), newest first."""
+        key = _order_id_key
+        if limit:
+            return heapq.nlargest(limit, self.orders.values(), key=key)
+        return sorted(self.orders.values(), key=key, reverse=True)
+
+    # --- Updates ---
+    def apply_report(self, raw_rows, requested_at=None):
+        """
+        Syncs the book to a full order_report ('data' rows). Orders missing from it are dropped,
+        except feed-booked ones the report could not have seen: booked after 'requested_at'
+        (time.monotonic() when the report was requested; None = unknown, never dropped).
+        """
+        events = []
+        seen = set()
+        for raw in raw_rows:
+            order_id = str(raw.get('nOrdNo', ''))
+            if not order_id:
+                continue
+            seen.add(order_id)
+            self.feed_only.pop(order_id, None)
+            if self.raw.get(order_id) == raw:
+                continue # Unchanged since the last report: no parse, no index work
+            try:
+                row = parse_order_row(raw)
+            except (TypeError, ValueError):
+                continue
+            if self.keep_raw:
+                self.raw[order_id] = raw
+            events.extend(self._change(order_id, row))
+
+        for order_id in [oid for oid in self.orders if oid not in seen]:
+            booked_at = self.feed_only.get(order_id)
+            if booked_at is not None and (requested_at is None or booked_at >= requested_at):
+                continue # Newer than the report
+            self._drop(order_id)
+            self.raw.pop(order_id, None)
+            self.feed_only.pop(order_id, None)
+
+        return self._emit(events)
+
+    def upsert(self, raw):
+        """Applies one (possibly partial) order-feed update. Returns (order as now booked, events)."""
+        order_id = str(raw.get('nOrdNo', ''))
+        row = parse_order_row(raw, self.orders.get(order_id))
+        if order_id not in self.orders:
+            self.feed_only[order_id] = time.monotonic()
+        if self.keep_raw:
+            self.raw[order_id] = {**self.raw.get(order_id, {}), **raw}
+        events = self._emit(self._change(order_id, row))
+        return self.orders.get(order_id, row), events
+
+    # --- Internals ---
+    def _emit(self, events):
+        if not self.seeded:
+            self.seeded = True
+            return []
+        self.events.extend(events)
+        return events
+
+    def _change(self, order_id, row):
+        prev = self.orders.get(order_id)
+        if prev == row or _is_stale(prev, row):
+            return []
+        if prev is not None:
+            self._drop(order_id)
+        self._put(row)
+
+        status = row.status
+        if prev is None:
+            kinds = ['new']
+            if status in FILLED_STATUSES or status in ('REJECTED', 'CANCELLED'):
+                kinds.append(_status_event(status)) # Appeared already terminal
+            return [(k, row) for k in kinds]
+        if status != prev.status and _status_event(status):
+            return [(_status_event(status), row)]
+        return []
+
+    def _put(self, row):
+        order_id = str(row.order_id)
+        self.orders[order_id] = row
+        self.by_status.setdefault(row.status, set()).add(order_id)
+        self.by_kind.setdefault((row.type, row.transaction_type), set()).add(order_id)
+
+    def _drop(self, order_id):
+        row = self.orders.pop(order_id, None)
+        if row is None:
+            return
+        self.by_status.get(row.status, set()).discard(order_id)
+        self.by_kind.get((row.type, row.transaction_type), set()).discard(order_id)
+
+
+def _order_id_key(o):
+    oid = o.order_id
+    return (1, int(oid), oid) if oid.isdigit() else (0, 0, oid)
+
+
+def _is_stale(prev, row):
+    """True if 'row' is older than 'prev': it re-opens a terminal order or lowers the fill."""
+    if prev is None:
+        return False
+    if prev.status in TERMINAL_STATUSES and row.status not in TERMINAL_STATUSES:
+        return True
+    return row.filled_qty < prev.filled_qty
+
+
+def _status_event(status):
+    if status in FILLED_STATUSES:
+        return 'filled'
+    if status == 'REJECTED':
+        return 'rejected'
+    if status == 'CANCELLED':
+        return 'cancelled'
+    return None
+
+
+def log_order_events(log, events):
+    """One log line per fill / rejection / cancellation ('new' is too chatty for scalping accounts)."""
+    for kind, o in events:
+        if kind == 'new':
+            continue
+        msg = f"Order {o.order_id} {kind.upper()}: {o.transaction_type} {o.type} {int(o.filled_qty)}/{int(o.qty)} (tok {o.token})"
+        if kind == 'rejected':
+            log.warning(msg, tags=["DATA", "ORDER"])
+        else:
+            log.info(msg, tags=["DATA", "ORDER"])
@@ -1,52 +1,105 @@
+import time
+from utils.state_events import mark_data_changed, retain_raw
+from kotak_api.records import Order
+
+
+def parse_order_row(o, previous=None):
+    """
+    One broker order (order_report row or order-feed update) -> Order record.
+    Fields missing from 'o' keep their value from 'previous' (partial feed updates).
+    """
+    if previous is None:
+        # Full report row: direct conversion (the hot path on every changed row)
+        qty = float(o.get('qty') or 0)
+        fld_qty = float(o.get('fldQty') or 0)
+        return Order(
+            str(o.get('nOrdNo') or ''),
+            str(o.get('ordSt') or '').upper(),
+            str(o.get('prcTp') or '').upper(),
+            str(o.get('trnsTp') or '').upper(),
+            str(o.get('tok') or ''),
+            qty, fld_qty, qty - fld_qty
+        )
+
+    def _num(key, field):
+        val = o.get(key)
+        return float(val or 0) if val not in (None, '') else previous.get(field, 0.0)
+
+    def _txt(key, field, upper=True):
+        val = o.get(key)
+        if val in (None, ''):
+            return previous.get(field, '')
+        return str(val).upper() if upper else str(val)
+
+    qty = _num('qty', 'qty')
+    fld_qty = _num('fldQty', 'filled_qty')
+    return Order(
+        _txt('nOrdNo', 'order_id', upper=False),
+        _txt('ordSt', 'status'),
+        _txt('prcTp', 'type'),
+        _txt('trnsTp', 'transaction_type'),
+        _txt('tok', 'token', upper=False),
+        qty, fld_qty, qty - fld_qty
+    )
+
+
+def fetch_order_rows(client, previous=None):
+    """
+    Network + Validation only (no parsing, no state writes).
+    Returns (raw_rows, raw_response) for OrderBook.apply_report. Raises on API errors.
+    Returns (None, raw_response) when the transport hands back 'previous' (unchanged body).
+    """
+    response = client.order_report()
+
+    # --- STRICT VALIDATION ---
+    if response is None:
+        raise Exception("API returned None")
+
+    stat = response.get('stat', '').lower()
+    st_code = str(response.get('stCode', ''))
+
+    if stat != 'ok':
+        # Whitelist "No Data" error
+        if st_code == '5203':
+            return [], response
+        raise Exception(f"API Status not OK: {response}")
+
+    if previous is not None and response is previous:
+        return None, response
+
+    raw_data = response.get('data', [])
+    if raw_data is None: raw_data = []
+    return raw_data, response
+
+
+def fetch_orders(client):
+    """
+    Network + Parse only (no state writes).
+    Returns (clean_orders, raw_response). Raises on API errors.
+    """
+    raw_data, response = fetch_order_rows(client)
+
+    clean_orders = []
+    for o in raw_data:
+        try:
+            clean_orders.append(parse_order_row(o))
+        except Exception:
+            continue
+
+    return clean_orders, response
+
+
 def sync_orders(universal_data):
-    log = universal_data['sys']['log']
-    client = universal_data['sys']['api']
-
-    try:
-        response = client.order_report()
-        
-        # --- STRICT VALIDATION ---
-        if response is None:
-            raise Exception("API returned None")
-            
-        stat = response.get('stat', '').lower()
-        st_code = str(response.get('stCode', ''))
-        
-        raw_data = []
-
-        if stat != 'ok':
-            # Whitelist "No Data" error
-            if st_code == '5203':
-                raw_data = []
-            else:
-                raise Exception(f"API Status not OK: {response}")
-        else:
-            raw_data = response.get('data', [])
-            if raw_data is None: raw_data = []
-        # -------------------------
-        
-        clean_orders = []
-        for o in raw_data:
-            try:
-                qty = float(o.get('qty', 0) or 0)
-                fld_qty = float(o.get('fldQty', 0) or 0)
-                
-                clean_orders.append({
-                    'order_id': o.get('nOrdNo', ''),
-                    'status': o.get('ordSt', '').upper(),
-                    'type': o.get('prcTp', '').upper(),
-                    'transaction_type': o.get('trnsTp', '').upper(),
-                    'token': o.get('tok', ''),
-                    'qty': qty,
-                    'filled_qty': fld_qty,
-                    'pending_qty': qty - fld_qty
-                })
-            except Exception:
-                continue
-
-        with universal_data['sys']['lock']:
-            universal_data['market']['orders'] = clean_orders
-            universal_data['market']['raw']['orders'] = response
-
-    except Exception as e:
-        raise e
\ No newline at end of file
+    """Applies a fresh order_report to the account's OrderBook. Returns the change events."""
+    with universal_data['sys']['lock']:
+        previous = universal_data['market']['raw']['orders']
+    requested_at = time.monotonic()
+    raw_rows, response = fetch_order_rows(universal_data['sys']['api'], previous)
+    if raw_rows is None:
+        return [] # Unchanged: no commit, no version bump
+
+    with universal_data['sys']['lock']:
+        events = universal_data['market']['orders'].apply_report(raw_rows, requested_at)
+        retain_raw(universal_data, 'orders', response)
+        mark_data_changed(universal_data)
+    return events
@@ -0,0 +1,101 @@
+import numpy as np
+from kotak_api.records import Position, record_fields
+
+
+# Column order of the records accepted by PositionBook.from_records (== Position fields)
+COLUMNS = record_fields(Position)
+ROW_DEFAULTS = {'product': 'NRML', 'option_type': '', 'strike': 0.0, 'lot_size': 1}
+
+
+class PositionBook:
+    """
+    Struct-of-arrays store for parsed positions.
+    Numeric columns live in NumPy arrays so MTM is one dot product; iterating the
+    book yields slotted Position records (dict-style reads), so list-style callers keep working.
+    """
+    def __init__(self, rows=None):
+        rows = rows or []
+        self._build([
+            [r.get(c, ROW_DEFAULTS[c]) if c in ROW_DEFAULTS else r[c] for r in rows]
+            for c in COLUMNS
+        ])
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds the book straight from COLUMNS-ordered tuples (no per-row dicts)."""
+        book = cls.__new__(cls)
+        book._build(list(zip(*records)) if records else [()] * len(COLUMNS))
+        return book
+
+    def _build(self, columns):
+        (tokens, segments, symbols, products, option_types, strike, lot_size,
+         net_qty, net_units, total_buy_amt, total_sell_amt, multiplier, price_factor) = columns
+
+        self.tokens = list(tokens)
+        self.segments = list(segments)
+        self.symbols = list(symbols)
+        self.products = list(products)
+        self.option_types = list(option_types)
+
+        self.net_qty = np.array(net_qty, dtype=np.int64)
+        self.net_units = np.array(net_units, dtype=np.int64)
+        self.total_buy_amt = np.array(total_buy_amt, dtype=np.float64)
+        self.total_sell_amt = np.array(total_sell_amt, dtype=np.float64)
+        self.multiplier = np.array(multiplier, dtype=np.float64)
+        self.price_factor = np.array(price_factor, dtype=np.float64)
+        self.strike = np.array(strike, dtype=np.float64)
+        self.lot_size = np.array(lot_size, dtype=np.int64)
+
+        # Derived columns (computed once per snapshot). Exact lots, so a part lot is not truncated away.
+        self.coeff = (self.net_units / self.lot_size) * self.multiplier * self.price_factor
+        self.realized = float(self.total_sell_amt.sum() - self.total_buy_amt.sum())
+
+        # token -> row numbers (a token can appear under several products)
+        self.index = {}
+        for i, tk in enumerate(self.tokens):
+            self.index.setdefault(tk, []).append(i)
+
+    # --- Dict-Compatible View ---
+    def __len__(self):
+        return len(self.tokens)
+
+    def __iter__(self):
+        for i in range(len(self.tokens)):
+            yield self.row(i)
+
+    def __getitem__(self, i):
+        return self.row(range(len(self.tokens))[i])
+
+    def row(self, i):
+        return Position(
+            self.tokens[i], self.segments[i], self.symbols[i], self.products[i], self.option_types[i],
+            float(self.strike[i]), int(self.lot_size[i]), int(self.net_qty[i]), int(self.net_units[i]),
+            float(self.total_buy_amt[i]), float(self.total_sell_amt[i]),
+            float(self.multiplier[i]), float(self.price_factor[i])
+        )
+
+    # --- Vectorized Queries ---
+    def ltp_vector(self, quotes):
+        return np.fromiter((quotes.get(tk, 0.0) for tk in self.tokens), dtype=np.float64, count=len(self.tokens))
+
+    def mtm(self, quotes):
+        """Realized + Unrealized for the whole book in one dot product."""
+        if not self.tokens:
+            return 0.0
+        return self.realized + float(self.coeff @ self.ltp_vector(quotes))
+
+    def exposure_by_token(self):
+        """token -> summed (lots * multiplier * price_factor)."""
+        return {tk: float(self.coeff[rows].sum()) for tk, rows in self.index.items()}
+
+    def is_flat(self):
+        return not self.net_units.any()
+
+    def open_instruments(self):
+        """(token, segment) pairs that still carry a net quantity."""
+        seen = {}
+        for i in np.flatnonzero(self.net_units):
+            tk = self.tokens[i]
+            if tk and self.segments[i] and tk not in seen:
+                seen[tk] = self.segments[i]
+        return list(seen.items())
@@ -1,7 +1,14 @@
-def sync_positions(universal_data):
-    log = universal_data['sys']['log']
-    client = universal_data['sys']['api']
-    
+from utils.state_events import mark_data_changed, retain_raw
+from kotak_api.position_book import PositionBook
+from kotak_api.records import Position
+
+def fetch_positions(client, previous=None):
+    """
+    Network + Parse only (no state writes).
+    Returns (PositionBook, raw_response). Raises on API errors.
+    If the transport hands back 'previous' (byte-identical body, see PooledRESTClient)
+    parsing is skipped and (None, raw_response) is returned.
+    """
     try:
         response = client.positions()
         
@@ -27,54 +34,83 @@ def sync_positions(universal_data):
             if raw_positions is None: raw_positions = []
         # --- STRICT VALIDATION END ---
 
-        parsed_positions = []
-
-        for p in raw_positions:
-            try:
-                def get_val(k, d=0): return float(p.get(k, d) or 0)
-                
-                token = p.get('tok', '')
-                segment = p.get('exSeg', 'nse_fo')
-                lot_size = get_val('lotSz', 1)
-                
-                multiplier = get_val('multiplier', 1)
-                gen_num = get_val('genNum', 1)
-                gen_den = get_val('genDen', 1)
-                prc_num = get_val('prcNum', 1)
-                prc_den = get_val('prcDen', 1)
-                price_factor = (gen_num / gen_den) * (prc_num / prc_den)
-
-                fl_buy = get_val('flBuyQty')
-                fl_sell = get_val('flSellQty')
-                cf_buy = get_val('cfBuyQty')
-                cf_sell = get_val('cfSellQty')
-
-                if 'cm' not in segment.lower() and lot_size > 0:
-                    fl_buy /= lot_size; fl_sell /= lot_size
-                    cf_buy /= lot_size; cf_sell /= lot_size
-
-                net_qty = (cf_buy + fl_buy) - (cf_sell + fl_sell)
-                buy_amt = get_val('cfBuyAmt') + get_val('buyAmt')
-                sell_amt = get_val('cfSellAmt') + get_val('sellAmt')
-
-                if net_qty != 0 or buy_amt != 0 or sell_amt != 0:
-                    parsed_positions.append({
-                        'token': token,
-                        'segment': segment,
-                        'symbol': p.get('trdSym', 'Unknown'),
-                        'net_qty': int(net_qty),
-                        'total_buy_amt': buy_amt,
-                        'total_sell_amt': sell_amt,
-                        'multiplier': multiplier,
-                        'price_factor': price_factor
-                    })
-            except Exception:
-                continue
+        if previous is not None and response is previous:
+            return None, response
 
-        with universal_data['sys']['lock']:
-            universal_data['market']['positions'] = parsed_positions
-            universal_data['market']['raw']['positions'] = response
+        return PositionBook.from_records(parse_position_records(raw_positions)), response
 
     except Exception as e:
         # If it's a real error (Network, Auth), re-raise to trigger Backoff
-        raise e
\ No newline at end of file
+        raise e
+
+
+def _num(p, key, default=0):
+    return float(p.get(key, default) or 0)
+
+
+def parse_position_records(raw_positions):
+    """
+    Nets raw API position entries straight into PositionBook records
+    (tuples in position_book.COLUMNS order, no intermediate dicts).
+    net_units is the raw signed quantity (exits are sized from it); net_qty is the same in
+    whole lots for display (lot_size is 1 for cash segments). A part lot, e.g. after a
+    lot-size revision, shows as 0 lots but still carries its units.
+    """
+    records = []
+
+    for p in raw_positions:
+        try:
+            token = p.get('tok', '')
+            segment = p.get('exSeg', 'nse_fo')
+            lot_size = _num(p, 'lotSz', 1)
+
+            multiplier = _num(p, 'multiplier', 1)
+            price_factor = (_num(p, 'genNum', 1) / _num(p, 'genDen', 1)) * (_num(p, 'prcNum', 1) / _num(p, 'prcDen', 1))
+
+            fl_buy = _num(p, 'flBuyQty')
+            fl_sell = _num(p, 'flSellQty')
+            cf_buy = _num(p, 'cfBuyQty')
+            cf_sell = _num(p, 'cfSellQty')
+
+            if 'cm' in segment.lower() or lot_size <= 0:
+                lot_size = 1
+
+            net_units = int((cf_buy + fl_buy) - (cf_sell + fl_sell))
+            net_qty = net_units / lot_size
+            buy_amt = _num(p, 'cfBuyAmt') + _num(p, 'buyAmt')
+            sell_amt = _num(p, 'cfSellAmt') + _num(p, 'sellAmt')
+            if net_units == 0 and buy_amt == 0 and sell_amt == 0:
+                continue
+
+            # Option legs: 'optTp' when present, else the CE/PE suffix of the symbol
+            symbol = p.get('trdSym', 'Unknown')
+            option_type = str(p.get('optTp', '') or '').upper()
+            if option_type not in ('CE', 'PE'):
+                option_type = symbol[-2:].upper() if symbol[-2:].upper() in ('CE', 'PE') else ''
+
+            records.append((
+                token, segment, symbol, p.get('prod', 'NRML'), option_type, _num(p, 'stkPrc'), int(lot_size),
+                int(net_qty), net_units, buy_amt, sell_amt, multiplier, price_factor
+            ))
+        except Exception:
+            continue
+
+    return records
+
+
+def parse_position_rows(raw_positions):
+    """Same as parse_position_records, as Position records."""
+    return [Position(*rec) for rec in parse_position_records(raw_positions)]
+
+
+def sync_positions(universal_data):
+    with universal_data['sys']['lock']:
+        previous = universal_data['market']['raw']['positions']
+    book, response = fetch_positions(universal_data['sys']['api'], previous)
+    if book is None:
+        return # Unchanged: no commit, no version bump
+
+    with universal_data['sys']['lock']:
+        universal_data['market']['positions'] = book
+        retain_raw(universal_data, 'positions', response)
+        mark_data_changed(universal_data)
@@ -1,23 +1,26 @@
-def sync_ltp(universal_data):
-    log = universal_data['sys']['log']
-    client = universal_data['sys']['api']
-
-    with universal_data['sys']['lock']:
-        positions = universal_data['market']['positions']
+import time
+from utils.state_events import mark_data_changed, retain_raw
 
+def fetch_ltp(client, positions, previous=None):
+    """
+    Network + Parse only (no state writes).
+    Returns ({token: ltp}, raw_response). Empty dict and None if nothing to quote.
+    If the transport hands back 'previous' (byte-identical body) parsing is skipped
+    and (None, raw_response) is returned: apply_quotes re-applies the last parsed prices.
+    """
     if not positions:
-        return
+        return {}, None
 
     try:
         quote_tokens = []
-        for p in positions:
-            if p['token'] and p['segment']:
+        for tk, seg in zip(positions.tokens, positions.segments):
+            if tk and seg:
                 quote_tokens.append({
-                    "instrument_token": str(p['token']),
-                    "exchange_segment": str(p['segment'])
+                    "instrument_token": str(tk),
+                    "exchange_segment": str(seg)
                 })
 
-        if not quote_tokens: return
+        if not quote_tokens: return {}, None
 
         response = client.quotes(instrument_tokens=quote_tokens, quote_type='ltp')
 
@@ -34,6 +37,9 @@ def sync_ltp(universal_data):
              raise Exception(f"Quote API Error: {response}")
         # -------------------------
 
+        if previous is not None and response is previous:
+            return None, response
+
         updated_quotes = {}
         for item in data_list:
             tk = item.get('instrument_token', '')
@@ -41,10 +47,44 @@ def sync_ltp(universal_data):
             if tk and ltp > 0: # Only update if we have a valid price
                 updated_quotes[tk] = ltp
 
-        with universal_data['sys']['lock']:
-            universal_data['market']['quotes'].update(updated_quotes)
-            universal_data['market']['raw']['quotes'] = response
+        return updated_quotes, response
 
     except Exception as e:
         # Re-raise to preserve old prices
-        raise e
\ No newline at end of file
+        raise e
+
+
+def apply_quotes(universal_data, updated_quotes, response):
+    """
+    Commits fetched quotes and stamps market['quotes_at'].
+    updated_quotes=None (body unchanged) re-applies the last parsed REST prices, since a
+    feed tick may have moved a mark since then. Returns {token: ltp} of the marks that moved.
+    Caller MUST already hold universal_data['sys']['lock'].
+    """
+    market = universal_data['market']
+    if updated_quotes is None:
+        updated_quotes = market['rest_quotes']
+    else:
+        market['rest_quotes'] = updated_quotes
+
+    quotes = market['quotes']
+    moved = {tk: ltp for tk, ltp in updated_quotes.items() if quotes.get(tk) != ltp}
+    quotes.update(moved)
+    market['quote_changes'].update(moved)
+    market['quotes_at'] = time.time()
+    retain_raw(universal_data, 'quotes', response)
+    return moved
+
+
+def sync_ltp(universal_data):
+    with universal_data['sys']['lock']:
+        positions = universal_data['market']['positions']
+        previous = universal_data['market']['raw']['quotes']
+
+    updated_quotes, response = fetch_ltp(universal_data['sys']['api'], positions, previous)
+    if response is None:
+        return
+
+    with universal_data['sys']['lock']:
+        if apply_quotes(universal_data, updated_quotes, response):
+            mark_data_changed(universal_data)
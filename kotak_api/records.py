@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+
+
+class _Record:
+    """
+    Mapping-style reads for slotted records: rec['field'], rec.get('field'), dict(rec).
+    Lets existing dict callers keep working while rows cost a fixed slot layout
+    instead of a per-row hash table.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            return default
+
+    def __contains__(self, key):
+        return key in self.__dataclass_fields__
+
+    def keys(self):
+        return self.__dataclass_fields__.keys()
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.__dataclass_fields__]
+
+    def as_dict(self):
+        """Plain dict copy (JSON dumps, debug snapshots)."""
+        return {k: getattr(self, k) for k in self.__dataclass_fields__}
+
+
+@dataclass(slots=True)
+class Position(_Record):
+    """One netted position row (field order == position_book.COLUMNS)."""
+    token: str
+    segment: str
+    symbol: str
+    product: str
+    option_type: str
+    strike: float
+    lot_size: int
+    net_qty: int        # Lots (display); net_units is what exits are sized from
+    net_units: int
+    total_buy_amt: float
+    total_sell_amt: float
+    multiplier: float
+    price_factor: float
+
+
+@dataclass(slots=True)
+class Order(_Record):
+    """One clean order (order_report row or merged order-feed update)."""
+    order_id: str
+    status: str
+    type: str
+    transaction_type: str
+    token: str
+    qty: float
+    filled_qty: float
+    pending_qty: float
+
+
+def record_fields(record_type):
+    return tuple(record_type.__dataclass_fields__)
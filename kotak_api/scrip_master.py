@@ -0,0 +1,112 @@
+import csv
+import io
+import threading
+from datetime import datetime
+from pathlib import Path
+import requests
+
+# Segments where exchange freeze limits apply
+FNO_SEGMENTS = ("nse_fo", "bse_fo", "mcx_fo", "cde_fo")
+CACHE_DIR = Path(__file__).parent.parent / "logs" / "scrip_master"
+
+
+class ScripMaster:
+    """
+    (segment, token) -> (lot_size, freeze_qty) from the broker scrip master CSVs.
+    Shared by all accounts (the files are the same for everyone) and loaded once per day.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limits = {}
+        self.loaded = set() # Segments already loaded
+
+    def lookup(self, segment, token):
+        with self.lock:
+            return self.limits.get((segment, str(token)))
+
+    def load_csv_text(self, segment, text):
+        limits = {}
+        reader = csv.DictReader(io.StringIO(text))
+        # Header names carry stray spaces / semicolons ("dTickSize ", "dStrikePrice;")
+        reader.fieldnames = [f.strip().rstrip(';') for f in reader.fieldnames]
+        for row in reader:
+            try:
+                token = str(row.get('pSymbol', '')).strip()
+                lot = int(float(row.get('lLotSize') or row.get('iLotSize') or 1))
+                freeze = int(float(row.get('lFreezeQty') or 0))
+                if token:
+                    limits[(segment, token)] = (max(lot, 1), freeze)
+            except (TypeError, ValueError):
+                continue
+
+        with self.lock:
+            self.limits.update(limits)
+            self.loaded.add(segment)
+        return len(limits)
+
+
+_master = ScripMaster()
+
+def get_scrip_master():
+    return _master
+
+
+def _load_segment(client, segment, log):
+    """Today's disk cache if present, else download via client.scrip_master(segment)."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_file = CACHE_DIR / f"{segment}_{datetime.now().strftime('%Y-%m-%d')}.csv"
+
+    if cache_file.exists():
+        text = cache_file.read_text(encoding='utf-8')
+    else:
+        url = client.scrip_master(exchange_segment=segment)
+        if not isinstance(url, str):
+            raise Exception(f"No scrip master file for {segment}: {url}")
+        resp = requests.get(url, timeout=30)
+        resp.raise_for_status()
+        text = resp.text
+        cache_file.write_text(text, encoding='utf-8')
+        for old in CACHE_DIR.glob(f"{segment}_*.csv"):
+            if old != cache_file: old.unlink(missing_ok=True)
+
+    count = _master.load_csv_text(segment, text)
+    log.info(f"Scrip Master {segment}: {count} instruments.", tags=["SCRIP"])
+
+
+def prefetch_scrip_master(universal_data, segments=FNO_SEGMENTS):
+    """Loads lot/freeze limits in the background at session start (skips segments already loaded)."""
+    log = universal_data['sys']['log']
+    client = universal_data['sys']['api']
+
+    def _worker():
+        for segment in segments:
+            if segment in _master.loaded:
+                continue
+            try:
+                _load_segment(client, segment, log)
+            except Exception as e:
+                log.warning(f"Scrip Master {segment} Load Failed: {e}. Exits will not be sliced.", tags=["SCRIP"])
+
+    threading.Thread(target=_worker, name=f"{universal_data['user_id']}_Scrip", daemon=True).start()
+
+
+def slice_quantity(qty, segment, token):
+    """
+    Splits an order quantity (units) into child quantities below the freeze limit.
+    Each slice is the largest lot multiple strictly below lFreezeQty. Unknown instruments
+    (or no freeze limit) return [qty] unchanged.
+    """
+    limits = _master.lookup(segment, token)
+    if not limits:
+        return [qty]
+
+    lot, freeze = limits
+    if freeze <= 0:
+        return [qty]
+
+    max_slice = ((freeze - 1) // lot) * lot
+    if max_slice <= 0 or qty <= max_slice:
+        return [qty]
+
+    full, rest = divmod(qty, max_slice)
+    return [max_slice] * full + ([rest] if rest else [])
@@ -0,0 +1,49 @@
+import time
+from collections import deque
+
+
+class AdaptiveCadence:
+    """
+    Picks the next sync delay from how close an account is to its MTM limit.
+    Recent MTM swing (max - min over a window) is subtracted from the distance, so a
+    fast-moving book is treated as nearer to the limit than its current MTM suggests.
+    """
+    def __init__(self, adaptive_conf, normal_interval):
+        self.normal = normal_interval
+        self.fast = adaptive_conf.get('fast_interval_seconds', 0.25)
+        self.slow = adaptive_conf.get('slow_interval_seconds', 5)
+        self.near_band = adaptive_conf.get('near_band_pct', 20) / 100.0
+        self.far_band = adaptive_conf.get('far_band_pct', 60) / 100.0
+        self.window = adaptive_conf.get('volatility_window_seconds', 30)
+        self.samples = deque()  # (monotonic_ts, mtm)
+
+    def record(self, mtm):
+        now = time.monotonic()
+        self.samples.append((now, mtm))
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def swing(self):
+        if len(self.samples) < 2:
+            return 0.0
+        values = [m for _, m in self.samples]
+        return max(values) - min(values)
+
+    def next_interval(self, mtm_current, mtm_limit, is_flat):
+        self.record(mtm_current)
+
+        if is_flat:
+            return self.slow
+
+        limit = abs(mtm_limit)
+        if limit == 0:
+            return self.normal
+
+        # Share of the limit still left, after allowing for the recent swing
+        headroom = (mtm_current - mtm_limit - self.swing()) / limit
+
+        if headroom <= self.near_band:
+            return self.fast
+        if headroom >= self.far_band:
+            return self.slow
+        return self.normal
@@ -2,57 +2,80 @@ import time
 import json
 import os
 from pathlib import Path
+from utils.state_events import mark_data_changed
+from services.scheduler import get_scheduler
 
+# --- CONFIGURATION ---
+CHECK_INTERVAL = 1  # Seconds between config.json mtime checks
 
-def run_config_watcher(universal_data):
+CONFIG_PATH = Path(__file__).parent.parent / "source" / "config.json"
+
+
+class ConfigWatchJob:
     """
     Monitors 'config.json'. Reloads ONLY the specific User's section.
+    Runs on the shared 'control' scheduler (one mtime check per CHECK_INTERVAL).
     """
-    log = universal_data['sys']['log']
-    user_id = universal_data['user_id'] 
-    
-    root_dir = Path(__file__).parent.parent
-    config_path = root_dir / "source" / "config.json"
-    
-    last_mtime = 0
-    if config_path.exists():
-        last_mtime = os.path.getmtime(config_path)
-
-    log.info(f"Config Watcher Active", tags=["SVC", "CONFIG"])
-
-    while True:
+    def __init__(self, universal_data):
+        self.universal_data = universal_data
+        self.log = universal_data['sys']['log']
+        self.last_mtime = os.path.getmtime(CONFIG_PATH) if CONFIG_PATH.exists() else 0
+        self.log.info(f"Config Watcher Active", tags=["SVC", "CONFIG"])
+
+    def __call__(self):
+        universal_data = self.universal_data
+        log = self.log
+        user_id = universal_data['user_id']
+
         if not universal_data['signals']['system_active']:
-            break
+            return None
 
         try:
-            current_mtime = os.path.getmtime(config_path)
-            
-            if current_mtime != last_mtime:
+            current_mtime = os.path.getmtime(CONFIG_PATH)
+
+            if current_mtime != self.last_mtime:
                 time.sleep(0.1) # Wait for write to finish
-                last_mtime = current_mtime
-                
+                self.last_mtime = current_mtime
+
                 try:
-                    with open(config_path, 'r') as f:
+                    with open(CONFIG_PATH, 'r') as f:
                         full_config = json.load(f)
-                    
+
                     if user_id in full_config:
                         new_user_config = full_config[user_id]
-                        
+
                         with universal_data['sys']['lock']:
                             # Update Raw Config
                             universal_data['sys']['config'] = new_user_config
-                            
+
                             # Update Logic Limits
                             raw_limit = new_user_config['kill_switch']['mtm_limit']
                             new_mtm_limit = -abs(float(raw_limit))
                             universal_data['risk']['mtm_limit'] = new_mtm_limit
-                        
+                            mark_data_changed(universal_data) # Re-evaluate against the new limit
+
                         log.info(f"HOT RELOAD: Limits updated to {new_mtm_limit}", tags=["CONFIG"])
-                    
+
                 except Exception as e:
                     log.error(f"Config Reload Error: {e}", tags=["CONFIG"])
 
         except Exception:
             pass
-            
-        time.sleep(1)
\ No newline at end of file
+
+        return CHECK_INTERVAL
+
+
+def _config_key(universal_data):
+    return (universal_data['user_id'], "config")
+
+
+def start_config_watcher(universal_data):
+    get_scheduler("control").register(_config_key(universal_data), ConfigWatchJob(universal_data))
+
+
+def stop_config_watcher(universal_data):
+    get_scheduler("control").unregister(_config_key(universal_data))
+
+
+def is_config_watcher_running(universal_data):
+    return get_scheduler("control").is_registered(_config_key(universal_data))
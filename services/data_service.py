@@ -1,85 +1,250 @@
 import time
-import datetime
-from kotak_api.positions import sync_positions
-from kotak_api.orders import sync_orders
-from kotak_api.quotes import sync_ltp
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from kotak_api.positions import fetch_positions
+from kotak_api.orders import fetch_order_rows
+from kotak_api.order_book import log_order_events
+from kotak_api.quotes import fetch_ltp, apply_quotes
+from kotak_api.live_feed import sync_feed_subscriptions, sync_order_feed, is_feed_live
 from kotak_api.client_login import authenticate_client
+from utils.state_events import mark_data_changed, retain_raw
+from services.scheduler import get_scheduler
+from services.cadence import AdaptiveCadence
+from utils.market_calendar import session_status
+
+# --- CONFIGURATION ---
+FETCH_WORKERS = 16          # Shared REST fetch pool (positions/orders of all accounts)
+URGENT_UTILIZATION = 0.8    # Share of the MTM limit lost before an account polls at double speed
+RELOGIN_POLL = 1            # Seconds between checks while a session refresh runs on its own thread
+
+_FETCH_POOL = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="Fetch")
+
+def _sync_cycle(universal_data, pool, stream_quotes, stream_stale, stream_orders=False):
+    """
+    One data refresh. Positions and Orders are fetched concurrently; Quotes fire as soon
+    as the position token set is known. All snapshots are committed in ONE locked block
+    (orders as a diff against the OrderBook).
+    Byte-identical responses come back as the previous objects: those parts are not parsed.
+    Unchanged quotes still re-apply the last REST prices (a feed tick may have moved a mark)
+    and refresh market['quotes_at']; a cycle where nothing moved does not bump the version.
+    """
+    client = universal_data['sys']['api']
+
+    with universal_data['sys']['lock']:
+        raw = universal_data['market']['raw']
+        prev_pos, prev_ord, prev_quotes = raw['positions'], raw['orders'], raw['quotes']
+        current_positions = universal_data['market']['positions']
+
+    fut_pos = pool.submit(fetch_positions, client, prev_pos)
+    orders_requested_at = time.monotonic()
+    fut_ord = pool.submit(fetch_order_rows, client, prev_ord)
+    if stream_orders:
+        sync_order_feed(universal_data) # SL fills land between polls
+
+    # If these fail, they raise Exception -> Caller backs off -> Old data is preserved.
+    positions, raw_pos = fut_pos.result()
+    book = positions if positions is not None else current_positions
+
+    quotes, raw_quotes = {}, None
+    if book:
+        if stream_quotes:
+            sync_feed_subscriptions(universal_data, book)
+        if not stream_quotes or not is_feed_live(universal_data, stream_stale):
+            quotes, raw_quotes = fetch_ltp(client, book, prev_quotes) # None quotes = same body as last time
+
+    order_rows, raw_ord = fut_ord.result()
+
+    if positions is None and order_rows is None and raw_quotes is None:
+        return # Nothing changed
+
+    order_events = []
+    with universal_data['sys']['lock']:
+        quotes_moved = apply_quotes(universal_data, quotes, raw_quotes) if raw_quotes is not None else {}
+        if positions is None and order_rows is None and not quotes_moved:
+            return # Only the quote timestamp moved
+        if positions is not None:
+            universal_data['market']['positions'] = positions
+            retain_raw(universal_data, 'positions', raw_pos)
+        if order_rows is not None:
+            order_events = universal_data['market']['orders'].apply_report(order_rows, orders_requested_at) # Diff, not replace
+            retain_raw(universal_data, 'orders', raw_ord)
+        mark_data_changed(universal_data)
+
+    log_order_events(universal_data['sys']['log'], order_events)
+
+class DataSyncJob:
+    """
+    One account's data sync, driven by the shared SyncScheduler.
+    Each call runs a single cycle and returns the delay until the next one (None = session over).
+    """
+    def __init__(self, universal_data):
+        self.universal_data = universal_data
+        self.log = universal_data['sys']['log']
+
+        # 1. Load Configuration
+        mon_conf = universal_data['sys']['config'].get('monitoring', {})
+        retry_conf = mon_conf.get('retry_strategy', {})
+
+        self.poll_active = mon_conf.get('poll_interval_seconds', 2)
+        self.poll_idle = mon_conf.get('off_market_interval_seconds', 60)
+
+        # Streaming Quotes (REST quotes become the fallback when the socket goes stale)
+        self.stream_quotes = mon_conf.get('stream_quotes', True)
+        self.stream_stale = mon_conf.get('stream_stale_seconds', 3)
+        self.stream_orders = mon_conf.get('stream_orders', True)
+
+        # Adaptive Cadence (fast near the MTM limit, slow when far or flat)
+        adaptive_conf = mon_conf.get('adaptive', {})
+        self.cadence = AdaptiveCadence(adaptive_conf, self.poll_active) if adaptive_conf.get('enabled', True) else None
+
+        # Retry Parameters
+        self.max_retries = retry_conf.get('max_retries', 5)
+        self.base_delay = retry_conf.get('base_delay', 2)
+        self.max_delay = retry_conf.get('max_delay', 10)
+
+        self.consecutive_errors = 0
+        self.synced_once = False
+        self.market_sleeping = False
+        self.relogin = None # Thread running authenticate_client (off the shared scheduler pool)
+        self.relogin_ok = False
+        self.log.info("Data Service Started (Resilient Mode).", tags=["SVC", "DATA"])
+
+    def __call__(self):
+        universal_data = self.universal_data
+        log = self.log
+
+        if not universal_data['signals']['system_active']:
+            return None
+
+        # Session refresh in flight: no sync until it finishes
+        if self.relogin is not None:
+            if self.relogin.is_alive():
+                return RELOGIN_POLL
+            self.relogin = None
+            if self.relogin_ok:
+                self.consecutive_errors = 0
+                log.info("Session Refreshed.", tags=["DATA", "FIX"])
+
+        # Outside every session of the held segments: no API calls until the next open.
+        # (One sync always runs first so positions/segments are known.)
+        is_open, until_open = session_status(universal_data)
+        if not is_open and self.synced_once:
+            if not self.market_sleeping:
+                when = f"{until_open / 3600:.1f}h" if until_open is not None else "unknown"
+                log.info(f"Market closed for held segments. Sleeping (next open in {when}).", tags=["DATA", "IDLE"])
+                self.market_sleeping = True
+            return until_open if until_open is not None else self.poll_idle
+
+        if self.market_sleeping:
+            log.info("Session open. Resuming sync.", tags=["DATA", "IDLE"])
+            self.market_sleeping = False
 
-def run_data_service(universal_data):
-    log = universal_data['sys']['log']
-    
-    # 1. Load Configuration
-    mon_conf = universal_data['sys']['config'].get('monitoring', {})
-    retry_conf = mon_conf.get('retry_strategy', {})
-    
-    poll_active = mon_conf.get('poll_interval_seconds', 2)
-    poll_idle = mon_conf.get('off_market_interval_seconds', 60)
-    
-    # Retry Parameters
-    max_retries = retry_conf.get('max_retries', 5)
-    base_delay = retry_conf.get('base_delay', 2)
-    max_delay = retry_conf.get('max_delay', 10)
-    
-    consecutive_errors = 0
-    
-    log.info("Data Service Started (Resilient Mode).", tags=["SVC", "DATA"])
-    
-    while universal_data['signals']['system_active']:
         try:
             # --- SYNC DATA ---
-            # If these fail, they raise Exception -> We jump to 'except' -> Old data is preserved.
-            sync_positions(universal_data)
-            sync_orders(universal_data)
-            
-            with universal_data['sys']['lock']:
-                has_pos = bool(universal_data['market']['positions'])
-            
-            if has_pos:
-                sync_ltp(universal_data)
+            # If this fails, it raises Exception -> We jump to 'except' -> Old data is preserved.
+            _sync_cycle(universal_data, _FETCH_POOL, self.stream_quotes, self.stream_stale, self.stream_orders)
 
             # --- SUCCESS PATH ---
-            if consecutive_errors > 0:
+            if self.consecutive_errors > 0:
                 log.info("Connection re-established.", tags=["DATA", "HEAL"])
-                consecutive_errors = 0
-            
+                self.consecutive_errors = 0
+
             # Mark data as Fresh
             with universal_data['sys']['lock']:
                 universal_data['status']['data_stale'] = False
 
-            # Sleep
-            now = datetime.datetime.now().time()
-            is_market_open = datetime.time(9, 0) <= now <= datetime.time(23, 55)
-            time.sleep(poll_active if is_market_open else poll_idle)
+            self.synced_once = True
+            if not is_open:
+                return 0 # Re-evaluated at the top: goes straight to sleep
+
+            return self._next_interval()
 
         except Exception as e:
             # --- FAILURE PATH ---
-            consecutive_errors += 1
-            
+            self.consecutive_errors += 1
+
             # Mark data as Stale (UI can show warning, but MTM retains value)
             with universal_data['sys']['lock']:
                 universal_data['status']['data_stale'] = True
-                
+
             # Calculate Backoff (2s, 4s, 8s...)
-            sleep_time = min(base_delay * (2 ** (consecutive_errors - 1)), max_delay)
-            
+            sleep_time = min(self.base_delay * (2 ** (self.consecutive_errors - 1)), self.max_delay)
+
             err_msg = str(e)
-            if consecutive_errors == 1:
+            if self.consecutive_errors == 1:
                 log.warning(f"Connection Lost: {err_msg}. Retrying in {sleep_time}s...", tags=["DATA", "WARN"])
-            elif consecutive_errors % 5 == 0:
-                log.warning(f"Still disconnected (Attempt {consecutive_errors})...", tags=["DATA", "WAIT"])
+            elif self.consecutive_errors % 5 == 0:
+                log.warning(f"Still disconnected (Attempt {self.consecutive_errors})...", tags=["DATA", "WAIT"])
 
             # Auto-Heal (Re-Login) if stuck too long
-            if consecutive_errors > max_retries:
+            if self.consecutive_errors > self.max_retries:
                 log.error("Max Retries Hit. Attempting Session Refresh...", tags=["DATA", "FIX"])
-                try:
-                    authenticate_client(universal_data)
-                    consecutive_errors = 0 # Reset if auth works
-                    log.info("Session Refreshed.", tags=["DATA", "FIX"])
-                    time.sleep(1)
-                    continue 
-                except:
-                    pass # Auth failed, wait loop continues
-
-            time.sleep(sleep_time)
-
-    log.info("Data Service Stopped", tags=["SVC", "DATA"])
\ No newline at end of file
+                self._start_relogin()
+                return RELOGIN_POLL
+
+            return sleep_time
+
+    def _start_relogin(self):
+        """
+        authenticate_client can block on an OTP, so it runs on its own thread: one account
+        re-logging in must not hold a shared scheduler worker the other accounts sync on.
+        """
+        universal_data = self.universal_data
+
+        def _worker():
+            try:
+                authenticate_client(universal_data)
+                self.relogin_ok = True
+            except Exception as e:
+                self.log.warning(f"Session Refresh Failed: {e}", tags=["DATA", "FIX"]) # Wait loop continues
+
+        self.relogin_ok = False
+        self.relogin = threading.Thread(target=_worker, name=f"{universal_data['user_id']}_Relogin", daemon=True)
+        with universal_data['sys']['lock']:
+            universal_data['sys']['threads']['Relogin'] = self.relogin
+        self.relogin.start()
+
+
+    def _next_interval(self):
+        universal_data = self.universal_data
+        with universal_data['sys']['lock']:
+            mtm_current = universal_data['risk']['mtm_current']
+            mtm_limit = universal_data['risk']['mtm_limit']
+            is_flat = universal_data['market']['positions'].is_flat()
+
+        if self.cadence:
+            return self.cadence.next_interval(mtm_current, mtm_limit, is_flat)
+
+        # Fixed cadence: accounts close to their limit still poll faster
+        if sync_priority(universal_data) >= URGENT_UTILIZATION:
+            return self.poll_active / 2
+        return self.poll_active
+
+
+def sync_priority(universal_data):
+    """Scheduler priority: fraction of the MTM limit already lost (0.0 = safe, 1.0 = at limit)."""
+    with universal_data['sys']['lock']:
+        mtm = universal_data['risk'].get('mtm_current', 0.0) or 0.0
+        limit = universal_data['risk'].get('mtm_limit', 0.0) or 0.0
+
+    if mtm >= 0 or limit >= 0:
+        return 0.0
+    return min(mtm / limit, 1.0)
+
+
+def start_data_service(universal_data):
+    """Registers this account's sync job with the shared scheduler."""
+    get_scheduler().register(
+        universal_data['user_id'],
+        DataSyncJob(universal_data),
+        priority_fn=lambda: sync_priority(universal_data)
+    )
+
+
+def stop_data_service(universal_data):
+    get_scheduler().unregister(universal_data['user_id'])
+    universal_data['sys']['log'].info("Data Service Stopped", tags=["SVC", "DATA"])
+
+
+def is_data_service_running(universal_data):
+    return get_scheduler().is_registered(universal_data['user_id'])
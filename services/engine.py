@@ -5,12 +5,20 @@ from pathlib import Path
 from utils.initialize import create_bot_state
 from kotak_api.client_login import authenticate_client
 from utils.file_ops import update_kill_history_disk
+from kotak_api.live_feed import stop_live_feed
+from kotak_api.scrip_master import prefetch_scrip_master
+from web_automation.warm_browser import start_warm_browser, stop_warm_browser
+from web_automation.mailbox import start_mailbox, stop_mailbox
 
 # Service Imports
-from services.data_service import run_data_service
-from services.risk_service import run_risk_service
-from services.kill_switch_service import run_kill_switch_service
-from services.config_watcher import run_config_watcher
+from services.scheduler import get_scheduler
+from services.data_service import start_data_service, stop_data_service, is_data_service_running
+from services.risk_service import start_risk_service, stop_risk_service, is_risk_service_running
+from services.kill_switch_service import start_kill_service, stop_kill_service, is_kill_service_running
+from services.config_watcher import start_config_watcher, stop_config_watcher, is_config_watcher_running
+
+# --- CONFIGURATION ---
+WATCHDOG_INTERVAL = 5   # Seconds between service health checks
 
 class TradeEngine:
     def __init__(self, user_id):
@@ -18,14 +26,18 @@ class TradeEngine:
         self.state = create_bot_state(user_id) 
         self.log = self.state['sys']['log']
         
+        # Services are jobs on the shared schedulers (services/scheduler.py), not threads:
+        # Data on the 'sync' lane; Config, Risk, Kill (arming) and the Watchdog on 'control'.
+        # name -> (start, is_running)
         self.core_services = {
-            "Data": run_data_service,
-            "Config": run_config_watcher
+            "Data": (start_data_service, is_data_service_running),
+            "Config": (start_config_watcher, is_config_watcher_running)
         }
         self.active_services = {
-            "Risk": run_risk_service,
-            "Kill": run_kill_switch_service
+            "Risk": (start_risk_service, is_risk_service_running),
+            "Kill": (start_kill_service, is_kill_service_running)
         }
+        self.watchdog_key = (user_id, "watchdog")
 
         if self.state['sys']['config'].get('account_active', False):
              self.start_session()
@@ -62,16 +74,19 @@ class TradeEngine:
             self.state['status']['stage'] = "AUTH_ERR"
             return
 
-        for name, func in self.core_services.items():
-            self._spawn_thread(func, name)
+        prefetch_scrip_master(self.state) # Lot/freeze limits for exit slicing (background)
+        for start, _ in self.core_services.values():
+            start(self.state)
 
         if not is_locked:
-            for name, func in self.active_services.items():
-                self._spawn_thread(func, name)
+            for start, _ in self.active_services.values():
+                start(self.state)
+            start_mailbox(self.state) # IDLE push for OTP / kill emails (before the warm login needs an OTP)
+            start_warm_browser(self.state) # Optional logged-in standby for the web kill
         else:
             self.log.warning("Risk & Kill services disabled (Daily Lock).", tags=["SYS", "LOCK"])
 
-        self._spawn_thread(self._watchdog_loop, "Watchdog")
+        get_scheduler("control").register(self.watchdog_key, self._watchdog)
         self.log.info(f"Session Started in {mode_str}.", tags=["SYS", "OK"])
 
     def stop_session(self):
@@ -81,13 +96,23 @@ class TradeEngine:
         with self.state['sys']['lock']:
             self.state['signals']['system_active'] = False
             self.state['status']['stage'] = "STOPPING"
-
-        threads = self.state['sys']['threads']
+            self.state['sys']['data_changed'].notify_all() # Release waiting services
+
+        get_scheduler("control").unregister(self.watchdog_key)
+        stop_data_service(self.state)
+        stop_config_watcher(self.state)
+        stop_risk_service(self.state)
+        stop_kill_service(self.state)
+        threads = self.state['sys']['threads'] # Only a kill sequence in flight, if any
         for name, t in list(threads.items()):
             if t.is_alive() and t is not threading.current_thread():
                 t.join(timeout=1.0) 
             if name in threads: del threads[name]
 
+        stop_live_feed(self.state)
+        stop_warm_browser(self.state)
+        stop_mailbox(self.state)
+
         with self.state['sys']['lock']:
             self.state['sys']['api'] = None
             self.state['status']['stage'] = "IDLE"
@@ -132,34 +157,36 @@ class TradeEngine:
             
         update_kill_history_disk(self.user_id, verified=False)
 
-    def _spawn_thread(self, target_func, name):
-        t_name = f"{self.user_id}_{name}"
-        t = threading.Thread(target=target_func, args=(self.state,), name=t_name, daemon=True)
-        t.start()
-        self.state['sys']['threads'][name] = t
-
-    def _watchdog_loop(self, state):
+    def running_services(self):
+        """Names of the account's services that are currently scheduled / running."""
+        names = [name for name, (_, is_running) in {**self.core_services, **self.active_services}.items()
+                 if is_running(self.state)]
+        if get_scheduler("control").is_registered(self.watchdog_key):
+            names.append("Watchdog")
+        return names
+
+    def _watchdog(self):
+        """Re-registers dropped service jobs. Runs on the 'control' scheduler every WATCHDOG_INTERVAL."""
+        state = self.state
         log = state['sys']['log']
-        while state['signals']['system_active']:
-            time.sleep(5) 
-            is_locked = state['signals'].get('is_locked_today', False)
-            with state['sys']['lock']:
-                threads = state['sys']['threads']
-            
-            for name, func in self.core_services.items():
-                if name not in threads or not threads[name].is_alive():
-                    if state['signals']['system_active']:
-                        log.warning(f"Core Service '{name}' died! Restarting...", tags=["SYS", "FIX"])
-                        self._spawn_thread(func, name)
+        if not state['signals']['system_active']:
+            return None
+
+        for name, (start, is_running) in self.core_services.items():
+            if not is_running(state) and state['signals']['system_active']:
+                log.warning(f"Core Service '{name}' dropped! Restarting...", tags=["SYS", "FIX"])
+                start(state)
+
+        if not state['signals'].get('is_locked_today', False):
+            for name, (start, is_running) in self.active_services.items():
+                if is_running(state):
+                    continue
+                if name == "Kill" and state['signals']['kill_executed']: continue
+                if state['signals']['system_active']:
+                    log.warning(f"Active Service '{name}' dropped! Restarting...", tags=["SYS", "FIX"])
+                    start(state)
+        return WATCHDOG_INTERVAL
 
-            if not is_locked:
-                for name, func in self.active_services.items():
-                    if name not in threads or not threads[name].is_alive():
-                        if name == "Kill" and state['signals']['kill_executed']: continue
-                        if state['signals']['system_active']:
-                            log.warning(f"Active Service '{name}' died! Restarting...", tags=["SYS", "FIX"])
-                            self._spawn_thread(func, name)
-    
     def _reload_credentials(self):
         try:
             path = Path(__file__).parent.parent / "source" / "credentials.json"
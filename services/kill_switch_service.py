@@ -2,10 +2,17 @@ import time
 import threading
 from datetime import datetime
 from web_automation.automate import execute_kill_switch
-from web_automation.automate_utils import check_kill_email
+from web_automation.automate_utils import wait_kill_email
 from kotak_api.exit_trade import square_off_all_positions
 from utils.file_ops import update_kill_history_disk
 from utils.telegram_notifier import send_alert 
+from utils.latency import mark_stage, finish_kill_trace
+from services.scheduler import get_scheduler
+
+# --- CONFIGURATION ---
+ARM_POLL = 0.5          # Trigger check interval while armed (risk triggers wake the job at once)
+DISABLED_RECHECK = 5    # Re-check interval while triggered but kill_switch.enabled is off
+
 
 def _async_verification_worker(universal_data):
     """Background worker for email verification."""
@@ -15,12 +22,11 @@ def _async_verification_worker(universal_data):
     start_time = time.time()
     found = False
     
-    # Poll for 5 minutes
+    # Wait up to 5 minutes (pushed by the mailbox watcher, else polled every 20s)
     while time.time() - start_time < 300:
-        if check_kill_email(universal_data, lookback_seconds=600):
+        if wait_kill_email(universal_data, lookback_seconds=600, timeout=20):
             found = True
             break
-        time.sleep(20)
     
     # Final Result
     status_msg = "VERIFIED" if found else "UNVERIFIED"
@@ -39,73 +45,123 @@ def _async_verification_worker(universal_data):
         else:
             universal_data['status']['stage'] = "KILLED (UNVERIFIED)"
 
-def run_kill_switch_service(universal_data):
+class KillArmJob:
+    """
+    Watches for signals['trigger_kill'] on the shared 'control' scheduler (no thread per
+    account while armed). The risk job wakes it the moment it triggers; manual triggers are
+    seen within ARM_POLL. Starts the kill sequence thread once and retires.
+    """
+    def __init__(self, universal_data):
+        self.universal_data = universal_data
+        universal_data['sys']['log'].info("Kill Switch Service Armed.", tags=["SVC", "KILL"])
+
+    def __call__(self):
+        universal_data = self.universal_data
+        if not universal_data['signals']['system_active']:
+            return None
+
+        with universal_data['sys']['lock']:
+            triggered = universal_data['signals']['trigger_kill']
+            executed = universal_data['signals']['kill_executed']
+            kill_enabled = universal_data['sys']['config']['kill_switch'].get('enabled', False)
+
+        if not triggered or executed:
+            return ARM_POLL
+        if not kill_enabled:
+            universal_data['sys']['log'].warning("RISK TRIGGERED but Kill Switch DISABLED.", tags=["RISK"])
+            return DISABLED_RECHECK
+
+        t = threading.Thread(target=_run_kill_sequence, args=(universal_data,),
+                             name=f"{universal_data['user_id']}_Kill", daemon=True)
+        with universal_data['sys']['lock']:
+            universal_data['sys']['threads']['Kill'] = t
+        t.start()
+        return None
+
+
+def _run_kill_sequence(universal_data):
+    """Square-off + browser kill + verification. Blocks for the whole browser automation."""
     log = universal_data['sys']['log']
+    with universal_data['sys']['lock']:
+        ks_config = universal_data['sys']['config']['kill_switch']
+        auto_sq = ks_config.get('auto_square_off', False)
+        gmail_conf = universal_data['sys']['config'].get('gmail', {})
+        verify_enabled = gmail_conf.get('enable_verification', True)
+
+    mark_stage(universal_data, "kill_noticed")
+    with universal_data['sys']['lock']:
+        universal_data['status']['stage'] = "KILLING"
     
-    log.info("Kill Switch Service Armed.", tags=["SVC", "KILL"])
+    # Notify Start
+    send_alert(universal_data, "⚔️ **KILL SWITCH ACTIVATED**\nExecuting Auto-Square Off & Browser Kill.")
+    log.info(">>> INITIATING KILL SEQUENCE <<<", tags=["KILL", "EXEC"])
     
-    while universal_data['signals']['system_active']:
+    threads = []
+    if auto_sq:
+        t1 = threading.Thread(target=square_off_all_positions, args=(universal_data,))
+        t1.start()
+        threads.append(t1)
+        
+    browser_success = False
+    try:
+        execute_kill_switch(universal_data)
+        browser_success = True
         with universal_data['sys']['lock']:
-            triggered = universal_data['signals']['trigger_kill']
-            executed = universal_data['signals']['kill_executed']
-            ks_config = universal_data['sys']['config']['kill_switch']
-            kill_enabled = ks_config.get('enabled', False)
-            auto_sq = ks_config.get('auto_square_off', False)
-            gmail_conf = universal_data['sys']['config'].get('gmail', {})
-            verify_enabled = gmail_conf.get('enable_verification', True)
-
-        if triggered and not executed:
-            if not kill_enabled:
-                log.warning("RISK TRIGGERED but Kill Switch DISABLED.", tags=["RISK"])
-                time.sleep(5)
-                continue
+            universal_data['signals']['kill_executed'] = True
+    except Exception as e:
+        log.critical(f"Browser Kill Failed: {e}", tags=["KILL", "FAIL"])
+        send_alert(universal_data, f"❌ **BROWSER KILL FAILED**\nError: {e}")
+        with universal_data['sys']['lock']:
+            universal_data['status']['stage'] = "ERROR"
+            universal_data['status']['error_message'] = "Browser Kill Failed"
+
+    mark_stage(universal_data, "kill_done")
+    for t in threads: t.join(timeout=5.0)
 
+    record = finish_kill_trace(universal_data, "OK" if browser_success else "BROWSER_FAIL")
+    if record:
+        log.info(f"Kill Latency: {record['total_ms']}ms {record['stages_ms']}", tags=["KILL", "LAT"])
+
+    if browser_success:
+        if verify_enabled:
             with universal_data['sys']['lock']:
-                universal_data['status']['stage'] = "KILLING"
-            
-            # Notify Start
-            send_alert(universal_data, "⚔️ **KILL SWITCH ACTIVATED**\nExecuting Auto-Square Off & Browser Kill.")
-            log.info(">>> INITIATING KILL SEQUENCE <<<", tags=["KILL", "EXEC"])
+                universal_data['signals']['is_locked_today'] = True
+                universal_data['status']['stage'] = "KILLED (WAITING)"
             
-            threads = []
-            if auto_sq:
-                t1 = threading.Thread(target=square_off_all_positions, args=(universal_data,))
-                t1.start()
-                threads.append(t1)
-                
-            browser_success = False
-            try:
-                execute_kill_switch(universal_data)
-                browser_success = True
-                with universal_data['sys']['lock']:
-                    universal_data['signals']['kill_executed'] = True
-            except Exception as e:
-                log.critical(f"Browser Kill Failed: {e}", tags=["KILL", "FAIL"])
-                send_alert(universal_data, f"❌ **BROWSER KILL FAILED**\nError: {e}")
-                with universal_data['sys']['lock']:
-                    universal_data['status']['stage'] = "ERROR"
-                    universal_data['status']['error_message'] = "Browser Kill Failed"
-
-            for t in threads: t.join(timeout=5.0)
-
-            if browser_success:
-                if verify_enabled:
-                    with universal_data['sys']['lock']:
-                        universal_data['signals']['is_locked_today'] = True
-                        universal_data['status']['stage'] = "KILLED (WAITING)"
-                    
-                    t_verify = threading.Thread(target=_async_verification_worker, args=(universal_data,), daemon=True)
-                    t_verify.start()
-                else:
-                    # Verification Disabled
-                    send_alert(universal_data, "✅ **Kill Complete** (Verification Disabled). Account Locked.")
-                    update_kill_history_disk(universal_data['user_id'], True)
-                    with universal_data['sys']['lock']:
-                        universal_data['signals']['is_locked_today'] = True
-                        universal_data['sys']['config']['kill_history']['verified'] = True
-                        universal_data['sys']['config']['kill_history']['locked_date'] = datetime.now().strftime("%Y-%m-%d")
-                        universal_data['status']['stage'] = "KILLED (NO VERIFY)"
-                
-                break
-
-        time.sleep(0.5)
\ No newline at end of file
+            t_verify = threading.Thread(target=_async_verification_worker, args=(universal_data,), daemon=True)
+            t_verify.start()
+        else:
+            # Verification Disabled
+            send_alert(universal_data, "✅ **Kill Complete** (Verification Disabled). Account Locked.")
+            update_kill_history_disk(universal_data['user_id'], True)
+            with universal_data['sys']['lock']:
+                universal_data['signals']['is_locked_today'] = True
+                universal_data['sys']['config']['kill_history']['verified'] = True
+                universal_data['sys']['config']['kill_history']['locked_date'] = datetime.now().strftime("%Y-%m-%d")
+                universal_data['status']['stage'] = "KILLED (NO VERIFY)"
+    elif universal_data['signals']['system_active']:
+        time.sleep(ARM_POLL)
+        start_kill_service(universal_data) # Re-arm: the browser kill is retried
+
+
+def _kill_key(universal_data):
+    return (universal_data['user_id'], "kill")
+
+
+def start_kill_service(universal_data):
+    get_scheduler("control").register(_kill_key(universal_data), KillArmJob(universal_data))
+
+
+def stop_kill_service(universal_data):
+    get_scheduler("control").unregister(_kill_key(universal_data))
+
+
+def arm_kill_now(universal_data):
+    """Checks the trigger right away (called by the risk job when it sets trigger_kill)."""
+    get_scheduler("control").wake(_kill_key(universal_data))
+
+
+def is_kill_service_running(universal_data):
+    """Armed on the scheduler, or a kill sequence in progress."""
+    kill_thread = universal_data['sys']['threads'].get('Kill')
+    return get_scheduler("control").is_registered(_kill_key(universal_data)) or bool(kill_thread and kill_thread.is_alive())
@@ -4,71 +4,133 @@ from trigger_logic.stop_loss import check_sl_status
 from web_automation.automate_utils import check_kill_email
 from utils.file_ops import update_kill_history_disk
 from utils.telegram_notifier import send_alert # <--- NEW IMPORT
+from utils.market_calendar import session_status
+from utils.latency import mark_stage
+from web_automation.mailbox import get_mailbox
+from services.scheduler import get_scheduler
+from services.data_service import sync_priority
+from services.kill_switch_service import arm_kill_now
+
+# --- CONFIGURATION ---
+ERROR_DELAY = 5     # Seconds before re-evaluating after a risk loop error
+
+
+class RiskJob:
+    """
+    One account's risk evaluation, run on the shared 'control' scheduler.
+    mark_data_changed() wakes it (sys['data_listeners']), so a new sync or tick is
+    evaluated at once; otherwise it re-checks every poll interval (or at the next open).
+    Returns None once the session stops or an external kill locks the account.
+    """
+    def __init__(self, universal_data):
+        self.universal_data = universal_data
+        self.log = universal_data['sys']['log']
+        self.poll_interval = universal_data['sys']['config']['monitoring']['poll_interval_seconds']
+        self.last_log_time = 0
+        self.last_email_check = time.time()
+        self.last_version = -1
+        self.log.info(f"Risk Service Started.", tags=["SVC", "RISK"])
+
+    def __call__(self):
+        universal_data = self.universal_data
+        log = self.log
+        user_id = universal_data['user_id']
+
+        if not universal_data['signals']['system_active']:
+            log.info("Risk Service Stopped", tags=["SVC", "RISK"])
+            return None
 
-def run_risk_service(universal_data):
-    log = universal_data['sys']['log']
-    user_id = universal_data['user_id']
-    
-    poll_interval = universal_data['sys']['config']['monitoring']['poll_interval_seconds']
-    
-    log.info(f"Risk Service Started.", tags=["SVC", "RISK"])
-    
-    last_log_time = 0
-    last_email_check = time.time()
-
-    while universal_data['signals']['system_active']:
         try:
-            # 1. Config & Logic
+            # 1. Next check: woken on new data; 'poll_interval' caps idle time.
+            #    Outside the held segments' sessions the cap stretches to the next open.
+            is_open, until_open = session_status(universal_data)
+            wait_cap = self.poll_interval if is_open or until_open is None else until_open
+            with universal_data['sys']['lock']:
+                version = universal_data['market']['version']
+
+            # 2. Config & Logic
             ks_config = universal_data['sys']['config']['kill_switch']
             req_sl_conf = ks_config.get('sell_order_exit_confirmation', True)
-            
-            # 2. Update Metrics
-            calculate_mtm(universal_data)
-            check_sl_status(universal_data)
-            
+
+            # 3. Update Metrics (Skipped when nothing changed)
+            if version != self.last_version:
+                calculate_mtm(universal_data)
+                check_sl_status(universal_data)
+                self.last_version = version
+
             with universal_data['sys']['lock']:
                 mtm_current = universal_data['risk']['mtm_current']
                 mtm_limit = universal_data['risk']['mtm_limit']
                 sl_hit = universal_data['risk']['sl_hit_status']
                 triggered = universal_data['signals']['trigger_kill']
+                data_ts = universal_data['market']['changed_at']
 
-            # 3. Heartbeat
-            if time.time() - last_log_time > 60:
+            # 4. Heartbeat
+            if time.time() - self.last_log_time > 60:
                 log.info(f"Status: MTM={mtm_current} / Limit={mtm_limit} | SL_Hit={sl_hit}", tags=["RISK", "HB"])
-                last_log_time = time.time()
+                self.last_log_time = time.time()
 
-            # 4. Trigger Logic
+            # 5. Trigger Logic
             if not triggered:
                 mtm_breach = mtm_current <= mtm_limit
                 should_trigger = mtm_breach and (not req_sl_conf or sl_hit)
-                
+
                 if should_trigger:
+                    mark_stage(universal_data, "tick", data_ts)
+                    mark_stage(universal_data, "detected")
                     msg = f"⚠️ **RISK TRIGGERED**\nMTM: {mtm_current}\nSL Hit: {sl_hit}\nInitiating Kill Switch."
                     log.warning(msg.replace("*", ""), tags=["RISK", "ALERT"])
                     send_alert(universal_data, msg) # <--- TELEGRAM ALERT
-                    
+
                     with universal_data['sys']['lock']:
                         universal_data['signals']['trigger_kill'] = True
+                    mark_stage(universal_data, "triggered")
+                    arm_kill_now(universal_data)
 
-            # 5. External Kill Detection (Slow Poll)
-            if time.time() - last_email_check > 120:
+            # 6. External Kill Detection (Every run from the IDLE watcher, else slow poll)
+            watcher = get_mailbox(universal_data)
+            mailbox_live = watcher is not None and watcher.is_connected()
+            if is_open and (mailbox_live or time.time() - self.last_email_check > 120):
                 if check_kill_email(universal_data, lookback_seconds=300):
                     msg = "🛑 **EXTERNAL KILL DETECTED**\nKill email found in Gmail. Locking account."
                     log.warning("External Kill Detected via Email!", tags=["RISK", "EXTERNAL"])
                     send_alert(universal_data, msg) # <--- TELEGRAM ALERT
-                    
+
                     update_kill_history_disk(user_id, True)
                     with universal_data['sys']['lock']:
                         universal_data['signals']['is_locked_today'] = True
                         universal_data['signals']['system_active'] = False
                         universal_data['status']['stage'] = "KILLED (EXTERNAL)"
-                    break
-                last_email_check = time.time()
-            
-            time.sleep(poll_interval)
+                    log.info("Risk Service Stopped", tags=["SVC", "RISK"])
+                    return None
+                self.last_email_check = time.time()
+
+            return wait_cap
 
         except Exception as e:
             log.error(f"Risk Loop Error: {e}", tags=["RISK"])
-            time.sleep(5)
+            return ERROR_DELAY
+
+
+def _risk_key(universal_data):
+    return (universal_data['user_id'], "risk")
+
+
+def start_risk_service(universal_data):
+    """Registers the account's RiskJob and hooks it to market data changes."""
+    key = _risk_key(universal_data)
+    scheduler = get_scheduler("control")
+    listeners = universal_data['sys'].setdefault('data_listeners', {})
+    with universal_data['sys']['lock']:
+        listeners['risk'] = lambda: scheduler.wake(key)
+    scheduler.register(key, RiskJob(universal_data), priority_fn=lambda: sync_priority(universal_data))
+
+
+def stop_risk_service(universal_data):
+    with universal_data['sys']['lock']:
+        universal_data['sys'].get('data_listeners', {}).pop('risk', None)
+    get_scheduler("control").unregister(_risk_key(universal_data))
+
 
-    log.info("Risk Service Stopped", tags=["SVC", "RISK"])
\ No newline at end of file
+def is_risk_service_running(universal_data):
+    return get_scheduler("control").is_registered(_risk_key(universal_data))
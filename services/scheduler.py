@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION ---
+MAX_WORKERS = 8         # Upper bound on concurrently running sync jobs (all accounts)
+ERROR_RETRY_DELAY = 5   # Seconds before re-running a job that raised
+
+# Lane -> worker count. Network-bound data syncs and the short risk / config / watchdog
+# checks get separate schedulers, so a slow broker call never delays a risk evaluation.
+LANES = {
+    "sync": MAX_WORKERS,
+    "control": 4
+}
+
+
+class SyncScheduler:
+    """
+    One timer thread + one bounded worker pool shared by every engine.
+    A job is a callable returning the delay (seconds) until its next run, or None to stop.
+    When several accounts are due together, the most urgent one (highest priority_fn()) runs first.
+    A job never runs twice at once; wake() pulls its next run forward to now (event-driven jobs).
+    """
+    def __init__(self, max_workers=MAX_WORKERS, name="Sync"):
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap = []         # (due_monotonic, generation, key)
+        self._jobs = {}         # key -> (job, priority_fn, generation)
+        self._due = {}          # key -> due_monotonic of its live heap entry
+        self._running = set()   # keys currently on a worker
+        self._woken = set()     # keys woken while running (re-run as soon as they finish)
+        self._gen = itertools.count()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}Worker")
+        self._thread = None
+
+    def register(self, key, job, priority_fn=None):
+        """Schedules 'job' to run immediately. Re-registering a key replaces the old job."""
+        with self._cond:
+            gen = next(self._gen)
+            self._jobs[key] = (job, priority_fn, gen)
+            self._push(key, gen, time.monotonic())
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._timer_loop, name=f"{self.name}Scheduler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, key):
+        with self._cond:
+            self._jobs.pop(key, None) # Stale heap entries are dropped by generation check
+            self._due.pop(key, None)
+
+    def wake(self, key):
+        """Runs 'key' as soon as possible (right after its current run if one is in progress)."""
+        with self._cond:
+            entry = self._jobs.get(key)
+            if entry is None:
+                return
+            if key in self._running:
+                self._woken.add(key)
+                return
+            now = time.monotonic()
+            if self._due.get(key, now) > now:
+                self._push(key, entry[2], now)
+
+    def is_registered(self, key):
+        with self._cond:
+            return key in self._jobs
+
+    def _timer_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+
+                now = time.monotonic()
+                due = self._heap[0][0]
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+
+                ready = []
+                while self._heap and self._heap[0][0] <= now:
+                    due, gen, key = heapq.heappop(self._heap)
+                    entry = self._jobs.get(key)
+                    if entry is None or entry[2] != gen or self._due.get(key) != due:
+                        continue # Unregistered, replaced or superseded by a wake()
+                    del self._due[key]
+                    if key in self._running:
+                        continue # Re-registered mid-run: _run_job re-queues it when the old run ends
+                    self._running.add(key)
+                    ready.append((key, entry))
+
+            # Most urgent accounts are dispatched first
+            ready.sort(key=lambda r: -self._priority(r[1][1]))
+            for key, (job, _, gen) in ready:
+                self._pool.submit(self._run_job, key, job, gen)
+
+    @staticmethod
+    def _priority(priority_fn):
+        if priority_fn is None:
+            return 0.0
+        try:
+            return priority_fn()
+        except Exception:
+            return 0.0
+
+    def _run_job(self, key, job, gen):
+        try:
+            delay = job()
+        except Exception:
+            delay = ERROR_RETRY_DELAY
+
+        with self._cond:
+            self._running.discard(key)
+            woken = key in self._woken
+            self._woken.discard(key)
+            entry = self._jobs.get(key)
+            if entry is None or entry[2] != gen:
+                if entry is not None and key not in self._due:
+                    self._push(key, entry[2], time.monotonic()) # Re-registered while running
+                return
+            if delay is None:
+                del self._jobs[key]
+                return
+            self._push(key, gen, time.monotonic() + (0 if woken else delay))
+
+    def _push(self, key, gen, due):
+        """Caller holds self._cond."""
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, gen, key))
+        self._cond.notify()
+
+
+_schedulers = {}
+_scheduler_lock = threading.Lock()
+
+def get_scheduler(lane="sync"):
+    """Process-wide scheduler for 'lane' (see LANES), shared by all TradeEngines."""
+    with _scheduler_lock:
+        if lane not in _schedulers:
+            _schedulers[lane] = SyncScheduler(LANES[lane], name=lane.capitalize())
+        return _schedulers[lane]
@@ -0,0 +1,121 @@
+# Micro-benchmark: broker response decode + parse (positions / order report).
+# Compares the stdlib path (json + row dicts) with fast_json + direct records,
+# the OrderBook's cold load with an unchanged-report diff, and row memory (dicts vs slotted records).
+#   python tests/bench_json_parse.py
+#   python tests/bench_json_parse.py --positions recorded_positions.json --orders recorded_orders.json
+# Recorded payloads are raw API responses (e.g. market['raw'] from the debug state dump).
+
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils import fast_json
+from kotak_api.positions import parse_position_rows, parse_position_records
+from kotak_api.position_book import PositionBook
+from kotak_api.orders import parse_order_row
+from kotak_api.order_book import OrderBook
+
+
+def synth_positions(n):
+    rows = []
+    for i in range(n):
+        strike = 20000 + 50 * (i % 80)
+        side = random.choice(["CE", "PE"])
+        rows.append({
+            "tok": str(40000 + i), "exSeg": "nse_fo", "trdSym": f"NIFTY24DEC{strike}{side}", "sym": "NIFTY",
+            "prod": random.choice(["NRML", "MIS"]), "optTp": side, "stkPrc": f"{strike}.00", "lotSz": "75",
+            "multiplier": "1", "genNum": "1", "genDen": "1", "prcNum": "1", "prcDen": "1", "precision": "2",
+            "flBuyQty": str(75 * random.randint(0, 20)), "flSellQty": str(75 * random.randint(0, 20)),
+            "cfBuyQty": "0", "cfSellQty": "0", "buyAmt": f"{random.uniform(0, 1e5):.2f}",
+            "sellAmt": f"{random.uniform(0, 1e5):.2f}", "cfBuyAmt": "0.00", "cfSellAmt": "0.00",
+            "expDt": "26 Dec, 2024", "series": "XX", "type": "OPTIDX", "hsUpTm": "2024/12/20 10:15:31",
+        })
+    return {"stat": "Ok", "stCode": 200, "data": rows}
+
+
+def synth_orders(n):
+    rows = []
+    for i in range(n):
+        rows.append({
+            "nOrdNo": str(241220000000000 + i), "ordSt": random.choice(["complete", "rejected", "open", "cancelled"]),
+            "prcTp": random.choice(["L", "MKT", "SL"]), "trnsTp": random.choice(["B", "S"]), "tok": str(40000 + i % 300),
+            "qty": "75", "fldQty": random.choice(["0", "75"]), "prc": f"{random.uniform(10, 300):.2f}",
+            "trgPrc": "0.00", "trdSym": "NIFTY24DEC24000CE", "exSeg": "nse_fo", "prod": "NRML",
+            "ordDtTm": "20-Dec-2024 10:15:31", "rejRsn": "--", "vldt": "DAY", "avgPrc": "0.00",
+            "exOrdId": str(1100000000000000 + i), "usrId": "ABCDE", "actId": "ABC123", "brdLtQty": 75,
+        })
+    return {"stat": "Ok", "stCode": 200, "data": rows}
+
+
+def bench(label, fn, repeat):
+    fn() # Warm-up
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {label:<48} {best * 1000:9.3f} ms")
+    return best
+
+
+def footprint(build):
+    """Bytes allocated while building (and holding) build()'s result."""
+    tracemalloc.start()
+    held = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positions", help="Recorded positions response (JSON file)")
+    parser.add_argument("--orders", help="Recorded order_report response (JSON file)")
+    parser.add_argument("--rows", type=int, default=2000, help="Synthetic rows when no recording is given")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(7)
+    pos_body = Path(args.positions).read_bytes() if args.positions else json.dumps(synth_positions(args.rows // 4)).encode()
+    ord_body = Path(args.orders).read_bytes() if args.orders else json.dumps(synth_orders(args.rows)).encode()
+    r = args.repeat
+
+    print(f"\nfast_json backend: {fast_json.BACKEND}")
+    print(f"Positions body: {len(pos_body) / 1024:.0f} KB | Orders body: {len(ord_body) / 1024:.0f} KB\n")
+
+    print("Positions")
+    a = bench("stdlib json + Position rows + PositionBook(rows)",
+              lambda: PositionBook(parse_position_rows(json.loads(pos_body)['data'])), r)
+    b = bench("fast_json + records + PositionBook.from_records",
+              lambda: PositionBook.from_records(parse_position_records(fast_json.loads(pos_body)['data'])), r)
+    print(f"  -> {a / b:.1f}x\n")
+
+    print("Orders")
+    a = bench("stdlib json decode", lambda: json.loads(ord_body), r)
+    b = bench("fast_json decode", lambda: fast_json.loads(ord_body), r)
+    print(f"  -> {a / b:.1f}x")
+    raw_rows = fast_json.loads(ord_body)['data']
+    bench("parse every row (parse_order_row)", lambda: [parse_order_row(o) for o in raw_rows], r)
+    c = bench("OrderBook cold load (apply_report)", lambda: OrderBook().apply_report(raw_rows), r)
+    book = OrderBook()
+    book.apply_report(raw_rows)
+    d = bench("OrderBook unchanged report (diff only)", lambda: book.apply_report(raw_rows), r)
+    print(f"  -> diff vs cold: {c / d:.1f}x\n")
+
+    print("Row memory (order rows)")
+    dicts = footprint(lambda: [parse_order_row(o).as_dict() for o in raw_rows])
+    slotted = footprint(lambda: [parse_order_row(o) for o in raw_rows])
+    print(f"  {'dict rows':<48} {dicts / 1024:9.0f} KB")
+    print(f"  {'Order records':<48} {slotted / 1024:9.0f} KB")
+    print(f"  -> {dicts / slotted:.1f}x smaller\n")
+
+
+if __name__ == "__main__":
+    main()
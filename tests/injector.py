@@ -63,7 +63,11 @@ def run_debug_service(universal_data):
                     "signals": copy.deepcopy(universal_data['signals']),
                     
                     # 3. FULL MARKET DATA (Positions, Orders, Quotes)
-                    "market": copy.deepcopy(universal_data['market']),
+                    "market": {
+                        "positions": [p.as_dict() for p in universal_data['market']['positions']],
+                        "orders": [o.as_dict() for o in universal_data['market']['orders']],
+                        "quotes": copy.deepcopy(universal_data['market']['quotes'])
+                    },
                     
                     # 4. CONFIG (From Sys)
                     "config": copy.deepcopy(universal_data['sys']['config'])
@@ -0,0 +1,84 @@
+# Manual check: runs a flow against tests/stub/flow_stub.html with the profiler on,
+# then prints the offline report. Nothing touches the broker.
+#   python tests/run_flow_profiler.py [--runs 3]
+
+import sys
+import threading
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from playwright.sync_api import sync_playwright
+from utils.logger import setup_logger
+from web_automation.automate import open_browser, run_flow_steps
+from web_automation.flow_profiler import FlowRecorder, new_run_dir
+from web_automation import flow_report
+
+STUB_URL = (Path(__file__).parent / "stub" / "flow_stub.html").resolve().as_uri()
+RUNS_DIR = Path(__file__).parent.parent / "logs" / "runs_stub"
+
+STEPS = [
+    {"id": 1, "description": "Enter Mobile", "action": "input", "cred_key": "mobile_number", "keys": ["Enter"],
+     "ready": {"type": "selector", "value": "role=textbox[name=\"Enter password\"]", "timeout": 3000}, "wait": 1.2},
+    {"id": 2, "description": "Wait Home", "action": "keys", "keys": [],
+     "ready": {"type": "url", "value": "re:#home$", "timeout": 3000}, "wait": 1.5},
+    {"id": 3, "description": "Open Menu", "action": "click", "coords": {"x": 1285, "y": 27},
+     "ready": {"type": "selector", "value": "#acct", "timeout": 3000}, "wait": 1.2},
+    {"id": 4, "description": "Open Acct Details", "action": "keys", "keys": ["Tab"], "wait": 0.3},
+    {"id": 5, "description": "Canvas Settle", "action": "keys", "keys": ["Enter"],
+     "ready": {"type": "repaint", "timeout": 3000}, "wait": 1.2},
+    {"id": 6, "description": "Scroll Down", "action": "scroll", "repeats": 3, "wait": 0.5},
+    {"id": 7, "description": "Click Kill Switch", "action": "click", "coords": {"x": 480, "y": 225},
+     "ready": {"type": "selector", "value": "text=Kill Switch", "timeout": 3000}, "wait": 1.0},
+    {"id": 8, "description": "Never Ready (Fallback)", "action": "keys", "keys": [], "optional": True,
+     "ready": {"type": "selector", "value": "#done", "timeout": 500}, "wait": 0.3},
+]
+
+
+def make_state():
+    return {
+        'user_id': "STUB",
+        'sys': {
+            'log': setup_logger("STUB"),
+            'lock': threading.Lock(),
+            'creds': {'kotak': {'mobile_number': "+919999999999"}},
+            'config': {'web_automation': {
+                'search_timeout': 5000,
+                'key_delay': 0.05,
+                'browser': {'headless': True, 'viewport': {'width': 1366, 'height': 768}},
+                'profiler': {'enabled': True, 'trace': True, 'har': True, 'screenshots': True, 'keep_runs': 20},
+            }},
+        },
+    }
+
+
+def run_once(state):
+    web_conf = state['sys']['config']['web_automation']
+    run_dir = new_run_dir(state, RUNS_DIR)
+    with sync_playwright() as p:
+        browser, context, page = open_browser(p, web_conf, har_path=run_dir / "network.har")
+        recorder = FlowRecorder(state, run_dir, "cold")
+        recorder.attach(context)
+        try:
+            page.goto(STUB_URL)
+            run_flow_steps(state, page, STEPS, recorder=recorder)
+            recorder.finish("completed")
+        except Exception as e:
+            recorder.finish("failed", e)
+            raise
+        finally:
+            context.close()
+            browser.close()
+    print(f"Recorded: {run_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    state = make_state()
+    for _ in range(args.runs):
+        run_once(state)
+    flow_report.main(["--runs-dir", str(RUNS_DIR), "--user", "STUB"])
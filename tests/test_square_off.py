@@ -0,0 +1,204 @@
+"""
+Square-off path against a fake broker (no network): slicing, transport errors,
+fill reconciliation and residual top-ups. Run: python -m pytest -q tests/test_square_off.py
+"""
+import threading
+from itertools import count
+
+from kotak_api.exit_trade import square_off_all_positions, _no_broker_answer
+from kotak_api.order_book import OrderBook
+from kotak_api.positions import fetch_positions
+from kotak_api.scrip_master import get_scrip_master, slice_quantity
+from utils.latency import create_latency_state
+from utils.rate_limiter import TokenBucket
+
+
+class FakeLog:
+    def __init__(self):
+        self.lines = []
+
+    def info(self, msg, tags=None):
+        self.lines.append(msg)
+    warning = error = critical = info
+
+
+class FakeBroker:
+    """
+    One position row per symbol (raw broker fields) and an order report.
+    place_order fills instantly by default; 'answer' overrides what the caller gets back
+    and 'book' decides whether the order reaches the broker at all.
+    """
+    def __init__(self, rows):
+        self.rows = {r['trdSym']: dict(r) for r in rows}
+        self.orders = []
+        self.placed = []
+        self.ids = count(1000)
+        self.answer = lambda kw, oid: {'stat': 'Ok', 'nOrdNo': oid}
+        self.book = lambda kw: 'complete'
+
+    def positions(self):
+        return {'stat': 'Ok', 'data': [dict(r) for r in self.rows.values()]}
+
+    def order_report(self):
+        return {'stat': 'Ok', 'data': [dict(o) for o in self.orders]}
+
+    def place_order(self, **kw):
+        self.placed.append(kw)
+        oid = str(next(self.ids))
+        status = self.book(kw)
+        if status:
+            row = self.rows[kw['trading_symbol']]
+            qty = int(kw['quantity'])
+            filled = qty if status == 'complete' else 0
+            self.orders.append({'nOrdNo': oid, 'ordSt': status, 'prcTp': 'MKT', 'trnsTp': kw['transaction_type'],
+                                'tok': row['tok'], 'qty': str(qty), 'fldQty': str(filled)})
+            side = 'flBuyQty' if kw['transaction_type'] == 'B' else 'flSellQty'
+            row[side] = str(int(row.get(side, 0)) + filled)
+        return self.answer(kw, oid)
+
+    def cancel_order(self, order_id):
+        return {'stat': 'Ok'}
+
+    def net_units(self, symbol):
+        r = self.rows[symbol]
+        return int(r.get('flBuyQty', 0)) + int(r.get('cfBuyQty', 0)) - int(r.get('flSellQty', 0)) - int(r.get('cfSellQty', 0))
+
+
+def _row(symbol, token, buy=0, sell=0, lot=75):
+    return {'tok': token, 'exSeg': 'nse_fo', 'lotSz': str(lot), 'trdSym': symbol, 'prod': 'NRML',
+            'cfBuyQty': str(buy), 'cfSellQty': str(sell)}
+
+
+def _state(broker, cache_rows=None):
+    """Account state whose cached positions come from 'cache_rows' (default: the broker's own)."""
+    if cache_rows is None:
+        cache_rows = list(broker.rows.values())
+    cached, _ = fetch_positions(type('Snap', (), {'positions': lambda self: {'stat': 'Ok', 'data': cache_rows}})())
+    lock = threading.Lock()
+    config = {'kill_switch': {'square_off': {'reconcile_timeout': 2, 'reconcile_interval': 0.01, 'cancel_stuck_after': 0}}}
+    return {
+        'user_id': 'TEST',
+        'sys': {'api': broker, 'log': FakeLog(), 'lock': lock, 'config': config, 'latency': create_latency_state('TEST')},
+        'market': {'positions': cached, 'orders': OrderBook(), 'quotes': {}},
+        'status': {}
+    }
+
+
+def _report(state):
+    return state['status']['square_off_report']
+
+
+# --- Slicing ---
+def test_slice_quantity_stays_below_freeze_limit():
+    get_scrip_master().load_csv_text('nse_fo', "pSymbol,lLotSize,lFreezeQty\n90001,75,1800\n")
+    assert slice_quantity(1800, 'nse_fo', '90001') == [1725, 75]
+    assert slice_quantity(1725, 'nse_fo', '90001') == [1725]
+    assert slice_quantity(5000, 'nse_fo', 'unknown') == [5000]
+
+
+def test_part_lot_position_is_exited_in_units():
+    broker = FakeBroker([_row('NIFTYCE', '1', buy=50)]) # 50 units on a 75 lot
+    state = _state(broker)
+    square_off_all_positions(state)
+    assert [(o['transaction_type'], o['quantity']) for o in broker.placed] == [('S', '50')]
+    assert broker.net_units('NIFTYCE') == 0
+
+
+# --- Transport errors ---
+def test_no_broker_answer_classification():
+    assert _no_broker_answer({'Error': TimeoutError()})
+    assert _no_broker_answer({'error': ConnectionResetError()})
+    assert _no_broker_answer({'Error Message': 'Complete the 2fa process'})
+    assert _no_broker_answer(None)
+    assert not _no_broker_answer({'stat': 'Not_Ok', 'errMsg': 'RMS rejected'})
+
+
+def test_timed_out_exit_is_found_in_report_not_resent():
+    broker = FakeBroker([_row('NIFTYPE', '2', sell=150)])
+    broker.answer = lambda kw, oid: {'error': Exception("(0) Reason: Read timed out")}
+    state = _state(broker)
+    square_off_all_positions(state)
+
+    assert len(broker.placed) == 1
+    r = _report(state)['orders'][0]
+    assert r['matched'] and r['fill_status'] == "FILLED"
+    assert broker.net_units('NIFTYPE') == 0
+
+
+def test_unanswered_exit_resolved_by_flat_position():
+    broker = FakeBroker([_row('NIFTYPE', '2', sell=150)])
+    broker.answer = lambda kw, oid: {'Error': TimeoutError()}
+    state = _state(broker)
+    broker.orders.append({'nOrdNo': '7', 'ordSt': 'complete', 'prcTp': 'MKT', 'trnsTp': 'B',
+                          'tok': '2', 'qty': '75', 'fldQty': '75'}) # Pre-kill order: never adopted
+    state['market']['orders'].apply_report(broker.order_report()['data'])
+    broker.book = lambda kw: None # Never reached the book...
+    broker.rows['NIFTYPE']['cfSellQty'] = '0' # ...but the position is flat anyway
+    square_off_all_positions(state)
+
+    assert len(broker.placed) == 1
+    assert _report(state)['orders'][0]['fill_status'] == "FLAT"
+
+
+def test_unanswered_exit_on_open_position_is_not_resent():
+    broker = FakeBroker([_row('NIFTYPE', '2', sell=150)])
+    broker.answer = lambda kw, oid: {'Error': TimeoutError()}
+    broker.book = lambda kw: None
+    state = _state(broker)
+    state['sys']['config']['kill_switch']['square_off']['reconcile_timeout'] = 0.2
+    square_off_all_positions(state)
+
+    assert len(broker.placed) == 1
+    assert _report(state)['time_to_flat_ms'] is None
+
+
+# --- Fill reconciliation ---
+def test_rejected_exit_is_reissued():
+    broker = FakeBroker([_row('NIFTYPE', '2', sell=150)])
+    verdicts = iter(['rejected', 'complete'])
+    broker.book = lambda kw: next(verdicts)
+    state = _state(broker)
+    square_off_all_positions(state)
+
+    assert [o['quantity'] for o in broker.placed] == ['150', '150']
+    assert broker.net_units('NIFTYPE') == 0
+    assert _report(state)['time_to_flat_ms'] is not None
+
+
+def test_refused_exit_gives_up_after_max_reissues():
+    broker = FakeBroker([_row('NIFTYPE', '2', sell=150)])
+    broker.answer = lambda kw, oid: {'stat': 'Not_Ok', 'errMsg': 'RMS rejected'}
+    broker.book = lambda kw: None
+    state = _state(broker)
+    square_off_all_positions(state)
+
+    assert len(broker.placed) == 3 # First send + 2 re-issues
+    assert _report(state)['time_to_flat_ms'] is None
+
+
+# --- Residual top-ups ---
+def test_drift_is_topped_up_from_residual():
+    broker = FakeBroker([_row('NIFTYPE', '2', sell=300)])
+    state = _state(broker, cache_rows=[_row('NIFTYPE', '2', sell=150)]) # Cache missed a fill
+    square_off_all_positions(state)
+
+    assert [(o['transaction_type'], o['quantity']) for o in broker.placed] == [('B', '150'), ('B', '150')]
+    assert broker.net_units('NIFTYPE') == 0
+    assert _report(state)['top_ups'] == 1
+
+
+def test_closed_cached_leg_gets_no_top_up():
+    broker = FakeBroker([_row('NIFTYCE', '1', buy=75), _row('NIFTYPE', '2')])
+    state = _state(broker, cache_rows=[_row('NIFTYCE', '1', buy=75), _row('NIFTYPE', '2', sell=75)])
+    square_off_all_positions(state) # PE already closed at the broker: its cached exit opens +75
+
+    assert broker.net_units('NIFTYCE') == 0
+    assert _report(state)['top_ups'] == 1
+    assert broker.net_units('NIFTYPE') == 0 # The reverse position is closed, not doubled
+
+
+# --- Rate limiter ---
+def test_token_bucket_zero_rate_does_not_throttle():
+    bucket = TokenBucket(0, 1)
+    for _ in range(5):
+        bucket.acquire()
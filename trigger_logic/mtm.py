@@ -1,42 +1,80 @@
+class MTMBook:
+    """
+    Incremental MTM cache keyed by instrument token.
+    Realized PnL and each token's (net_qty * multiplier * price_factor) exposure are
+    cached on rebuild, so a tick only moves the total by exposure * delta_ltp.
+    """
+    def __init__(self):
+        self.positions = None   # The positions list this book was built from
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self.exposure = {}      # token -> summed qty coefficient
+        self.marks = {}         # token -> LTP currently priced into 'unrealized'
+
+    @property
+    def total(self):
+        return self.realized + self.unrealized
+
+    def rebuild(self, positions, quotes):
+        """
+        Full pass over a PositionBook. Only needed when the positions snapshot changes.
+        'quotes' must be a private snapshot: the base MTM and the marks are read from it twice.
+        """
+        self.positions = positions
+        self.realized = positions.realized
+        self.unrealized = positions.mtm(quotes) - positions.realized
+        self.exposure = positions.exposure_by_token()
+        self.marks = {token: quotes.get(token, 0.0) for token in self.exposure}
+
+    def apply_tick(self, token, ltp):
+        """O(1) update for a single token's new LTP."""
+        coeff = self.exposure.get(token)
+        if coeff is None:
+            return
+        self.unrealized += coeff * (ltp - self.marks[token])
+        self.marks[token] = ltp
+
+
 def calculate_mtm(universal_data):
     """
     Calculates MTM PnL based on synced positions and quotes.
     Updates: ['risk']['mtm_current'] and ['risk']['mtm_distance']
     """
     log = universal_data['sys']['log']
-    
+
     # 1. READ DATA (Thread-Safe)
     with universal_data['sys']['lock']:
         positions = universal_data['market']['positions']
         quotes = universal_data['market']['quotes']
         mtm_limit = universal_data['risk']['mtm_limit']
-    
-    total_pnl = 0.0
-    
+        book = universal_data['sys']['mtm_book']
+
+        # Drain the tokens that ticked since the last call
+        changed_tokens = universal_data['market']['quote_changes']
+        universal_data['market']['quote_changes'] = set()
+
+        # Prices are copied under the lock so ticks landing mid-calculation cannot skew it
+        rebuild = book.positions is not positions
+        if rebuild:
+            snap = dict(quotes)
+        else:
+            snap = {token: quotes.get(token, 0.0) for token in changed_tokens}
+
     try:
-        for pos in positions:
-            token = pos['token']
-            
-            # Fetch LTP or default to 0.0
-            ltp = quotes.get(token, 0.0)
-            
-            # Calculation Params
-            net_qty = pos['net_qty']
-            total_buy_amt = pos['total_buy_amt']
-            total_sell_amt = pos['total_sell_amt']
-            multiplier = pos['multiplier']
-            price_factor = pos['price_factor']
-            
-            # PnL Formula
-            realized_part = total_sell_amt - total_buy_amt
-            unrealized_part = net_qty * ltp * multiplier * price_factor
-            
-            total_pnl += (realized_part + unrealized_part)
-            
+        # New positions snapshot -> Full rebuild. Otherwise only re-price moved tokens.
+        if rebuild:
+            book.rebuild(positions, snap)
+        else:
+            for token, ltp in snap.items():
+                book.apply_tick(token, ltp)
+
+        total_pnl = book.total
+
         # 2. WRITE RISK METRICS (Thread-Safe)
         with universal_data['sys']['lock']:
             universal_data['risk']['mtm_current'] = round(total_pnl, 2)
             universal_data['risk']['mtm_distance'] = round(total_pnl - mtm_limit, 2)
 
     except Exception as e:
-        log.error(f"Error calculating MTM: {e}", tags=["MTM"])
\ No newline at end of file
+        book.positions = None # Force a clean rebuild next time
+        log.error(f"Error calculating MTM: {e}", tags=["MTM"])
@@ -1,3 +1,14 @@
+def is_sl_buy_filled(order):
+    """True for an SL / SL-M Buy (covering a short) that is completely filled."""
+    # Kotak uses 'SL', 'SL-M' for stop orders and "B" for Buy
+    if order.type not in ['SL', 'SL-M']:
+        return False
+    if order.transaction_type not in ['B', 'BUY']:
+        return False
+    # Filled Qty equals Total Qty, with explicit 'COMPLETE'/'FILLED' status as a backup
+    return (order.qty > 0 and order.filled_qty == order.qty) or order.status in ['COMPLETE', 'FILLED']
+
+
 def check_sl_status(universal_data):
     """
     Checks if a Stop-Loss order for a Short Position has been EXECUTED.
@@ -10,37 +21,17 @@ def check_sl_status(universal_data):
     log = universal_data['sys']['log']
     
     with universal_data['sys']['lock']:
-        orders = universal_data['market']['orders']
+        # (type, side) index: only SL / SL-M buys are looked at, however busy the book is
+        orders = universal_data['market']['orders'].of_kind(('SL', 'SL-M'), ('B', 'BUY'))
     
     sl_hit_detected = False
     
     try:
         for order in orders:
-            # 1. Filter for SL Orders (Kotak uses 'SL', 'SL-M')
-            o_type = order.get('type', '')
-            if o_type not in ['SL', 'SL-M']:
-                continue
-            
-            # 2. Filter for Buy Orders (Exiting a Sell)
-            # Kotak API returns "B" for Buy
-            txn = order.get('transaction_type', '')
-            if txn not in ['B', 'BUY']:
-                continue
-
-            # 3. Check Execution Status (Math based)
-            qty = order.get('qty', 0)
-            filled = order.get('filled_qty', 0)
-            status = order.get('status', '')
-
-            # STRICT RULE: Client requires "Completely Filled" only.
-            # We check if Filled Qty equals Total Qty.
-            # We also check if status is explicitly 'COMPLETE' or 'FILLED' as a backup.
-            is_complete = (qty > 0 and filled == qty) or status in ['COMPLETE', 'FILLED']
-            
-            if is_complete:
+            # STRICT RULE: Client requires "Completely Filled" only (see is_sl_buy_filled).
+            if is_sl_buy_filled(order):
                 sl_hit_detected = True
-                oid = order.get('order_id')
-                log.warning(f"Short Leg SL Hit! (Order {oid}: {int(filled)}/{int(qty)} filled)", tags=["RISK", "SL_HIT"])
+                log.warning(f"Short Leg SL Hit! (Order {order.order_id}: {int(order.filled_qty)}/{int(order.qty)} filled)", tags=["RISK", "SL_HIT"])
                 break
             
         with universal_data['sys']['lock']:
@@ -0,0 +1,17 @@
+import json
+
+try:
+    import orjson # Optional: 3-6x faster decode of broker responses
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data):
+    """JSON bytes/str -> Python objects (orjson when installed, else stdlib)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(data)
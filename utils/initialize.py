@@ -4,6 +4,10 @@ import threading
 from datetime import datetime
 from pathlib import Path
 from utils.logger import setup_logger
+from trigger_logic.mtm import MTMBook
+from kotak_api.position_book import PositionBook
+from kotak_api.order_book import OrderBook
+from utils.latency import create_latency_state
 
 # =========================================================
 #  DEFAULT TEMPLATES (Used if files are missing)
@@ -36,7 +40,17 @@ DEFAULT_CONFIG = {
       "enabled": True,
       "mtm_limit": 5000.0,
       "sell_order_exit_confirmation": True,
-      "auto_square_off": True
+      "auto_square_off": True,
+      "square_off": {
+        "max_in_flight": 8,
+        "orders_per_second": 10,
+        "burst": 10,
+        "reconcile_timeout": 15,
+        "reconcile_interval": 0.5,
+        "max_reissues": 2,
+        "cancel_stuck_after": 5,
+        "stale_fetch_timeout": 3
+      }
     },
     "kill_history": {
       "locked_date": None,
@@ -45,7 +59,25 @@ DEFAULT_CONFIG = {
     },
     "monitoring": {
       "poll_interval_seconds": 2,
-      "off_market_interval_seconds": 60
+      "off_market_interval_seconds": 60,
+      "stream_quotes": True,
+      "stream_stale_seconds": 3,
+      "stream_orders": True,
+      "retain_raw": True,
+      "adaptive": {
+        "enabled": True,
+        "near_band_pct": 20,
+        "far_band_pct": 60,
+        "fast_interval_seconds": 0.25,
+        "slow_interval_seconds": 5,
+        "volatility_window_seconds": 30
+      }
+    },
+    "network": {
+      "pool_size": 10,
+      "max_retries": 2,
+      "connect_timeout": 3.05,
+      "read_timeout": 10
     },
     "logging": {
       "level": "INFO",
@@ -56,32 +88,37 @@ DEFAULT_CONFIG = {
     "gmail": {
       "timeout_seconds": 120,
       "otp_subject": "OTP",
-      "kill_subject": "Kill Switch Activated"
+      "kill_subject": "Kill Switch Activated",
+      "imap_idle": { "enabled": True, "reidle_seconds": 540, "max_backoff_seconds": 300 }
     },
     "web_automation": {
       "login_url": "https://neo.kotaksecurities.com/Login",
       "search_timeout": 20000,
+      "key_delay": 0.2,
       "browser": {
         "headless": False,
         "viewport": { "width": 1366, "height": 768 },
         "args": ["--disable-blink-features=AutomationControlled"]
       },
+      "warm_standby": { "enabled": False, "refresh_minutes": 10, "health_check_seconds": 30, "accept_seconds": 3, "kill_timeout_seconds": 90 },
+      "session_cache": { "enabled": True, "max_age_hours": 12 },
+      "profiler": { "enabled": False, "trace": True, "har": False, "screenshots": True, "keep_runs": 50 },
       "flow_steps": [
-        { "id": 1, "description": "Enter Mobile", "action": "input", "enabled": True, "cred_key": "mobile_number", "keys": ["Enter"], "wait": 1.2 },
-        { "id": 2, "description": "Enter Password", "action": "input", "enabled": True, "cred_key": "login_password", "keys": ["Enter"], "wait": 0.3 },
-        { "id": 3, "description": "Trigger OTP", "action": "keys", "enabled": True, "keys": [], "wait": 1.5 },
-        { "id": 4, "description": "Process OTP", "action": "otp", "enabled": True, "wait": 2.0 },
-        { "id": 5, "description": "Dismiss Risk Popup", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Enter"], "wait": 1.5, "optional": True },
-        { "id": 6, "description": "Dismiss Gen Popup", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Enter"], "wait": 1.0, "optional": True },
-        { "id": 7, "description": "Open Menu", "action": "click", "enabled": True, "coords": { "x": 1285, "y": 27 }, "wait": 1.2 },
-        { "id": 8, "description": "Open Acct Details", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Tab", "Enter"], "wait": 1.2 },
-        { "id": 9, "description": "Focus Canvas", "action": "click", "enabled": True, "coords": { "x": 499, "y": 224 }, "wait": 0.5 },
-        { "id": 10, "description": "Scroll Down", "action": "scroll", "enabled": True, "repeats": 10, "wait": 0.5 },
-        { "id": 11, "description": "Click Kill Switch", "action": "click", "enabled": True, "coords": { "x": 480, "y": 225 }, "wait": 1.0 },
-        { "id": 12, "description": "Uncheck All", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Enter"], "wait": 1.0 },
-        { "id": 13, "description": "Click Disable Btn", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Tab", "Tab", "Tab", "Tab", "Tab", "Enter"], "wait": 1.0 },
-        { "id": 14, "description": "Click CONFIRM (Kill)", "action": "click", "enabled": True, "coords": { "x": 587, "y": 615 }, "wait": 1.0 },
-        { "id": 15, "description": "Click CANCEL (Test)", "action": "click", "enabled": False, "coords": { "x": 667, "y": 617 }, "wait": 1.0 }
+        { "id": 1, "description": "Enter Mobile", "phase": "login", "action": "input", "enabled": True, "cred_key": "mobile_number", "keys": ["Enter"], "ready": { "type": "selector", "value": 'role=textbox[name="Enter password"]', "timeout": 5000 }, "wait": 1.2 },
+        { "id": 2, "description": "Enter Password", "phase": "login", "action": "input", "enabled": True, "cred_key": "login_password", "keys": ["Enter"], "wait": 0.3 },
+        { "id": 3, "description": "Trigger OTP", "phase": "login", "action": "keys", "enabled": True, "keys": [], "wait": 1.5 },
+        { "id": 4, "description": "Process OTP", "phase": "login", "action": "otp", "enabled": True, "ready": { "type": "url", "value": "re:(?i)^(?!.*login)", "timeout": 10000 }, "wait": 2.0 },
+        { "id": 5, "description": "Dismiss Risk Popup", "phase": "login", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Enter"], "wait": 1.5, "optional": True },
+        { "id": 6, "description": "Dismiss Gen Popup", "phase": "login", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Enter"], "wait": 1.0, "optional": True },
+        { "id": 7, "description": "Open Menu", "phase": "kill", "action": "click", "enabled": True, "coords": { "x": 1285, "y": 27 }, "ready": { "type": "repaint", "timeout": 3000 }, "wait": 1.2 },
+        { "id": 8, "description": "Open Acct Details", "phase": "kill", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Tab", "Enter"], "ready": { "type": "repaint", "timeout": 3000 }, "wait": 1.2 },
+        { "id": 9, "description": "Focus Canvas", "phase": "kill", "action": "click", "enabled": True, "coords": { "x": 499, "y": 224 }, "wait": 0.5 },
+        { "id": 10, "description": "Scroll Down", "phase": "kill", "action": "scroll", "enabled": True, "repeats": 10, "wait": 0.5 },
+        { "id": 11, "description": "Click Kill Switch", "phase": "kill", "action": "click", "enabled": True, "coords": { "x": 480, "y": 225 }, "ready": { "type": "repaint", "timeout": 3000 }, "wait": 1.0 },
+        { "id": 12, "description": "Uncheck All", "phase": "kill", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Enter"], "wait": 1.0 },
+        { "id": 13, "description": "Click Disable Btn", "phase": "kill", "action": "keys", "enabled": True, "keys": ["Tab", "Tab", "Tab", "Tab", "Tab", "Tab", "Tab", "Enter"], "wait": 1.0 },
+        { "id": 14, "description": "Click CONFIRM (Kill)", "phase": "kill", "action": "click", "enabled": True, "coords": { "x": 587, "y": 615 }, "wait": 1.0 },
+        { "id": 15, "description": "Click CANCEL (Test)", "phase": "kill", "action": "click", "enabled": False, "coords": { "x": 667, "y": 617 }, "wait": 1.0 }
       ]
     }
   }
@@ -178,7 +215,9 @@ def create_bot_state(user_id):
             logger.info(f"Previous Kill detected on {locked_date_str}. Resetting lock for New Day ({today_str}).", tags=["INIT", "RESET"])
     
     # Defaults
+    state_lock = threading.Lock()
     mtm_limit = -abs(float(user_config.get('kill_switch', {}).get('mtm_limit', 5000)))
+    retain_raw = user_config.get('monitoring', {}).get('retain_raw', True)
 
     universal_data = {
         "user_id": user_id,
@@ -187,8 +226,16 @@ def create_bot_state(user_id):
             "creds":    user_creds,
             "log":      logger,
             "api":      None,
-            "lock":     threading.Lock(),
-            "threads":  {} 
+            "lock":     state_lock,
+            "data_changed": threading.Condition(state_lock),
+            "data_listeners": {},
+            "mtm_book": MTMBook(),
+            "threads":  {},
+            "latency":  create_latency_state(user_id, logger),
+            "warm_browser": None,
+            "mailbox": None,
+            "feed":     { "client": None, "connected": False, "subscribed": set(), "last_tick": 0.0,
+                          "order_feed_at": 0.0, "last_order_event": 0.0 }
         },
         "status": {
             "stage": "LOCKED" if is_locked_today else "IDLE", 
@@ -197,7 +244,8 @@ def create_bot_state(user_id):
             "session_start_time": None
         },
         "market": {
-            "positions": [], "orders": [], "quotes": {},
+            "positions": PositionBook(), "orders": OrderBook(keep_raw=retain_raw), "quotes": {}, "version": 0, "changed_at": 0.0,
+            "quote_changes": set(), "quotes_at": 0.0, "rest_quotes": {},
             "raw": { "positions": None, "orders": None, "quotes": None }
         },
         "risk": {
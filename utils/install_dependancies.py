@@ -9,6 +9,7 @@ REQUIRED_PACKAGES = [
     "customtkinter",
     "neo_api_client",
     "playwright",
+    "cryptography",
     "pyotp",
     "packaging",
     "requests",
@@ -0,0 +1,136 @@
+import json
+import math
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+# Pipeline stages, in order. Each is a time.monotonic() mark.
+STAGES = ("tick", "detected", "triggered", "kill_noticed", "orders_acked", "kill_done")
+# Square-off and browser kill run in parallel once the kill is noticed, so both are timed from it.
+PARENT = {
+    "detected": "tick",
+    "triggered": "detected",
+    "kill_noticed": "triggered",
+    "orders_acked": "kill_noticed",
+    "kill_done": "kill_noticed"
+}
+# Stages that may open a trace (risk path / manual kill). Later stages only join an open one.
+OPENING_STAGES = ("tick", "detected", "triggered", "kill_noticed")
+HISTORY_SIZE = 200  # Kill records kept in memory (and re-loaded from disk) for percentiles
+
+LOG_DIR = Path(__file__).parent.parent / "logs"
+
+
+def _latency_file(user_id):
+    return LOG_DIR / f"{user_id}_kill_latency.jsonl"
+
+
+def create_latency_state(user_id, log=None):
+    """Initial sys['latency'] block. Previous kills are re-loaded so percentiles survive restarts."""
+    history = deque(maxlen=HISTORY_SIZE)
+    try:
+        path = _latency_file(user_id)
+        if path.exists():
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        history.append(json.loads(line))
+    except Exception as e:
+        if log: log.warning(f"Latency History Load Failed: {e}", tags=["SYS", "LATENCY"])
+    return {"current": None, "history": history}
+
+
+def mark_stage(universal_data, stage, ts=None):
+    """
+    Records 'stage' for the kill in flight (first mark wins). An OPENING_STAGES mark with
+    no trace open starts one, so manual kills (no tick/detection) are still timed from
+    where they begin. Other marks with no trace open are dropped: a square-off that outlives
+    finish_kill_trace() must not open a stray trace that bleeds into the next kill.
+    """
+    ts = ts if ts is not None else time.monotonic()
+    with universal_data['sys']['lock']:
+        lat = universal_data['sys']['latency']
+        if lat['current'] is None:
+            if stage not in OPENING_STAGES:
+                return
+            lat['current'] = {"started": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "marks": {}}
+        lat['current']['marks'].setdefault(stage, ts)
+
+
+def _parent_mark(stage, marks):
+    """Nearest recorded upstream stage (skips stages a manual kill never passed through)."""
+    parent = PARENT.get(stage)
+    while parent and parent not in marks:
+        parent = PARENT.get(parent)
+    return parent
+
+
+def finish_kill_trace(universal_data, outcome):
+    """
+    Closes the kill in flight: stores per-stage deltas (ms) in history and appends
+    the record to logs/{user_id}_kill_latency.jsonl. Returns the record (None if no trace).
+    """
+    mark_stage(universal_data, "kill_done")
+    user_id = universal_data['user_id']
+
+    with universal_data['sys']['lock']:
+        lat = universal_data['sys']['latency']
+        current, lat['current'] = lat['current'], None
+        if current is None:
+            return None
+
+        marks = current['marks']
+        stages_ms = {}
+        for stage in STAGES:
+            parent = _parent_mark(stage, marks)
+            if stage in marks and parent:
+                stages_ms[f"{parent}->{stage}"] = round((marks[stage] - marks[parent]) * 1000, 1)
+
+        record = {
+            "timestamp": current['started'],
+            "outcome": outcome,
+            "first_stage": next(s for s in STAGES if s in marks),
+            "stages_ms": stages_ms,
+            "total_ms": round((max(marks.values()) - min(marks.values())) * 1000, 1)
+        }
+        lat['history'].append(record)
+
+    try:
+        LOG_DIR.mkdir(exist_ok=True)
+        with open(_latency_file(user_id), 'a') as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        universal_data['sys']['log'].error(f"Latency Record Write Failed: {e}", tags=["KILL", "LAT"])
+
+    return record
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def latency_summary(universal_data, pcts=(50, 90, 99)):
+    """
+    { 'count': n, 'last': record, 'total': {p: ms}, 'stages': {'a->b': {p: ms}} }
+    over the kill history. Use it to see which stage regresses.
+    """
+    with universal_data['sys']['lock']:
+        history = list(universal_data['sys']['latency']['history'])
+
+    stage_values = {}
+    for rec in history:
+        for key, ms in rec.get('stages_ms', {}).items():
+            stage_values.setdefault(key, []).append(ms)
+    totals = sorted(rec['total_ms'] for rec in history if 'total_ms' in rec)
+
+    return {
+        "count": len(history),
+        "last": history[-1] if history else None,
+        "total": {p: _percentile(totals, p) for p in pcts},
+        "stages": {k: {p: _percentile(sorted(v), p) for p in pcts} for k, v in stage_values.items()}
+    }
@@ -0,0 +1,137 @@
+import json
+import datetime
+import threading
+from pathlib import Path
+
+# --- DEFAULT SESSIONS (Local exchange time) ---
+# Keyed by Kotak exchange segment. Unknown segments fall back to the equity session.
+EQUITY_SESSION = (datetime.time(9, 15), datetime.time(15, 30))
+SEGMENT_SESSIONS = {
+    "nse_cm": EQUITY_SESSION,
+    "bse_cm": EQUITY_SESSION,
+    "nse_fo": EQUITY_SESSION,
+    "bse_fo": EQUITY_SESSION,
+    "cde_fo": (datetime.time(9, 0), datetime.time(17, 0)),
+    "bcs-fo": (datetime.time(9, 0), datetime.time(17, 0)), # SDK spells this one with a hyphen
+    "mcx_fo": (datetime.time(9, 0), datetime.time(23, 55)),
+}
+LOOKAHEAD_DAYS = 14  # How far next_open() searches before giving up
+
+CALENDAR_PATH = Path(__file__).parent.parent / "source" / "market_calendar.json"
+
+
+def _parse_time(value):
+    return datetime.datetime.strptime(value, "%H:%M").time()
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class MarketCalendar:
+    """
+    Segment-aware trading calendar.
+    Optional overrides come from source/market_calendar.json:
+      {
+        "sessions": {"mcx_fo": ["09:00", "23:30"]},
+        "holidays": {"all": ["2026-01-26"], "mcx": ["2026-03-03"]},
+        "special_sessions": [{"date": "2026-11-08", "segments": ["nse_cm", "nse_fo"], "start": "18:00", "end": "19:15"}]
+      }
+    Holidays are keyed by exchange (the part before '_' in the segment) or 'all'.
+    A special session opens a segment on that date even if it is a weekend or holiday.
+    """
+    def __init__(self, conf=None):
+        conf = conf or {}
+        self.sessions = dict(SEGMENT_SESSIONS)
+        for seg, (start, end) in conf.get('sessions', {}).items():
+            self.sessions[seg] = (_parse_time(start), _parse_time(end))
+
+        self.holidays = {
+            exch: {_parse_date(d) for d in dates}
+            for exch, dates in conf.get('holidays', {}).items()
+        }
+
+        self.special = {} # (date, segment) -> [(start, end)]
+        for item in conf.get('special_sessions', []):
+            day = _parse_date(item['date'])
+            window = (_parse_time(item['start']), _parse_time(item['end']))
+            for seg in item.get('segments', self.sessions.keys()):
+                self.special.setdefault((day, seg), []).append(window)
+
+    def is_holiday(self, day, segment):
+        exch = segment.replace('-', '_').split('_')[0]
+        return day in self.holidays.get('all', ()) or day in self.holidays.get(exch, ())
+
+    def windows(self, day, segment):
+        """All (start, end) times the segment trades on 'day'."""
+        result = list(self.special.get((day, segment), []))
+        if day.weekday() < 5 and not self.is_holiday(day, segment):
+            result.append(self.sessions.get(segment, EQUITY_SESSION))
+        return result
+
+    def is_open(self, segments, now=None):
+        now = now or datetime.datetime.now()
+        t = now.time()
+        return any(start <= t <= end for seg in segments for start, end in self.windows(now.date(), seg))
+
+    def next_open(self, segments, now=None):
+        """Earliest session start after 'now' across 'segments' (None if nothing in LOOKAHEAD_DAYS)."""
+        now = now or datetime.datetime.now()
+        best = None
+        for offset in range(LOOKAHEAD_DAYS + 1):
+            day = now.date() + datetime.timedelta(days=offset)
+            for seg in segments:
+                for start, _ in self.windows(day, seg):
+                    opens = datetime.datetime.combine(day, start)
+                    if opens > now and (best is None or opens < best):
+                        best = opens
+            if best is not None:
+                return best
+        return None
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_calendar(log=None):
+    """Loaded once from source/market_calendar.json (defaults if missing or invalid; errors go to 'log')."""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            conf = {}
+            try:
+                if CALENDAR_PATH.exists():
+                    with open(CALENDAR_PATH, 'r') as f:
+                        conf = json.load(f)
+            except Exception as e:
+                if log: log.error(f"Market Calendar Load Failed: {e}. Using defaults.", tags=["SYS", "CALENDAR"])
+            _calendar = MarketCalendar(conf)
+        return _calendar
+
+
+def tracked_segments(universal_data):
+    """
+    Segments with an open leg. Closed rows (traded amounts only) do not count: a flat
+    account watches every segment (new trades can appear anywhere).
+    """
+    with universal_data['sys']['lock']:
+        segments = {seg for _, seg in universal_data['market']['positions'].open_instruments()}
+    return segments or set(get_calendar(universal_data['sys']['log']).sessions.keys())
+
+
+def session_status(universal_data, now=None):
+    """
+    (is_open, seconds_until_next_open) for the account's segments.
+    Seconds is None when open, or when no session is known within LOOKAHEAD_DAYS.
+    """
+    now = now or datetime.datetime.now()
+    calendar = get_calendar(universal_data['sys']['log'])
+    segments = tracked_segments(universal_data)
+
+    if calendar.is_open(segments, now):
+        return True, None
+
+    opens = calendar.next_open(segments, now)
+    if opens is None:
+        return False, None
+    return False, (opens - now).total_seconds()
@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. 'rate' tokens refill per second up to 'burst'.
+    acquire() blocks until a token is available, so callers never exceed the broker rate.
+    A rate <= 0 (e.g. orders_per_second: 0 in config) disables throttling.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
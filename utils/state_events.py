@@ -0,0 +1,42 @@
+import time
+
+
+def mark_data_changed(universal_data):
+    """
+    Bumps the market data version and wakes every waiter, including scheduled jobs
+    hooked in sys['data_listeners'] (name -> wake callable, e.g. the risk job).
+    Caller MUST already hold universal_data['sys']['lock'].
+    """
+    universal_data['market']['version'] += 1
+    universal_data['market']['changed_at'] = time.monotonic() # 'tick' stage for kill latency
+    universal_data['sys']['data_changed'].notify_all()
+    for wake in universal_data['sys'].get('data_listeners', {}).values():
+        wake()
+
+
+def wait_for_data_change(universal_data, last_version, timeout):
+    """
+    Blocks until the market version moves past 'last_version', the session stops,
+    or 'timeout' seconds pass. Returns the current version.
+    """
+    cond = universal_data['sys']['data_changed']
+    market = universal_data['market']
+    signals = universal_data['signals']
+
+    with cond:
+        cond.wait_for(lambda: market['version'] != last_version or not signals['system_active'], timeout)
+        return market['version']
+
+
+def raw_retention_enabled(universal_data):
+    return universal_data['sys']['config'].get('monitoring', {}).get('retain_raw', True)
+
+
+def retain_raw(universal_data, key, response):
+    """
+    Keeps the last raw API response under market['raw'][key] (the identity key for the
+    unchanged-body skip). With monitoring.retain_raw off nothing is kept: every poll is
+    parsed, but the decoded payload can be freed as soon as it is.
+    Caller MUST already hold universal_data['sys']['lock'].
+    """
+    universal_data['market']['raw'][key] = response if raw_retention_enabled(universal_data) else None
@@ -1,161 +1,308 @@
+import re
 import time
+import hashlib
 from playwright.sync_api import sync_playwright
 from web_automation.automate_utils import start_otp_listener
+from web_automation.session_cache import load_storage_state, save_storage_state
+from web_automation.flow_profiler import FlowRecorder, new_run_dir, profiler_conf
 
-def execute_kill_switch(universal_data):
-    """ 
-    Main Driver: Login -> Navigate -> Kill Switch. 
-    Reads browser settings dynamically from config.json.
+
+def split_flow_steps(steps):
+    """
+    Splits flow_steps into (login_steps, kill_steps).
+    A step's explicit 'phase' ("login"/"kill") wins. Otherwise login runs through the
+    first 'otp' step plus the non-click steps right after it (post-login popups).
+    """
+    if any('phase' in s for s in steps):
+        login = [s for s in steps if s.get('phase', 'kill') == 'login']
+        kill = [s for s in steps if s.get('phase', 'kill') != 'login']
+        return login, kill
+
+    otp_idx = next((i for i, s in enumerate(steps) if s.get('action') == 'otp'), None)
+    if otp_idx is None:
+        return [], list(steps)
+
+    end = otp_idx + 1
+    while end < len(steps) and steps[end].get('action') != 'click':
+        end += 1
+    return list(steps[:end]), list(steps[end:])
+
+
+def open_browser(p, web_conf, storage_state=None, har_path=None):
+    """
+    Launches Chromium per config. Returns (browser, context, page).
+    'storage_state' (cookies + local storage) restores a previous login.
+    'har_path' records the context's network traffic (written on context close).
     """
-    log = universal_data['sys']['log']
-    
-    # 1. Load Config
-    config = universal_data['sys']['config']
-    creds = universal_data['sys']['creds']['kotak']
-    
-    web_conf = config.get('web_automation', {})
     browser_conf = web_conf.get('browser', {})
-    
-    # 2. Parse Browser Settings
-    login_url = web_conf.get('login_url', "https://neo.kotaksecurities.com/Login")
-    search_timeout = web_conf.get('search_timeout', 20000) # Default 20s
-    
     is_headless = browser_conf.get('headless', False)
     viewport = browser_conf.get('viewport', {'width': 1280, 'height': 720})
     args = browser_conf.get('args', ["--disable-blink-features=AutomationControlled"])
 
-    steps = web_conf.get('flow_steps', [])
+    browser = p.chromium.launch(headless=is_headless, args=args)
+    context = browser.new_context(viewport=viewport, storage_state=storage_state,
+                                  record_har_path=str(har_path) if har_path else None)
+    page = context.new_page()
 
-    log.info(f"Starting Browser Automation (Headless: {is_headless})", tags=["AUTO", "START"])
+    # Set default timeout for all actions
+    page.set_default_timeout(web_conf.get('search_timeout', 20000)) # Default 20s
+    return browser, context, page
 
-    otp_bucket = None 
 
-    with sync_playwright() as p:
-        # Launch Browser
-        browser = p.chromium.launch(headless=is_headless, args=args)
-        context = browser.new_context(viewport=viewport)
-        page = context.new_page()
-        
-        # Set default timeout for all actions
-        page.set_default_timeout(search_timeout)
+def is_logged_in(page):
+    """True once the app has moved off the login page."""
+    return "login" not in page.url.lower()
+
+
+def login(universal_data, page, recorder=None):
+    """
+    Navigates to the login page and runs the login phase of flow_steps.
+    Skipped entirely when a restored session lands past the login page; a fresh
+    login is cached (encrypted) for the next run.
+    """
+    log = universal_data['sys']['log']
+    web_conf = universal_data['sys']['config'].get('web_automation', {})
+    login_url = web_conf.get('login_url', "https://neo.kotaksecurities.com/Login")
+    login_steps, _ = split_flow_steps(web_conf.get('flow_steps', []))
+
+    log.info(f"Navigating to {login_url}...", tags=["AUTO", "NAV"])
+    page.goto(login_url)
+    page.wait_for_load_state("networkidle")
+    time.sleep(1)
+
+    if is_logged_in(page):
+        log.info("Cached Session Valid. Skipping Login Steps.", tags=["AUTO", "SESSION"])
+        return
+
+    run_flow_steps(universal_data, page, login_steps, recorder=recorder)
+    if is_logged_in(page):
+        save_storage_state(universal_data, page.context)
+
+
+def wait_until_ready(page, ready):
+    """
+    Blocks until a step's ready condition holds. Returns False on timeout.
+      {"type": "selector",     "value": "text=Kill Switch", "timeout": 5000}  -> element visible
+      {"type": "network_idle", "timeout": 5000}                              -> no requests for 500ms
+      {"type": "url",          "value": "**/Home*" | "re:...", "timeout": 5000}
+      {"type": "repaint",      "timeout": 3000}  -> two identical frames (canvas UI has settled)
+    """
+    kind = ready.get('type')
+    value = ready.get('value', '')
+    timeout = ready.get('timeout', 5000)
+
+    try:
+        if kind == 'selector':
+            page.wait_for_selector(value, state="visible", timeout=timeout)
+        elif kind == 'network_idle':
+            page.wait_for_load_state("networkidle", timeout=timeout)
+        elif kind == 'url':
+            pattern = re.compile(value[3:]) if value.startswith("re:") else value
+            page.wait_for_url(pattern, timeout=timeout)
+        elif kind == 'repaint':
+            deadline = time.time() + timeout / 1000.0
+            last = None
+            while time.time() < deadline:
+                page.evaluate("() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))")
+                frame = hashlib.md5(page.screenshot()).digest()
+                if frame == last:
+                    return True
+                last = frame
+            return False
+        else:
+            return False
+        return True
+    except Exception:
+        return False
+
+
+def run_flow_steps(universal_data, page, steps, run_state=None, recorder=None):
+    """
+    Executes flow steps on 'page'. 'run_state' carries data between steps
+    (e.g. the OTP listener started at the password step); 'recorder' (FlowRecorder)
+    receives per-step timings.
+    A step with a 'ready' condition moves on as soon as it holds; its fixed 'wait'
+    is only slept if the condition times out (or when no condition is set).
+    """
+    log = universal_data['sys']['log']
+    creds = universal_data['sys']['creds']['kotak']
+    web_conf = universal_data['sys']['config'].get('web_automation', {})
+    search_timeout = web_conf.get('search_timeout', 20000)
+    default_key_delay = web_conf.get('key_delay')
+    run_state = run_state if run_state is not None else {'otp_bucket': None}
+
+    for step in steps:
+        s_id = step.get('id')
+        s_desc = step.get('description', 'Action')
+        s_action = step.get('action')
+        is_enabled = step.get('enabled', True)
+        is_optional = step.get('optional', False)
+        wait_time = step.get('wait', 0.5)
+        ready = step.get('ready') or {}
+        key_delay = step.get('key_delay', default_key_delay)
+
+        if not is_enabled:
+            continue
+
+        log.info(f"Step {s_id}: {s_desc}", tags=["AUTO", "STEP"])
+        t_start = time.perf_counter()
+        t_action = None
+        ready_ok = None
 
         try:
-            log.info(f"Navigating to {login_url}...", tags=["AUTO", "NAV"])
-            page.goto(login_url)
-            page.wait_for_load_state("networkidle")
-            time.sleep(1)
-
-            for step in steps:
-                s_id = step.get('id')
-                s_desc = step.get('description', 'Action')
-                s_action = step.get('action')
-                is_enabled = step.get('enabled', True)
-                is_optional = step.get('optional', False)
-                wait_time = step.get('wait', 0.5)
-
-                if not is_enabled:
-                    continue
-
-                log.info(f"Step {s_id}: {s_desc}", tags=["AUTO", "STEP"])
-
-                try:
-                    # --- INPUT ---
-                    if s_action == 'input':
-                        key = step.get('cred_key')
-                        val = creds.get(key, "")
-                        
-                        # Mobile Number Formatting
-                        if "mobile" in key.lower():
-                            if val.startswith("+91"): val = val.replace("+91", "", 1)
-                            # FIX: Use search_timeout instead of hardcoded 2000ms
-                            try: 
-                                page.get_by_role("textbox", name="Mobile number").click(timeout=search_timeout)
-                            except: 
-                                # Try alternative selectors if role fails
-                                try: page.get_by_placeholder("Enter mobile number").click(timeout=search_timeout)
-                                except: page.locator("input[type='number']").click(timeout=search_timeout)
-                        
-                        # Password Logic
-                        elif "password" in key.lower():
-                            page.get_by_role("textbox", name="Enter password").click()
-                            # Start OTP listener early if next step needs it
-                            log.info("Starting OTP Listener in background...", tags=["AUTO"])
-                            otp_bucket = start_otp_listener(universal_data)
-
-                        page.keyboard.type(val, delay=50)
-                        
-                        # Press Enter keys if defined
-                        if step.get('keys'):
-                            for k in step['keys']: 
-                                page.keyboard.press(k)
-                                time.sleep(0.2)
-
-                    # --- OTP ---
-                    elif s_action == 'otp':
-                        if not otp_bucket: 
-                            raise RuntimeError("OTP Listener was not started in previous steps!")
-                        
-                        log.info("Waiting for OTP from Email...", tags=["AUTO", "WAIT"])
-                        
-                        # Poll for OTP
-                        start_wait = time.time()
-                        found = False
-                        while time.time() - start_wait < 120: # 2 min max
-                            if otp_bucket['otp']:
-                                found = True
-                                break
-                            if otp_bucket['error']:
-                                raise RuntimeError(f"OTP Listener Error: {otp_bucket['error']}")
-                            time.sleep(1)
-                        
-                        if found:
-                            log.info(f"Applying OTP: {otp_bucket['otp']}", tags=["AUTO"])
-                            page.keyboard.type(otp_bucket['otp'], delay=100)
-                            page.wait_for_load_state("networkidle")
-                        else:
-                            raise RuntimeError("OTP Timeout - Email not received")
-
-                    # --- CLICK (COORDINATES) ---
-                    elif s_action == 'click':
-                        coords = step.get('coords')
-                        if coords:
-                            page.mouse.click(coords['x'], coords['y'])
-                        else:
-                            log.warning(f"Step {s_id}: Missing coordinates", tags=["AUTO"])
-
-                    # --- SCROLL ---
-                    elif s_action == 'scroll':
-                        repeats = step.get('repeats') or 1
-                        for _ in range(repeats):
-                            page.mouse.wheel(0, 300)
-                            time.sleep(0.2)
-
-                    # --- KEYS ---
-                    elif s_action == 'keys':
-                        keys = step.get('keys') or []
-                        for k in keys:
-                            page.keyboard.press(k)
-                            time.sleep(0.3)
-
-                    # Post-Step Wait
+            # --- INPUT ---
+            if s_action == 'input':
+                key = step.get('cred_key')
+                val = creds.get(key, "")
+
+                # Mobile Number Formatting
+                if "mobile" in key.lower():
+                    if val.startswith("+91"): val = val.replace("+91", "", 1)
+                    # FIX: Use search_timeout instead of hardcoded 2000ms
+                    try:
+                        page.get_by_role("textbox", name="Mobile number").click(timeout=search_timeout)
+                    except:
+                        # Try alternative selectors if role fails
+                        try: page.get_by_placeholder("Enter mobile number").click(timeout=search_timeout)
+                        except: page.locator("input[type='number']").click(timeout=search_timeout)
+
+                # Password Logic
+                elif "password" in key.lower():
+                    page.get_by_role("textbox", name="Enter password").click()
+                    # Start OTP listener early if next step needs it
+                    log.info("Starting OTP Listener in background...", tags=["AUTO"])
+                    run_state['otp_bucket'] = start_otp_listener(universal_data)
+
+                page.keyboard.type(val, delay=50)
+
+                # Press Enter keys if defined
+                if step.get('keys'):
+                    for k in step['keys']:
+                        page.keyboard.press(k)
+                        time.sleep(0.2 if key_delay is None else key_delay)
+
+            # --- OTP ---
+            elif s_action == 'otp':
+                otp_bucket = run_state.get('otp_bucket')
+                if not otp_bucket:
+                    raise RuntimeError("OTP Listener was not started in previous steps!")
+
+                log.info("Waiting for OTP from Email...", tags=["AUTO", "WAIT"])
+
+                # Poll for OTP
+                start_wait = time.time()
+                found = False
+                while time.time() - start_wait < 120: # 2 min max
+                    if otp_bucket['otp']:
+                        found = True
+                        break
+                    if otp_bucket['error']:
+                        raise RuntimeError(f"OTP Listener Error: {otp_bucket['error']}")
+                    time.sleep(1)
+
+                if found:
+                    log.info(f"Applying OTP: {otp_bucket['otp']}", tags=["AUTO"])
+                    page.keyboard.type(otp_bucket['otp'], delay=100)
+                    page.wait_for_load_state("networkidle")
+                else:
+                    raise RuntimeError("OTP Timeout - Email not received")
+
+            # --- CLICK (COORDINATES) ---
+            elif s_action == 'click':
+                coords = step.get('coords')
+                if coords:
+                    page.mouse.click(coords['x'], coords['y'])
+                else:
+                    log.warning(f"Step {s_id}: Missing coordinates", tags=["AUTO"])
+
+            # --- SCROLL ---
+            elif s_action == 'scroll':
+                repeats = step.get('repeats') or 1
+                for _ in range(repeats):
+                    page.mouse.wheel(0, 300)
+                    time.sleep(0.2 if key_delay is None else key_delay)
+
+            # --- KEYS ---
+            elif s_action == 'keys':
+                keys = step.get('keys') or []
+                for k in keys:
+                    page.keyboard.press(k)
+                    time.sleep(0.3 if key_delay is None else key_delay)
+
+            # Post-Step Wait (Ready condition first, fixed wait as fallback)
+            t_action = time.perf_counter()
+            if ready.get('type'):
+                ready_ok = wait_until_ready(page, ready)
+                if not ready_ok:
+                    log.warning(f"Step {s_id}: Ready '{ready.get('type')}' timed out. Using fixed wait.", tags=["AUTO", "WAIT"])
                     if wait_time: time.sleep(wait_time)
+            elif wait_time:
+                time.sleep(wait_time)
+
+            if recorder:
+                recorder.record_step(step, page, t_start, t_action, time.perf_counter(), ready_ok)
+
+        except Exception as step_e:
+            if recorder:
+                t_end = time.perf_counter()
+                recorder.record_step(step, page, t_start, t_action or t_end, t_end, ready_ok, error=step_e)
+            if is_optional:
+                log.warning(f"Optional Step {s_id} Failed: {step_e}", tags=["AUTO", "SKIP"])
+            else:
+                raise step_e
 
-                except Exception as step_e:
-                    if is_optional:
-                        log.warning(f"Optional Step {s_id} Failed: {step_e}", tags=["AUTO", "SKIP"])
-                    else:
-                        raise step_e
+
+def execute_kill_switch(universal_data):
+    """
+    Main Driver: Login -> Navigate -> Kill Switch.
+    Uses the warm standby browser (already logged in) when one is ready;
+    otherwise runs cold, reading browser settings dynamically from config.json.
+    """
+    log = universal_data['sys']['log']
+
+    # 1. Warm Path (Skips launch + login)
+    warm = universal_data['sys'].get('warm_browser')
+    if warm and warm.is_ready():
+        try:
+            warm.execute_kill()
+            return
+        except Exception as e:
+            log.error(f"Warm Browser Kill Failed: {e}. Falling back to cold start.", tags=["AUTO", "WARM"])
+
+    # 2. Cold Path
+    web_conf = universal_data['sys']['config'].get('web_automation', {})
+    is_headless = web_conf.get('browser', {}).get('headless', False)
+    _, kill_steps = split_flow_steps(web_conf.get('flow_steps', []))
+
+    log.info(f"Starting Browser Automation (Headless: {is_headless})", tags=["AUTO", "START"])
+
+    run_dir = new_run_dir(universal_data)
+    har_path = run_dir / "network.har" if run_dir and profiler_conf(universal_data).get('har', False) else None
+
+    with sync_playwright() as p:
+        browser, context, page = open_browser(p, web_conf, load_storage_state(universal_data), har_path)
+        recorder = None
+        if run_dir:
+            recorder = FlowRecorder(universal_data, run_dir, "cold")
+            recorder.attach(context)
+
+        try:
+            login(universal_data, page, recorder)
+            run_flow_steps(universal_data, page, kill_steps, recorder=recorder)
 
             log.info("Automation Sequence Completed.", tags=["AUTO", "DONE"])
             time.sleep(2)
+            if recorder: recorder.finish("completed")
 
         except Exception as e:
+            if recorder: recorder.finish("failed", e)
             log.critical(f"Automation Critical Failure: {e}", tags=["AUTO", "FAIL"])
             # Save screenshot for debugging
-            try: 
+            try:
                 user = universal_data.get('user_id', 'unknown')
                 page.screenshot(path=f"logs/error_{user}.png")
             except: pass
             raise e
         finally:
-            browser.close()
\ No newline at end of file
+            context.close() # Flushes the HAR
+            browser.close()
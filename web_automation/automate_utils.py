@@ -5,6 +5,7 @@ import time
 from threading import Thread
 from datetime import datetime, timedelta
 from email.utils import parsedate_to_datetime
+from web_automation.mailbox import get_mailbox
 
 # =========================================================
 #  ORIGINAL OTP LOGIC (Restored)
@@ -89,12 +90,18 @@ def _imap_worker(creds, gmail_conf, result_bucket):
 
 def start_otp_listener(universal_data):
     """
-    Starts the background thread and returns a result bucket dict.
+    Returns a result bucket dict filled with the next OTP.
+    Served by the account's IDLE mailbox watcher when connected; otherwise
+    starts the polling thread.
     """
     # Accessing Single-Account Structure
     creds = universal_data['sys']['creds'].get('gmail', {})
     config = universal_data['sys']['config'].get('gmail', {})
-    
+
+    watcher = get_mailbox(universal_data)
+    if watcher and watcher.is_alive() and watcher.connected.wait(5):
+        return watcher.wait_otp(config.get('timeout_seconds', 120))
+
     result_bucket = {'otp': None, 'error': None}
     
     t = Thread(target=_imap_worker, args=(creds, config, result_bucket), daemon=True)
@@ -109,8 +116,12 @@ def start_otp_listener(universal_data):
 def check_kill_email(universal_data, lookback_seconds=300):
     """
     Blocking Check: Scans for 'Kill Switch Activated' email.
-    Used ONLY during the Kill Verification phase.
+    Answered from the IDLE mailbox watcher (no login) when it is connected.
     """
+    watcher = get_mailbox(universal_data)
+    if watcher and watcher.is_connected():
+        return watcher.kill_email_since(lookback_seconds)
+
     creds = universal_data['sys']['creds'].get('gmail', {})
     conf = universal_data['sys']['config'].get('gmail', {})
     
@@ -162,4 +173,19 @@ def check_kill_email(universal_data, lookback_seconds=300):
         return found
 
     except Exception:
-        return False
\ No newline at end of file
+        return False
+
+
+def wait_kill_email(universal_data, lookback_seconds=600, timeout=20):
+    """
+    Waits up to 'timeout' for a kill confirmation. Returns as soon as the watcher
+    sees one; without a watcher it checks once and sleeps out the timeout.
+    """
+    watcher = get_mailbox(universal_data)
+    if watcher and watcher.is_connected():
+        return watcher.wait_kill_email(lookback_seconds, timeout)
+
+    if check_kill_email(universal_data, lookback_seconds=lookback_seconds):
+        return True
+    time.sleep(timeout)
+    return False
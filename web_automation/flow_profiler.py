@@ -0,0 +1,116 @@
+import json
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+RUNS_DIR = Path(__file__).parent.parent / "logs" / "runs"
+
+
+def profiler_conf(universal_data):
+    """web_automation.profiler {enabled, trace, har, screenshots, keep_runs}"""
+    return universal_data['sys']['config'].get('web_automation', {}).get('profiler', {})
+
+
+def new_run_dir(universal_data, runs_dir=RUNS_DIR):
+    """logs/runs/{user}_{ts}/ for one automation run. None if profiling is off."""
+    if not profiler_conf(universal_data).get('enabled', False):
+        return None
+    run_dir = Path(runs_dir) / f"{universal_data.get('user_id', 'unknown')}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    return run_dir
+
+
+class FlowRecorder:
+    """
+    Replayable record of one automation run:
+      run.json        -> per-step timings (action / wait split, ready outcome, errors)
+      trace.zip       -> Playwright trace (open with `playwright show-trace trace.zip`)
+      network.har     -> HAR capture (cold runs only, context must be created with it)
+      step_XX.png     -> screenshot after each step
+    Summarise runs with `python -m web_automation.flow_report`.
+    """
+    def __init__(self, universal_data, run_dir, mode):
+        self.universal_data = universal_data
+        self.run_dir = Path(run_dir)
+        self.mode = mode # "cold" / "warm"
+        self.conf = profiler_conf(universal_data)
+        self.context = None
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.steps = []
+
+    def attach(self, context):
+        """Starts tracing on the browser context (if configured)."""
+        self.context = context
+        if self.conf.get('trace', True):
+            try:
+                context.tracing.start(screenshots=True, snapshots=True, sources=False)
+            except Exception as e:
+                self.universal_data['sys']['log'].warning(f"Trace Start Failed: {e}", tags=["AUTO", "PROFILE"])
+                self.context = None
+
+    def record_step(self, step, page, t_start, t_action, t_end, ready_ok=None, error=None):
+        entry = {
+            'id': step.get('id'),
+            'description': step.get('description', 'Action'),
+            'action': step.get('action'),
+            'phase': step.get('phase'),
+            'configured_wait': step.get('wait', 0.5),
+            'ready_type': (step.get('ready') or {}).get('type'),
+            'ready_ok': ready_ok,
+            'start_ms': round((t_start - self.t0) * 1000, 1),
+            'action_ms': round((t_action - t_start) * 1000, 1),
+            'wait_ms': round((t_end - t_action) * 1000, 1),
+            'total_ms': round((t_end - t_start) * 1000, 1),
+            'ok': error is None,
+            'error': str(error) if error is not None else None,
+            'screenshot': None,
+        }
+        if self.conf.get('screenshots', True):
+            name = f"step_{len(self.steps) + 1:02d}_{step.get('id')}.png"
+            try:
+                page.screenshot(path=str(self.run_dir / name))
+                entry['screenshot'] = name
+            except Exception:
+                pass
+        self.steps.append(entry)
+
+    def finish(self, outcome, error=None):
+        """Stops tracing and writes run.json. Never raises (profiling must not break a kill)."""
+        log = self.universal_data['sys']['log']
+        trace = None
+        if self.context is not None:
+            try:
+                self.context.tracing.stop(path=str(self.run_dir / "trace.zip"))
+                trace = "trace.zip"
+            except Exception as e:
+                log.warning(f"Trace Save Failed: {e}", tags=["AUTO", "PROFILE"])
+
+        run = {
+            'user_id': self.universal_data.get('user_id'),
+            'mode': self.mode,
+            'started_at': datetime.fromtimestamp(self.started).isoformat(timespec='milliseconds'),
+            'outcome': outcome,
+            'error': str(error) if error is not None else None,
+            'wall_ms': round((time.perf_counter() - self.t0) * 1000, 1),
+            'trace': trace,
+            'har': "network.har" if (self.run_dir / "network.har").exists() else None,
+            'steps': self.steps,
+        }
+        try:
+            (self.run_dir / "run.json").write_text(json.dumps(run, indent=2), encoding='utf-8')
+            log.info(f"Automation Run Recorded: {self.run_dir} ({run['wall_ms']:.0f}ms)", tags=["AUTO", "PROFILE"])
+        except Exception as e:
+            log.warning(f"Run Record Failed: {e}", tags=["AUTO", "PROFILE"])
+        prune_runs(self.run_dir.parent, self.conf.get('keep_runs', 50))
+
+
+def prune_runs(runs_dir, keep):
+    """Keeps the newest 'keep' run folders."""
+    try:
+        runs = sorted((d for d in Path(runs_dir).iterdir() if d.is_dir()), key=lambda d: d.stat().st_mtime)
+        for old in runs[:-keep] if keep > 0 else []:
+            shutil.rmtree(old, ignore_errors=True)
+    except Exception:
+        pass
@@ -0,0 +1,127 @@
+"""
+Offline report over recorded automation runs (logs/runs/*/run.json).
+Shows which steps dominate wall time and suggests 'wait' values from measured
+ready times.
+
+    python -m web_automation.flow_report
+    python -m web_automation.flow_report --user USER_01 --last 20
+"""
+import argparse
+import json
+import math
+from pathlib import Path
+
+from web_automation.flow_profiler import RUNS_DIR
+
+
+def load_runs(runs_dir=RUNS_DIR, user=None, last=None):
+    runs = []
+    for path in sorted(Path(runs_dir).glob("*/run.json")):
+        try:
+            run = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        if user and run.get('user_id') != user:
+            continue
+        run['path'] = str(path.parent)
+        runs.append(run)
+    runs.sort(key=lambda r: r.get('started_at') or "")
+    return runs[-last:] if last else runs
+
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(runs):
+    """Per-step aggregates keyed by (id, description), sorted by share of total wall time."""
+    steps = {}
+    wall_total = sum(r.get('wall_ms', 0) for r in runs) or 1.0
+    for run in runs:
+        for s in run.get('steps', []):
+            key = (s.get('id'), s.get('description'))
+            agg = steps.setdefault(key, {
+                'id': s.get('id'), 'description': s.get('description'), 'action': s.get('action'),
+                'configured_wait': s.get('configured_wait'), 'ready_type': s.get('ready_type'),
+                'total': [], 'action_ms': [], 'wait_ms': [], 'ready_ms': [], 'fallbacks': 0, 'errors': 0,
+            })
+            agg['configured_wait'] = s.get('configured_wait') # Latest config wins
+            agg['ready_type'] = s.get('ready_type')
+            agg['total'].append(s.get('total_ms', 0))
+            agg['action_ms'].append(s.get('action_ms', 0))
+            agg['wait_ms'].append(s.get('wait_ms', 0))
+            if s.get('ready_ok') is True:
+                agg['ready_ms'].append(s.get('wait_ms', 0))
+            elif s.get('ready_ok') is False:
+                agg['fallbacks'] += 1
+            if not s.get('ok', True):
+                agg['errors'] += 1
+
+    rows = []
+    for agg in steps.values():
+        total = agg['total']
+        # Suggested fixed wait: p95 of the measured ready time + 20% headroom
+        suggested = round(_pct(agg['ready_ms'], 95) * 1.2 / 1000, 2) if agg['ready_ms'] else None
+        rows.append({
+            'id': agg['id'], 'description': agg['description'], 'action': agg['action'],
+            'runs': len(total),
+            'mean_ms': sum(total) / len(total),
+            'p95_ms': _pct(total, 95),
+            'action_mean_ms': sum(agg['action_ms']) / len(total),
+            'wait_mean_ms': sum(agg['wait_ms']) / len(total),
+            'share_pct': sum(total) / wall_total * 100,
+            'ready_type': agg['ready_type'],
+            'fallbacks': agg['fallbacks'],
+            'errors': agg['errors'],
+            'configured_wait': agg['configured_wait'],
+            'suggested_wait': suggested,
+        })
+    rows.sort(key=lambda r: r['share_pct'], reverse=True)
+    return rows
+
+
+def print_report(runs, rows):
+    if not runs:
+        print("No recorded runs. Enable web_automation.profiler.enabled and run the automation.")
+        return
+    walls = [r.get('wall_ms', 0) for r in runs]
+    failed = sum(1 for r in runs if r.get('outcome') != 'completed')
+    print(f"\nRuns: {len(runs)} (failed {failed}) | Wall p50 {_pct(walls, 50):.0f}ms  p95 {_pct(walls, 95):.0f}ms  max {max(walls):.0f}ms\n")
+
+    header = f"{'ID':>3}  {'STEP':<24} {'ACTION':<7} {'N':>3} {'MEAN':>7} {'P95':>7} {'ACT':>7} {'WAIT':>7} {'SHARE':>6}  {'READY':<13} {'FB':>3} {'ERR':>3}  {'WAIT CFG':>8} {'SUGGEST':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        suggest = f"{r['suggested_wait']:.2f}" if r['suggested_wait'] is not None else "-"
+        cfg = f"{r['configured_wait']:.2f}" if isinstance(r['configured_wait'], (int, float)) else "-"
+        print(f"{str(r['id']):>3}  {str(r['description'])[:24]:<24} {str(r['action'])[:7]:<7} {r['runs']:>3} "
+              f"{r['mean_ms']:>7.0f} {r['p95_ms']:>7.0f} {r['action_mean_ms']:>7.0f} {r['wait_mean_ms']:>7.0f} "
+              f"{r['share_pct']:>5.1f}%  {str(r['ready_type'] or '-'):<13} {r['fallbacks']:>3} {r['errors']:>3}  {cfg:>8} {suggest:>7}")
+
+    last = runs[-1]
+    print(f"\nLatest: {last['path']} ({last.get('mode')}, {last.get('outcome')})")
+    if last.get('trace'):
+        print(f"Replay: playwright show-trace {Path(last['path']) / last['trace']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise recorded web automation runs.")
+    parser.add_argument("--runs-dir", default=str(RUNS_DIR))
+    parser.add_argument("--user", default=None, help="Only runs for this account (e.g. USER_01)")
+    parser.add_argument("--last", type=int, default=None, help="Only the N most recent runs")
+    parser.add_argument("--json", action="store_true", help="Print the step summary as JSON")
+    args = parser.parse_args(argv)
+
+    runs = load_runs(args.runs_dir, args.user, args.last)
+    rows = summarize(runs)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(runs, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import email
+import html
+import imaplib
+import re
+import select
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from email.header import decode_header
+from email.utils import parsedate_to_datetime
+
+IMAP_HOST = "imap.gmail.com"
+DEFAULT_SENDER = "noreply@nmail.kotaksecurities.com"
+OTP_PATTERN = re.compile(r"\b(\d{4,6})\b")
+HTML_SKIP = re.compile(r"<(style|script|head)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+HTML_TAG = re.compile(r"<[^>]+>")
+
+# --- CONFIGURATION ---
+OTP_GRACE_SECONDS = 30      # An OTP mail this much older than its waiter still counts (mail beat the waiter)
+OTP_FALLBACK_SECONDS = 15   # Tail of the OTP wait served by plain IMAP searches instead of IDLE
+OTP_FALLBACK_POLL = 2
+
+
+def _decode_subject(value):
+    parts = []
+    for content, encoding in decode_header(value or ""):
+        if isinstance(content, bytes):
+            parts.append(content.decode(encoding or 'utf-8', errors='ignore'))
+        else:
+            parts.append(content)
+    return "".join(parts)
+
+
+def _strip_html(text):
+    return html.unescape(HTML_TAG.sub(" ", HTML_SKIP.sub(" ", text)))
+
+
+def _message_text(msg):
+    """
+    Body text of a message ("" if none): the first text/plain part, else the first
+    text/html part with tags stripped. A single-part mail is decoded whatever its type.
+    """
+    if not msg.is_multipart():
+        payload = msg.get_payload(decode=True)
+        if not payload:
+            return ""
+        text = payload.decode(errors="ignore")
+        return _strip_html(text) if msg.get_content_subtype() == "html" else text
+
+    html_text = ""
+    for part in msg.walk():
+        ctype = part.get_content_type()
+        if ctype not in ("text/plain", "text/html"):
+            continue
+        payload = part.get_payload(decode=True)
+        if not payload:
+            continue
+        if ctype == "text/plain":
+            return payload.decode(errors="ignore")
+        if not html_text:
+            html_text = _strip_html(payload.decode(errors="ignore"))
+    return html_text
+
+
+def _mail_epoch(msg):
+    try:
+        return parsedate_to_datetime(msg.get("Date")).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def search_otp(email_user, email_pass, sender, since):
+    """
+    One plain IMAP search (own connection): the OTP of the newest mail from 'sender'
+    dated at or after 'since' (epoch seconds), else None.
+    """
+    mail = imaplib.IMAP4_SSL(IMAP_HOST, timeout=15)
+    try:
+        mail.login(email_user, email_pass)
+        mail.select("inbox")
+        day = datetime.fromtimestamp(since).strftime("%d-%b-%Y")
+        typ, data = mail.uid('search', None, f'(FROM "{sender}" SINCE {day})')
+        for uid in reversed(data[0].split()[-5:]):
+            typ, msg_data = mail.uid('fetch', uid, "(BODY.PEEK[])")
+            raw = next((part[1] for part in msg_data if isinstance(part, tuple)), None)
+            if not raw:
+                continue
+            msg = email.message_from_bytes(raw)
+            if _mail_epoch(msg) < since:
+                break # Newest first: the rest is older
+            match = OTP_PATTERN.search(_message_text(msg))
+            if match:
+                return match.group(1)
+        return None
+    finally:
+        try: mail.logout()
+        except: pass
+
+
+class MailboxWatcher(threading.Thread):
+    """
+    One long-lived Gmail IMAP session per account, pushed via IDLE.
+    New Kotak mails are dispatched to OTP waiters (wait_otp) and recorded as kill
+    confirmations (kill_email_since / wait_kill_email) so callers never log in themselves.
+    The latest OTP is kept (with its time) for a waiter that registers just after the mail;
+    a waiter IDLE did not serve gets a plain IMAP search for the last OTP_FALLBACK_SECONDS.
+    Reconnects with backoff; IDLE is re-issued every 'reidle_seconds' (Gmail drops it ~10-29 min).
+    Config: gmail.imap_idle {enabled, reidle_seconds, max_backoff_seconds}.
+    """
+    def __init__(self, universal_data):
+        super().__init__(name=f"{universal_data['user_id']}_Mailbox", daemon=True)
+        self.log = universal_data['sys']['log']
+
+        creds = universal_data['sys']['creds'].get('gmail', {})
+        conf = universal_data['sys']['config'].get('gmail', {})
+        self.email_user = creds.get('email')
+        self.email_pass = creds.get('google_app_password')
+        self.sender = conf.get('sender_filter') or creds.get('sender_filter') or DEFAULT_SENDER
+        self.kill_subject = conf.get('kill_subject', 'Kill Switch Activated')
+
+        idle_conf = conf.get('imap_idle', {})
+        self.reidle_every = idle_conf.get('reidle_seconds', 540)
+        self.max_backoff = idle_conf.get('max_backoff_seconds', 300)
+
+        self.cond = threading.Condition()
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.last_uid = None
+        self.otp_waiters = [] # [(bucket, deadline, since)]
+        self.last_otp = None  # (otp, received_at) of the newest unclaimed OTP mail
+        self.kill_dates = deque(maxlen=20) # Date headers of kill confirmations (aware datetimes)
+
+    # --- Public API (any thread) ---
+    def is_connected(self):
+        return self.connected.is_set() and self.is_alive()
+
+    def wait_otp(self, timeout):
+        """
+        Result bucket {'otp', 'error'} filled by the next OTP mail (same shape as start_otp_listener).
+        An unclaimed OTP received up to OTP_GRACE_SECONDS before the call is handed out at once.
+        """
+        bucket = {'otp': None, 'error': None}
+        now = time.time()
+        since = now - OTP_GRACE_SECONDS
+        with self.cond:
+            if self.last_otp and self.last_otp[1] >= since:
+                bucket['otp'] = self.last_otp[0]
+                self.last_otp = None
+                return bucket
+            self.otp_waiters.append((bucket, now + max(timeout - OTP_FALLBACK_SECONDS, 1), since))
+        return bucket
+
+    def kill_email_since(self, lookback_seconds):
+        threshold = datetime.now().astimezone() - timedelta(seconds=lookback_seconds)
+        with self.cond:
+            return any(d >= threshold for d in self.kill_dates)
+
+    def wait_kill_email(self, lookback_seconds, timeout):
+        """Blocks until a kill confirmation within 'lookback_seconds' is seen (or timeout)."""
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: self.stopped.is_set() or any(
+                    d >= datetime.now().astimezone() - timedelta(seconds=lookback_seconds) for d in self.kill_dates),
+                timeout=timeout) and not self.stopped.is_set()
+
+    def stop(self):
+        self.stopped.set()
+        with self.cond:
+            self.cond.notify_all()
+
+    # --- Mailbox Thread ---
+    def run(self):
+        if not self.email_user or not self.email_pass:
+            self.log.warning("Mailbox Watcher: Missing Gmail Credentials.", tags=["MAIL"])
+            return
+
+        backoff = 5
+        while not self.stopped.is_set():
+            try:
+                self._session()
+                backoff = 5
+            except Exception as e:
+                self.log.warning(f"Mailbox Connection Lost: {e}. Reconnecting in {backoff}s.", tags=["MAIL"])
+                if self.connected.is_set():
+                    backoff = 5 # Was healthy: retry fast
+                self.connected.clear()
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        self._fail_otp_waiters("Mailbox watcher stopped")
+
+    def _session(self):
+        mail = imaplib.IMAP4_SSL(IMAP_HOST, timeout=30)
+        try:
+            mail.login(self.email_user, self.email_pass)
+            mail.select("inbox")
+
+            if self.last_uid is None:
+                self.last_uid = self._uid_baseline(mail)
+                self._seed_kill_dates(mail)
+            else:
+                self._fetch_new(mail) # Catch up on anything that landed while disconnected
+
+            self.connected.set()
+            self.log.info("Mailbox Watcher Connected (IDLE).", tags=["MAIL"])
+
+            while not self.stopped.is_set():
+                self._idle(mail)
+                self._fetch_new(mail)
+        finally:
+            self.connected.clear()
+            try: mail.logout()
+            except: pass
+
+    def _uid_baseline(self, mail):
+        typ, data = mail.status("INBOX", "(UIDNEXT)")
+        match = re.search(rb"UIDNEXT (\d+)", data[0] or b"")
+        return int(match.group(1)) - 1 if match else 0
+
+    def _seed_kill_dates(self, mail):
+        """Recent kill mails (lets kill_email_since answer for mails older than this session)."""
+        typ, data = mail.uid('search', None, f'(FROM "{self.sender}" SUBJECT "{self.kill_subject}")')
+        for uid in data[0].split()[-3:]:
+            typ, msg_data = mail.uid('fetch', uid, "(BODY.PEEK[HEADER.FIELDS (DATE)])")
+            raw = next((part[1] for part in msg_data if isinstance(part, tuple)), None)
+            if raw:
+                self._record_kill(email.message_from_bytes(raw))
+
+    def _idle(self, mail):
+        """One IDLE round: returns when the server reports a change, on re-IDLE time, or on stop."""
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        changed = False
+        while True:
+            line = mail.readline()
+            if line.startswith(b"+"):
+                break
+            if not line.startswith(b"*"): # Untagged updates may precede the continuation
+                raise imaplib.IMAP4.error(f"IDLE refused: {line!r}")
+            changed = True
+
+        started = time.time()
+        while not changed and not self.stopped.is_set() and time.time() - started < self.reidle_every:
+            self._expire_otp_waiters()
+            readable, _, _ = select.select([mail.sock], [], [], 1.0)
+            if not readable and not mail.sock.pending():
+                continue
+            line = mail.readline()
+            if not line or line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort("Server closed the IDLE session")
+            break # Any untagged update (EXISTS/EXPUNGE/FETCH) -> go look
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+            if line.startswith(tag):
+                if b" OK" not in line:
+                    raise imaplib.IMAP4.error(f"IDLE ended with {line!r}")
+                return
+
+    def _fetch_new(self, mail):
+        typ, data = mail.uid('search', None, f'(UID {self.last_uid + 1}:* FROM "{self.sender}")')
+        uids = sorted(int(u) for u in data[0].split() if int(u) > self.last_uid)
+        for uid in uids:
+            typ, msg_data = mail.uid('fetch', str(uid), "(BODY.PEEK[])")
+            raw = next((part[1] for part in msg_data if isinstance(part, tuple)), None)
+            self.last_uid = uid
+            if raw:
+                self._dispatch(email.message_from_bytes(raw))
+
+    def _dispatch(self, msg):
+        subject = _decode_subject(msg.get("Subject"))
+        if self.kill_subject.lower() in subject.lower():
+            self._record_kill(msg)
+            self.log.info("Kill Confirmation Email Received.", tags=["MAIL", "KILL"])
+            return
+
+        match = OTP_PATTERN.search(_message_text(msg))
+        if not match:
+            return
+        with self.cond:
+            waiters, self.otp_waiters = self.otp_waiters, []
+            for bucket, _, _ in waiters:
+                bucket['otp'] = match.group(1)
+            self.last_otp = None if waiters else (match.group(1), time.time())
+        if waiters:
+            self.log.info("OTP Email Received.", tags=["MAIL", "OTP"])
+
+    def _record_kill(self, msg):
+        try:
+            date = parsedate_to_datetime(msg.get("Date"))
+            if date.tzinfo is None:
+                date = date.astimezone()
+        except (TypeError, ValueError):
+            date = datetime.now().astimezone()
+        with self.cond:
+            self.kill_dates.append(date)
+            self.cond.notify_all()
+
+    def _expire_otp_waiters(self):
+        now = time.time()
+        with self.cond:
+            if not self.otp_waiters:
+                return
+            expired = [w for w in self.otp_waiters if w[1] <= now]
+            self.otp_waiters = [w for w in self.otp_waiters if w[1] > now]
+        for bucket, _, since in expired:
+            threading.Thread(target=self._otp_fallback, args=(bucket, since),
+                             name=f"{self.name}_OtpSearch", daemon=True).start()
+
+    def _otp_fallback(self, bucket, since):
+        """IDLE did not deliver in time: plain IMAP searches until OTP_FALLBACK_SECONDS run out."""
+        self.log.warning("No OTP via IDLE. Falling back to IMAP search.", tags=["MAIL", "OTP"])
+        deadline = time.time() + OTP_FALLBACK_SECONDS
+        while time.time() < deadline and not self.stopped.is_set():
+            try:
+                otp = search_otp(self.email_user, self.email_pass, self.sender, since)
+            except Exception as e:
+                self.log.warning(f"OTP Search Failed: {e}", tags=["MAIL", "OTP"])
+                otp = None
+            if otp:
+                bucket['otp'] = otp
+                return
+            self.stopped.wait(OTP_FALLBACK_POLL)
+        bucket['error'] = "Timeout waiting for OTP email"
+
+    def _fail_otp_waiters(self, reason):
+        with self.cond:
+            waiters, self.otp_waiters = self.otp_waiters, []
+        for bucket, _, _ in waiters:
+            bucket['error'] = reason
+
+
+def get_mailbox(universal_data):
+    return universal_data['sys'].get('mailbox')
+
+
+def start_mailbox(universal_data):
+    """Starts the account's IDLE watcher if gmail.imap_idle.enabled (default on)."""
+    conf = universal_data['sys']['config'].get('gmail', {})
+    if not conf.get('imap_idle', {}).get('enabled', True):
+        return
+    watcher = MailboxWatcher(universal_data)
+    universal_data['sys']['mailbox'] = watcher
+    watcher.start()
+
+
+def stop_mailbox(universal_data):
+    watcher = universal_data['sys'].get('mailbox')
+    if watcher:
+        watcher.stop()
+        universal_data['sys']['mailbox'] = None
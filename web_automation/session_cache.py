@@ -0,0 +1,90 @@
+import base64
+import json
+import os
+import time
+from pathlib import Path
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError: # Cache is disabled (never stored in plaintext)
+    Fernet = None
+
+SESSION_DIR = Path(__file__).parent.parent / "source" / "sessions"
+SALT_BYTES = 16
+KDF_ITERATIONS = 390000
+
+
+def _cache_file(user_id):
+    return SESSION_DIR / f"{user_id}.session"
+
+
+def _derive_key(universal_data, salt):
+    """Fernet key from this account's Kotak secrets (credentials.json never leaves the machine)."""
+    kotak = universal_data['sys']['creds'].get('kotak', {})
+    secret = "|".join(str(kotak.get(k, '')) for k in ('consumer_key', 'mpin', 'login_password', 'totp_secret'))
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+
+def is_enabled(universal_data):
+    web_conf = universal_data['sys']['config'].get('web_automation', {})
+    return Fernet is not None and web_conf.get('session_cache', {}).get('enabled', True)
+
+
+def save_storage_state(universal_data, context):
+    """Encrypts context.storage_state() (cookies + local storage) to source/sessions/{user}.session."""
+    if not is_enabled(universal_data):
+        return
+    log = universal_data['sys']['log']
+    try:
+        state = context.storage_state()
+        salt = os.urandom(SALT_BYTES)
+        token = Fernet(_derive_key(universal_data, salt)).encrypt(json.dumps(state).encode())
+
+        SESSION_DIR.mkdir(parents=True, exist_ok=True)
+        path = _cache_file(universal_data['user_id'])
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(salt + token)
+        os.replace(tmp, path)
+        log.info("Browser Session Cached.", tags=["AUTO", "SESSION"])
+    except Exception as e:
+        log.warning(f"Browser Session Save Failed: {e}", tags=["AUTO", "SESSION"])
+
+
+def load_storage_state(universal_data):
+    """
+    Decrypted storage_state dict, or None if missing, older than
+    web_automation.session_cache.max_age_hours, unreadable (OS error) or
+    undecryptable (creds changed). Never raises: a bad cache means a fresh login.
+    """
+    if not is_enabled(universal_data):
+        return None
+    log = universal_data['sys']['log']
+    path = _cache_file(universal_data['user_id'])
+    max_age = universal_data['sys']['config'].get('web_automation', {}).get('session_cache', {}).get('max_age_hours', 12)
+    try:
+        if not path.exists():
+            return None
+        if time.time() - path.stat().st_mtime > max_age * 3600:
+            clear_storage_state(universal_data)
+            return None
+
+        blob = path.read_bytes()
+        salt, token = blob[:SALT_BYTES], blob[SALT_BYTES:]
+        return json.loads(Fernet(_derive_key(universal_data, salt)).decrypt(token))
+    except (InvalidToken, ValueError) as e:
+        log.warning(f"Browser Session Cache Unreadable ({type(e).__name__}). Discarding.", tags=["AUTO", "SESSION"])
+        clear_storage_state(universal_data)
+        return None
+    except Exception as e: # OSError (permissions, file vanished mid-read) etc.: the kill must not stop here
+        log.warning(f"Browser Session Cache Load Failed ({type(e).__name__}: {e}). Logging in fresh.", tags=["AUTO", "SESSION"])
+        return None
+
+
+def clear_storage_state(universal_data):
+    try:
+        _cache_file(universal_data['user_id']).unlink(missing_ok=True)
+    except Exception:
+        pass
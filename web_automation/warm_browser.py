@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from playwright.sync_api import sync_playwright
+from web_automation.automate import open_browser, login, is_logged_in, run_flow_steps, split_flow_steps
+from web_automation.session_cache import load_storage_state, save_storage_state
+from web_automation.flow_profiler import FlowRecorder, new_run_dir
+
+
+class WarmBrowser(threading.Thread):
+    """
+    Keeps a logged-in Kotak Neo page open for one account so a kill starts at the
+    Kill Switch navigation steps. Playwright's sync API is thread-bound, so every
+    browser call happens on this thread; other threads submit work via execute_kill().
+    A kill request the thread does not pick up within 'accept_seconds' is cancelled (the
+    caller goes cold), and queued requests are cancelled whenever the session dies or
+    re-logs in, so a timed-out request can never run later alongside the cold path.
+    Config: web_automation.warm_standby {enabled, refresh_minutes, health_check_seconds,
+    accept_seconds, kill_timeout_seconds}.
+    """
+    def __init__(self, universal_data):
+        super().__init__(name=f"{universal_data['user_id']}_WarmBrowser", daemon=True)
+        self.universal_data = universal_data
+        self.log = universal_data['sys']['log']
+
+        warm_conf = universal_data['sys']['config'].get('web_automation', {}).get('warm_standby', {})
+        self.refresh_every = warm_conf.get('refresh_minutes', 10) * 60
+        self.health_every = warm_conf.get('health_check_seconds', 30)
+        self.accept_timeout = warm_conf.get('accept_seconds', 3)
+        self.kill_timeout = warm_conf.get('kill_timeout_seconds', 90)
+
+        self.requests = queue.Queue()
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.page = None
+        self.context = None
+
+    # --- Public API (any thread) ---
+    def is_ready(self):
+        return self.ready.is_set() and self.is_alive()
+
+    def execute_kill(self):
+        """Runs the kill phase on the warm page. Raises if it fails or is not picked up (caller falls back to cold)."""
+        fut, accepted = Future(), threading.Event()
+        self.requests.put((fut, accepted))
+        if not accepted.wait(self.accept_timeout) and fut.cancel():
+            raise TimeoutError(f"Warm browser busy (not picked up in {self.accept_timeout}s)")
+        return fut.result(timeout=self.kill_timeout)
+
+    def stop(self):
+        self.stopped.set()
+        self.requests.put(None)
+
+    # --- Browser Thread ---
+    def run(self):
+        backoff = 5
+        while not self.stopped.is_set():
+            try:
+                with sync_playwright() as p:
+                    self._session(p)
+                backoff = 5
+            except Exception as e:
+                self.ready.clear()
+                self._cancel_pending()
+                self.log.warning(f"Warm Browser Down: {e}. Restarting in {backoff}s.", tags=["AUTO", "WARM"])
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, 300)
+        self.ready.clear()
+        self._cancel_pending()
+
+    def _session(self, p):
+        web_conf = self.universal_data['sys']['config'].get('web_automation', {})
+        browser, context, self.page = open_browser(p, web_conf, load_storage_state(self.universal_data))
+        self.context = context
+        try:
+            self._login()
+            last_refresh = time.time()
+
+            while not self.stopped.is_set():
+                try:
+                    request = self.requests.get(timeout=self.health_every)
+                except queue.Empty:
+                    request = None
+
+                if request is not None:
+                    fut, accepted = request
+                    if not fut.set_running_or_notify_cancel():
+                        continue # Caller gave up waiting and went cold
+                    accepted.set()
+                    self._run_kill(fut)
+                    self.stopped.set() # One kill per session: the account is locked afterwards
+                    return
+                if self.stopped.is_set():
+                    return
+
+                # Periodic refresh keeps the session alive; health check catches dead pages
+                if time.time() - last_refresh > self.refresh_every:
+                    self.page.reload()
+                    self.page.wait_for_load_state("networkidle")
+                    last_refresh = time.time()
+                    if self._healthy():
+                        save_storage_state(self.universal_data, context) # Keep the cache as fresh as the page
+
+                if not self._healthy():
+                    self.log.warning("Warm Browser Session Lost. Re-logging in...", tags=["AUTO", "WARM"])
+                    self.ready.clear()
+                    self._cancel_pending()
+                    self._login()
+                    last_refresh = time.time()
+        finally:
+            self.ready.clear()
+            browser.close()
+
+    def _cancel_pending(self):
+        """Cancels every queued kill request (its caller falls back to cold at once)."""
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                fut, accepted = request
+                fut.cancel()
+                accepted.set()
+
+    def _login(self):
+        self.log.info("Warm Browser: Logging in (standby).", tags=["AUTO", "WARM"])
+        login(self.universal_data, self.page)
+        if not self._healthy():
+            raise RuntimeError("Login did not leave the login page")
+        self.ready.set()
+        self.log.info("Warm Browser Ready.", tags=["AUTO", "WARM"])
+
+    def _healthy(self):
+        try:
+            if self.page.is_closed():
+                return False
+            self.page.evaluate("1")
+            return is_logged_in(self.page)
+        except Exception:
+            return False
+
+    def _run_kill(self, fut):
+        self.ready.clear()
+        web_conf = self.universal_data['sys']['config'].get('web_automation', {})
+        _, kill_steps = split_flow_steps(web_conf.get('flow_steps', []))
+        recorder = None
+        run_dir = new_run_dir(self.universal_data)
+        if run_dir:
+            recorder = FlowRecorder(self.universal_data, run_dir, "warm")
+            recorder.attach(self.context)
+        try:
+            self.log.info("Warm Browser: Executing Kill Steps.", tags=["AUTO", "WARM"])
+            run_flow_steps(self.universal_data, self.page, kill_steps, recorder=recorder)
+            self.log.info("Automation Sequence Completed.", tags=["AUTO", "DONE"])
+            time.sleep(2)
+            if recorder: recorder.finish("completed")
+            fut.set_result(True)
+        except Exception as e:
+            if recorder: recorder.finish("failed", e)
+            try:
+                self.page.screenshot(path=f"logs/error_{self.universal_data['user_id']}.png")
+            except: pass
+            fut.set_exception(e)
+
+
+def start_warm_browser(universal_data):
+    """Starts the standby browser if web_automation.warm_standby.enabled."""
+    web_conf = universal_data['sys']['config'].get('web_automation', {})
+    if not web_conf.get('warm_standby', {}).get('enabled', False):
+        return
+    warm = WarmBrowser(universal_data)
+    universal_data['sys']['warm_browser'] = warm
+    warm.start()
+
+
+def stop_warm_browser(universal_data):
+    warm = universal_data['sys'].get('warm_browser')
+    if warm:
+        warm.stop()
+        universal_data['sys']['warm_browser'] = None